@@ -1,9 +1,31 @@
 from django.contrib import admin
-from .models import GradeRequest
+from .models import GradeCacheEntry, GradeRequest, PtcgCard, PtcgSet
 
 @admin.register(GradeRequest)
 class GradeRequestAdmin(admin.ModelAdmin):
-    list_display = ("id", "user", "card_name", "predicted_grade", "needs_better_photos", "created_at")
+    list_display = ("id", "user", "card_name", "status", "engine", "predicted_grade", "needs_better_photos", "created_at")
     search_fields = ("card_name","user__username")
-    list_filter = ("needs_better_photos", "created_at")
-    readonly_fields = ("raw_json",)
+    list_filter = ("status", "engine", "needs_better_photos", "created_at")
+    readonly_fields = ("raw_json", "job_params", "attempts", "worker", "error", "started_at", "finished_at")
+
+
+@admin.register(GradeCacheEntry)
+class GradeCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ("id", "engine", "key", "hits", "created_at", "last_hit_at")
+    list_filter = ("engine",)
+    search_fields = ("key",)
+    readonly_fields = ("result",)
+
+
+@admin.register(PtcgSet)
+class PtcgSetAdmin(admin.ModelAdmin):
+    list_display = ("id", "ptcgo_code", "name", "updated_at", "fetched_at")
+    search_fields = ("id", "ptcgo_code", "name")
+    readonly_fields = ("data",)
+
+
+@admin.register(PtcgCard)
+class PtcgCardAdmin(admin.ModelAdmin):
+    list_display = ("id", "set_id", "number", "name_lower", "fetched_at")
+    search_fields = ("id", "set_id", "name_lower")
+    readonly_fields = ("data",)
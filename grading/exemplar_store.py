@@ -0,0 +1,172 @@
+# grading/exemplar_store.py
+"""
+Local store for the reference images attached to the grader call (PTCG exemplar
+card scans, set logos / symbols).
+
+The same few hundred remote URLs recur, so each is downloaded once, normalised with
+the "reference" payload profile (downscaled WebP/JPEG, alpha flattened onto white)
+and kept under cache/exemplars/<sha1(url)>. The grader gets it inlined as a small
+data URL instead of making the provider fetch pokemontcg.io on every grade.
+
+The directory is size-bounded: each write evicts the least-recently-used files
+(mtime is touched on every hit) past EXEMPLAR_MAX_MB. Any fetch/decode failure
+returns None and the caller falls back to the remote URL.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+import cv2
+import httpx
+import numpy as np
+
+from grading import llm_payload
+
+EXEMPLAR_CACHE = os.getenv("CARDGRADER_EXEMPLAR_CACHE", "1").strip() not in {"", "0", "false", "False"}
+EXEMPLAR_DIR = Path(os.getenv("CARDGRADER_EXEMPLAR_DIR", "cache/exemplars"))
+EXEMPLAR_MAX_MB = float(os.getenv("CARDGRADER_EXEMPLAR_MAX_MB", "200"))
+EXEMPLAR_FETCH_TIMEOUT = float(os.getenv("CARDGRADER_EXEMPLAR_TIMEOUT", "5"))
+_MEMO_SIZE = 256   # data URLs kept in memory per process
+_FAIL_TTL_S = 600  # don't retry a failing URL on every grade while the host is down
+
+_EXT_MIME = {".webp": "image/webp", ".jpg": "image/jpeg"}
+
+_memo: "OrderedDict[str, str]" = OrderedDict()
+_memo_lock = threading.Lock()
+_key_locks: Dict[str, threading.Lock] = {}
+_key_locks_guard = threading.Lock()
+_failed: Dict[str, float] = {}
+
+
+def _key(url: str) -> str:
+    # the profile is part of the key: changing it re-encodes instead of serving old copies
+    return hashlib.sha1(f"{url}|{llm_payload.PROFILES['reference']}".encode("utf-8")).hexdigest()
+
+
+def _find(key: str) -> Optional[Path]:
+    for ext in _EXT_MIME:
+        p = EXEMPLAR_DIR / f"{key}{ext}"
+        if p.exists():
+            return p
+    return None
+
+
+def _memo_get(key: str) -> Optional[str]:
+    with _memo_lock:
+        url = _memo.get(key)
+        if url is not None:
+            _memo.move_to_end(key)
+        return url
+
+
+def _memo_put(key: str, data_url: str) -> None:
+    with _memo_lock:
+        _memo[key] = data_url
+        _memo.move_to_end(key)
+        while len(_memo) > _MEMO_SIZE:
+            _memo.popitem(last=False)
+
+
+def _decode(content: bytes) -> Optional[np.ndarray]:
+    img = cv2.imdecode(np.frombuffer(content, np.uint8), cv2.IMREAD_UNCHANGED)
+    if img is None:
+        return None
+    if img.ndim == 2:
+        return cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    if img.shape[2] == 4:
+        # logos/symbols are transparent PNGs: flatten onto white, not black
+        alpha = img[..., 3:4].astype(np.float32) / 255.0
+        return (img[..., :3].astype(np.float32) * alpha + 255.0 * (1.0 - alpha)).astype(np.uint8)
+    return img
+
+
+def _fetch(url: str) -> Optional[tuple]:
+    try:
+        r = httpx.get(url, timeout=EXEMPLAR_FETCH_TIMEOUT, follow_redirects=True)
+        r.raise_for_status()
+    except Exception:
+        return None
+    bgr = _decode(r.content)
+    if bgr is None:
+        return None
+    data, mime, _ = llm_payload.encode_bytes(bgr, "reference")
+    return data, mime
+
+
+def _write(key: str, data: bytes, mime: str) -> None:
+    ext = ".webp" if mime == "image/webp" else ".jpg"
+    EXEMPLAR_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = EXEMPLAR_DIR / f".{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+    tmp.write_bytes(data)
+    os.replace(tmp, EXEMPLAR_DIR / f"{key}{ext}")
+
+
+def evict(max_bytes: Optional[int] = None) -> int:
+    """Drop least-recently-used files until the store fits. Returns files removed."""
+    if max_bytes is None:
+        max_bytes = int(EXEMPLAR_MAX_MB * 1024 * 1024)
+    try:
+        files = [(p.stat().st_mtime, p.stat().st_size, p) for p in EXEMPLAR_DIR.iterdir()
+                 if p.suffix in _EXT_MIME]
+    except FileNotFoundError:
+        return 0
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for _, size, p in sorted(files, key=lambda t: t[0]):
+        if total <= max_bytes:
+            break
+        try:
+            p.unlink()
+            total -= size
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def data_url(url: str) -> Optional[str]:
+    """Inline data URL for a remote reference image, or None (use the remote URL)."""
+    if not EXEMPLAR_CACHE or not url or url.startswith("data:"):
+        return None
+    key = _key(url)
+    hit = _memo_get(key)
+    if hit is not None:
+        return hit
+
+    with _key_locks_guard:
+        lock = _key_locks.setdefault(key, threading.Lock())
+    with lock:  # one download per URL even when several grades need it at once
+        hit = _memo_get(key)
+        if hit is not None:
+            return hit
+        path = _find(key)
+        if path is None and time.monotonic() - _failed.get(key, float("-inf")) < _FAIL_TTL_S:
+            return None
+        if path is not None:
+            try:
+                os.utime(path)  # LRU clock
+                out = llm_payload.to_data_url(path.read_bytes(), _EXT_MIME[path.suffix])
+            except OSError:
+                out = None
+        else:
+            fetched = _fetch(url)
+            if fetched is None:
+                _failed[key] = time.monotonic()
+                return None
+            _failed.pop(key, None)
+            data, mime = fetched
+            try:
+                _write(key, data, mime)
+                evict()
+            except OSError:
+                pass  # still usable for this grade
+            out = llm_payload.to_data_url(data, mime)
+        if out is not None:
+            _memo_put(key, out)
+        return out
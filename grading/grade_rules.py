@@ -0,0 +1,144 @@
+# grading/grade_rules.py
+"""
+Keyword rules applied to the grader's summary/observation text after the LLM call.
+
+RULES is the single table: each rule lists its keywords, which text it looks at
+("text" = summary + observation notes, "notes" = notes only) and, for caps, the grade
+ceiling (optionally only when the grade is still >= min_grade at that point).
+
+The table is compiled once into a keyword index (each distinct keyword scanned at most
+once, mapped back to every rule that lists it, and skipped once all of those rules have
+fired), so one pass over the lower-cased text returns all triggered rules. Matching is plain substring matching over summary + " " + notes,
+same as the `any(k in text ...)` scans it replaces ("pen" still fires on "opened"),
+so grades don't move. A regex alternation (flat or trie-factored) was measured slower
+than this in CPython at this keyword count; re-check with the benchmark if the table
+grows by an order of magnitude.
+
+match() returns the triggered rule names and bumps per-rule hit counters (counters());
+benchmark() times the matcher against the naive scan over a corpus of grader replies
+(see `manage.py bench_grade_rules`).
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class Rule:
+    name: str
+    keywords: Tuple[str, ...]
+    scope: str = "text"               # "text" | "notes"
+    cap: Optional[float] = None       # grade ceiling when triggered (None = flag only)
+    min_grade: Optional[float] = None # only cap when the grade is still >= this
+
+
+# Order matters for caps: each one sees the grade left by the previous ones.
+RULES: Tuple[Rule, ...] = (
+    # Writing/ink: CV handles MK, so text alone only soft-caps to 7.5.
+    Rule("writing", ("ink", "writing", "written", "marker", "pen", "crayon"), cap=7.5),
+    Rule("structural", ("crease", "bent", "bend", "fold", "tear", "rip", "paper loss", "missing paper"), cap=4.0),
+    Rule("severity", ("heavy", "obvious", "large", "significant"), cap=7.5),
+    # Grades 9–10 require no visible wear.
+    Rule("visible_wear", ("whitening", "chip", "scratch", "dent", "dimple", "stain", "ink", "marker",
+                          "corner wear", "edge wear"), cap=8.0, min_grade=9.0),
+    # Enough on its own to allow a grade below 9.5 (_apply_observation_thresholds).
+    Rule("high_impact", ("crease", "dent", "deep scratch"), scope="notes"),
+)
+
+
+def _compile(rules: Iterable[Rule]) -> Tuple[Tuple[str, FrozenSet[str]], ...]:
+    owners: Dict[str, set] = {}
+    for r in rules:
+        for kw in r.keywords:
+            owners.setdefault(kw, set()).add(r.name)
+    return tuple((kw, frozenset(names)) for kw, names in owners.items())
+
+
+_INDEX = _compile(RULES)
+_NOTES_ONLY = frozenset(r.name for r in RULES if r.scope == "notes")
+
+_hits: Counter = Counter()
+_hits_lock = threading.Lock()
+
+
+def _notes_text(result: Dict[str, Any]) -> str:
+    return " ".join((o.get("note", "") or "") for o in (result.get("observations") or [])
+                    if isinstance(o, dict)).lower()
+
+
+def match(result: Dict[str, Any]) -> FrozenSet[str]:
+    """Names of every rule triggered by this grader result (one scan of its text)."""
+    notes = _notes_text(result)
+    text = str(result.get("summary", "") or "").lower() + " " + notes
+    fired: set = set()
+    for kw, names in _INDEX:
+        pending = names - fired
+        if not pending or kw not in text:  # rule already fired: skip the substring scan
+            continue
+        scoped = pending & _NOTES_ONLY
+        fired |= pending - scoped
+        if scoped and kw in notes:
+            fired |= scoped
+    fired = frozenset(fired)
+    if fired:
+        with _hits_lock:
+            _hits.update(fired)
+    return fired
+
+
+def counters() -> Dict[str, int]:
+    """Per-rule hit counts since process start."""
+    with _hits_lock:
+        return {r.name: _hits.get(r.name, 0) for r in RULES}
+
+
+def apply_caps(result: Dict[str, Any], fired: Iterable[str]) -> Dict[str, Any]:
+    fired = set(fired)
+    for r in RULES:
+        if r.cap is None or r.name not in fired:
+            continue
+        if r.min_grade is not None and result["predicted_grade"] < r.min_grade:
+            continue
+        if result["predicted_grade"] > r.cap:
+            result["predicted_grade"] = float(r.cap)
+    return result
+
+
+# =========================
+# Benchmark
+# =========================
+def _naive(result: Dict[str, Any]) -> FrozenSet[str]:
+    """Reference implementation: one substring scan per rule keyword list."""
+    notes = _notes_text(result)
+    text = (str(result.get("summary", "") or "").lower() + " " + notes)
+    return frozenset(r.name for r in RULES
+                     if any(k in (notes if r.scope == "notes" else text) for k in r.keywords))
+
+
+def benchmark(results: List[Dict[str, Any]], repeat: int = 20) -> Dict[str, Any]:
+    """Time match() against the naive scan over grader results; also checks they agree."""
+    with _hits_lock:
+        saved = Counter(_hits)
+    mismatches = sum(_naive(r) != match(r) for r in results)
+
+    def _time(fn) -> float:
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            for r in results:
+                fn(r)
+        return (time.perf_counter() - t0) * 1e6 / max(1, repeat * len(results))
+
+    compiled_us = _time(match)
+    with _hits_lock:  # don't let the benchmark pollute the live counters
+        _hits.clear()
+        _hits.update(saved)
+    return {
+        "results": len(results),
+        "mismatches": mismatches,
+        "naive_us": _time(_naive),
+        "compiled_us": compiled_us,
+    }
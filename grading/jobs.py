@@ -0,0 +1,316 @@
+# grading/jobs.py
+"""
+DB-backed grading jobs.
+
+A GradeRequest doubles as its own job row: the upload view saves it as QUEUED and
+`manage.py grade_worker` claims rows with a conditional UPDATE (works the same on
+SQLite and Postgres; no broker). With the queue disabled the view saves the row as
+RUNNING (start_inline) and calls run_job() itself, so both paths share one pipeline and
+a worker never picks up an inline grade.
+
+Only run the Procfile `worker:` process on deployments with ENABLE_GRADING_QUEUE=1;
+without it nothing is ever queued and the worker just polls.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import socket
+from datetime import timedelta
+from decimal import Decimal
+from typing import Optional
+
+from django.db.models import F
+from django.utils import timezone
+
+from . import phash_index, result_cache, tracing
+from .models import GradeRequest
+
+logger = logging.getLogger(__name__)
+
+JOB_TIMEOUT_S = int(os.getenv("GRADING_JOB_TIMEOUT", "600"))    # RUNNING longer than this → reclaimed
+JOB_MAX_ATTEMPTS = int(os.getenv("GRADING_JOB_MAX_ATTEMPTS", "2"))
+
+RESULT_FIELDS = [
+    "score_centering", "score_surface", "score_edges", "score_corners", "score_color",
+    "predicted_grade", "predicted_label", "explanation_md",
+    "needs_better_photos", "photo_feedback", "raw_json",
+]
+JOB_FIELDS = ["status", "error", "finished_at"]
+PHASH_FIELDS = ["phash", "phash_back"]
+
+
+def label_from_score(x: float) -> str:
+    if x >= 9.5: return "Gem Mint 10"
+    if x >= 9.0: return "Mint 9"
+    if x >= 8.0: return "NM-MT 8"
+    if x >= 7.0: return "NM 7"
+    if x >= 6.0: return "EX-MT 6"
+    if x >= 5.0: return "EX 5"
+    return f"{x:.1f}"
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+INLINE_PREFIX = "inline:"  # worker of rows graded in a web request (start_inline)
+
+
+# ---- Lazy loaders (avoid importing heavy deps unless enabled & needed) ----
+CV_WEIGHTS_PATH = "grading/ml/models/cardgrader_v1.pt"
+CV_SIZE = 384
+
+
+def _get_cv_model():
+    from grading.ml import model_server  # lazy import
+    return model_server.get_grader(CV_WEIGHTS_PATH, CV_SIZE)
+
+
+def preload_cv_model() -> bool:
+    """Load the CV weights in a parent process so forked workers share one copy."""
+    from grading.ml import model_server  # lazy import
+    return model_server.preload_for_fork(CV_WEIGHTS_PATH)
+
+
+def _grade_with_openai(*args, **kwargs):
+    from .openai_client import grade_with_openai  # lazy import
+    return grade_with_openai(*args, **kwargs)
+
+
+def ai_fingerprint() -> dict:
+    from .openai_client import cache_fingerprint  # lazy import
+    return cache_fingerprint()
+
+
+def cv_fingerprint() -> dict:
+    try:
+        st = os.stat(CV_WEIGHTS_PATH)
+        weights = f"{st.st_size}:{int(st.st_mtime)}"
+    except OSError:
+        weights = "missing"
+    # the int8 model scores slightly differently: don't reuse fp32 results for it
+    quant = os.getenv("CARDGRADER_CV_QUANT", "").strip().lower()
+    return {"weights": CV_WEIGHTS_PATH, "stat": weights, "size": CV_SIZE, **({"quant": quant} if quant else {})}
+
+
+def ai_cacheable(data: dict) -> bool:
+    return bool(data.get("grader_ok"))
+
+
+# ----------------------------- Results --------------------------------------
+def apply_ai_result(gr: GradeRequest, data: dict) -> None:
+    s = data.get("scores", {})
+    gr.score_centering = Decimal(str(s.get("centering", 0)))
+    gr.score_surface   = Decimal(str(s.get("surface",   0)))
+    gr.score_edges     = Decimal(str(s.get("edges",     0)))
+    gr.score_corners   = Decimal(str(s.get("corners",   0)))
+    gr.score_color     = Decimal(str(s.get("color",     0)))
+    overall            = Decimal(str(data.get("predicted_grade", 0)))
+    gr.predicted_grade = overall
+    gr.predicted_label = data.get("predicted_label", label_from_score(float(overall)))
+    gr.explanation_md  = data.get("summary", "")
+    gr.needs_better_photos = bool(data.get("needs_better_photos", False))
+    gr.photo_feedback  = data.get("photo_feedback", "")
+    gr.raw_json        = data
+
+
+def apply_cv_result(gr: GradeRequest, cv_out: dict) -> None:
+    if not cv_out.get("success", True):
+        gr.needs_better_photos = True
+        gr.photo_feedback = cv_out.get("message", "Photo quality too low for grading.")
+        gr.explanation_md = "Grading skipped due to photo quality gate."
+        gr.raw_json = {"engine": "cv", **cv_out}
+        return
+
+    gr.score_centering = Decimal(str(cv_out.get("centering", 0)))
+    gr.score_surface   = Decimal(str(cv_out.get("surface",   0)))
+    gr.score_edges     = Decimal(str(cv_out.get("edges",     0)))
+    gr.score_corners   = Decimal(str(cv_out.get("corners",   0)))
+    gr.score_color     = Decimal(str(cv_out.get("color",     0)))
+    overall = Decimal(str(cv_out.get("overall", 0)))
+    gr.predicted_grade = overall
+    gr.predicted_label = label_from_score(float(overall))
+    gr.explanation_md  = "Graded by CV model (pair-regressor v1)."
+    gr.needs_better_photos = False
+    gr.photo_feedback = ""
+    gr.raw_json = {"engine": "cv", **cv_out}
+
+
+def copy_result(src: GradeRequest, dst: GradeRequest) -> None:
+    """Seed dst with src's grade (near-duplicate upload)."""
+    for f in RESULT_FIELDS:
+        setattr(dst, f, getattr(src, f))
+    dst.raw_json = {**(src.raw_json or {}), "reused_from": src.pk}
+
+
+def cv_gate_failed(gr: GradeRequest) -> bool:
+    """True when the CV engine declined to grade (photo quality gate)."""
+    return gr.engine == "cv" and not (gr.raw_json or {}).get("success", True)
+
+
+# ----------------------------- Pipeline -------------------------------------
+def _computed(fn, *args, **kwargs):
+    """Result-cache miss: run the engine (and say so on the trace)."""
+    tracing.annotate(cache_hit=False)
+    return fn(*args, **kwargs)
+
+
+def _cv_predict(front_p, back_p) -> dict:
+    with tracing.span("cv_predict"):
+        return _get_cv_model().predict(front_p, back_p)
+
+
+def attach_trace(gr: GradeRequest, trace: tracing.Trace) -> None:
+    """Store the stage timings / token usage with the result (raw_json["trace"])."""
+    gr.raw_json = {**(gr.raw_json or {}), "trace": trace.to_dict()}
+
+
+def ai_hints(gr: GradeRequest) -> dict:
+    """Grader hints stored with the request (game + job_params)."""
+    params = gr.job_params or {}
+    return {
+        "game_hint": gr.game,
+        "ptcgo_code": params.get("ptcgo_code"),
+        "collector_number": params.get("collector_number"),
+    }
+
+
+def prepare_pipeline(gr: GradeRequest):
+    """
+    The synchronous steps every grading path (run_job, the async view) takes before the
+    engine runs: open the image contexts, reuse a near-duplicate's grade when enabled,
+    and build the result-cache key. Returns (front_p, back_p, key); key is None when a
+    prior grade was copied onto gr and there is nothing left to do.
+    """
+    from grading.ml.image_context import CardImage  # lazy: cv2
+
+    # One context per upload: hashing, caching and both engines share the decode/warps.
+    front_p = CardImage(gr.front_image.path)
+    back_p = CardImage(gr.back_image.path) if gr.back_image else None
+
+    if phash_index.PHASH_REUSE:  # hashing rectifies both sides: only pay for it when it can save a grade
+        with tracing.span("phash"):
+            gr.phash, gr.phash_back = phash_index.compute(front_p, back_p)
+        prior = phash_index.find_near_duplicate(gr)
+        if prior is not None:
+            tracing.annotate(reused_from=prior.pk)
+            copy_result(prior, gr)
+            return front_p, back_p, None
+
+    if gr.engine == "ai":
+        key = result_cache.make_key("ai", front_p, back_p, ai_fingerprint(), **ai_hints(gr))
+    elif gr.engine == "cv":
+        key = result_cache.make_key("cv", front_p, back_p, cv_fingerprint())
+    else:
+        raise ValueError(f"Unknown grading engine: {gr.engine!r}")
+    return front_p, back_p, key
+
+
+def _run_pipeline(gr: GradeRequest) -> None:
+    front_p, back_p, key = prepare_pipeline(gr)
+    if key is None:
+        return
+
+    tracing.annotate(cache_hit=True)  # flipped by the compute callbacks below
+
+    if gr.engine == "ai":
+        hints = ai_hints(gr)
+        data = result_cache.cached(
+            key, "ai",
+            lambda: _computed(_grade_with_openai, front_p, back_p, **hints),
+            cacheable=ai_cacheable,
+        )
+        apply_ai_result(gr, data)
+    else:
+        apply_cv_result(gr, result_cache.cached(key, "cv", lambda: _computed(_cv_predict, front_p, back_p)))
+
+
+def run_job(gr: GradeRequest) -> GradeRequest:
+    """Grade one request and persist the outcome (DONE or FAILED). Never raises."""
+    with tracing.start() as trace:
+        tracing.annotate(engine=gr.engine)
+        try:
+            from grading.ml import debug_writer  # lazy: cv2
+            with debug_writer.run(gr.engine):  # one sampled debug dir per grade
+                _run_pipeline(gr)
+            gr.status = GradeRequest.STATUS_DONE
+            gr.error = ""
+        except Exception as exc:
+            logger.exception("Grade %s failed", gr.pk)
+            gr.status = GradeRequest.STATUS_FAILED
+            gr.error = str(exc) or exc.__class__.__name__
+    attach_trace(gr, trace)
+    gr.finished_at = timezone.now()
+    gr.save(update_fields=[*RESULT_FIELDS, *JOB_FIELDS, *PHASH_FIELDS])
+    return gr
+
+
+# ----------------------------- Queue ----------------------------------------
+def enqueue(gr: GradeRequest, engine: str, **params) -> GradeRequest:
+    """Mark an unsaved/new request as QUEUED and persist it (images land on disk here)."""
+    gr.engine = engine
+    gr.job_params = {k: v for k, v in params.items() if v}
+    gr.status = GradeRequest.STATUS_QUEUED
+    gr.save()
+    return gr
+
+
+def start_inline(gr: GradeRequest, engine: str, **params) -> GradeRequest:
+    """
+    Persist a request the caller grades itself (run_job in the request thread). It is
+    saved as RUNNING, owned by this process, so a grade_worker never claims it as well;
+    if the process dies mid-grade, reclaim_stale fails it instead of requeueing (nobody
+    is waiting for the result any more).
+    """
+    gr.engine = engine
+    gr.job_params = {k: v for k, v in params.items() if v}
+    gr.status = GradeRequest.STATUS_RUNNING
+    gr.worker = f"{INLINE_PREFIX}{worker_id()}"
+    gr.started_at = timezone.now()
+    gr.attempts = 1
+    gr.save()
+    return gr
+
+
+def claim_next(worker: str, scan: int = 10) -> Optional[GradeRequest]:
+    """
+    Claim the oldest QUEUED job. The conditional UPDATE is the lock: if another worker
+    got there first it matches 0 rows and we try the next candidate.
+    """
+    candidates = (GradeRequest.objects
+                  .filter(status=GradeRequest.STATUS_QUEUED)
+                  .order_by("id")
+                  .values_list("pk", flat=True)[:scan])
+    for pk in candidates:
+        claimed = GradeRequest.objects.filter(pk=pk, status=GradeRequest.STATUS_QUEUED).update(
+            status=GradeRequest.STATUS_RUNNING,
+            worker=worker,
+            started_at=timezone.now(),
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return GradeRequest.objects.get(pk=pk)
+    return None
+
+
+def reclaim_stale(timeout_s: int = JOB_TIMEOUT_S, max_attempts: int = JOB_MAX_ATTEMPTS) -> int:
+    """
+    Requeue jobs whose worker died mid-run; give up after max_attempts. Inline grades
+    (start_inline) are failed straight away. Returns rows touched.
+    """
+    cutoff = timezone.now() - timedelta(seconds=timeout_s)
+    stale = GradeRequest.objects.filter(status=GradeRequest.STATUS_RUNNING, started_at__lt=cutoff)
+    abandoned = stale.filter(worker__startswith=INLINE_PREFIX).update(
+        status=GradeRequest.STATUS_FAILED,
+        error="Grading was interrupted.",
+        finished_at=timezone.now(),
+    )
+    stale = stale.exclude(worker__startswith=INLINE_PREFIX)
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status=GradeRequest.STATUS_FAILED,
+        error="Grading timed out.",
+        finished_at=timezone.now(),
+    )
+    requeued = stale.filter(attempts__lt=max_attempts).update(status=GradeRequest.STATUS_QUEUED, worker="")
+    return abandoned + failed + requeued
@@ -0,0 +1,138 @@
+# grading/llm_payload.py
+"""
+Per-stage image encoding for multimodal LLM requests.
+
+Each stage gets a profile (long side, format, quality, byte budget, `detail` level):
+  grader     → 896x640 warp, high detail (corners/edges matter)
+  ocr_strip  → title / bottom strips, high detail but small
+  classifier → front/back + photo quality only, low detail (85 tokens per image)
+  reference  → exemplar / set logo images (exemplar_store), low detail
+
+On top of the profile, pixels the API would throw away are never sent: "low" is
+downsampled to 512x512 server-side, "high" to fit 2048x2048 with the short side at
+most 768. If an encode misses the byte budget, quality steps down to min_quality,
+then the image shrinks.
+"""
+from __future__ import annotations
+
+import base64
+import io
+import math
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image, features
+
+
+@dataclass(frozen=True)
+class PayloadProfile:
+    max_side: int       # long side in px before the detail-level clamp (0 = keep)
+    fmt: str            # "jpeg" | "webp"
+    quality: int
+    min_quality: int
+    max_bytes: int      # encoded size budget
+    detail: str         # OpenAI image detail: "low" | "high" | "auto"
+
+
+PROFILES: Dict[str, PayloadProfile] = {
+    "grader":     PayloadProfile(max_side=0,   fmt="jpeg", quality=90, min_quality=80, max_bytes=350_000, detail="high"),
+    "ocr_strip":  PayloadProfile(max_side=0,   fmt="webp", quality=85, min_quality=70, max_bytes=60_000,  detail="high"),
+    "classifier": PayloadProfile(max_side=512, fmt="webp", quality=70, min_quality=50, max_bytes=40_000,  detail="low"),
+    "reference":  PayloadProfile(max_side=512, fmt="webp", quality=80, min_quality=60, max_bytes=50_000,  detail="low"),
+}
+
+_MAX_SHRINK_STEPS = 4
+
+
+@lru_cache(maxsize=1)
+def _webp_ok() -> bool:
+    return bool(features.check("webp"))
+
+
+def fingerprint() -> str:
+    """Profiles change what the models see; part of the result-cache key."""
+    return ";".join(f"{k}={v.max_side}/{v.fmt}/{v.quality}/{v.detail}" for k, v in sorted(PROFILES.items()))
+
+
+def _detail_scale(w: int, h: int, detail: str) -> float:
+    """Scale factor (<=1) that drops pixels the API would downsample away."""
+    if detail == "low":
+        return min(1.0, 512.0 / max(w, h))
+    return min(1.0, 2048.0 / max(w, h), 768.0 / min(w, h))
+
+
+def estimate_tokens(w: int, h: int, detail: str) -> int:
+    """OpenAI's published image token formula (85 base + 170 per 512px tile)."""
+    if detail == "low":
+        return 85
+    f = _detail_scale(w, h, "high")
+    tw, th = w * f, h * f
+    return 85 + 170 * math.ceil(tw / 512.0) * math.ceil(th / 512.0)
+
+
+def _resize(bgr: np.ndarray, f: float) -> np.ndarray:
+    if f >= 0.999:
+        return bgr
+    h, w = bgr.shape[:2]
+    return cv2.resize(bgr, (max(1, int(round(w * f))), max(1, int(round(h * f)))), interpolation=cv2.INTER_AREA)
+
+
+def _encode(rgb: Image.Image, fmt: str, quality: int) -> bytes:
+    buf = io.BytesIO()
+    if fmt == "webp":
+        rgb.save(buf, format="WEBP", quality=quality, method=4)
+    else:
+        rgb.save(buf, format="JPEG", quality=quality, optimize=True)
+    return buf.getvalue()
+
+
+def encode_bytes(bgr: np.ndarray, stage: str) -> Tuple[bytes, str, Dict[str, object]]:
+    """
+    (encoded, mime, info) for `bgr` under the stage's profile. info has the final
+    size, format, quality, byte count and token estimate (for debug / tracing).
+    """
+    p = PROFILES[stage]
+    fmt = p.fmt if (p.fmt != "webp" or _webp_ok()) else "jpeg"
+    h, w = bgr.shape[:2]
+    f = min(1.0, p.max_side / float(max(h, w))) if p.max_side else 1.0
+    img = _resize(bgr, min(f, _detail_scale(w, h, p.detail)))
+
+    data: Optional[bytes] = None
+    q = p.quality
+    for step in range(_MAX_SHRINK_STEPS + 1):
+        if step:
+            img = _resize(img, 0.85)
+        rgb = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        q = p.quality
+        data = _encode(rgb, fmt, q)
+        while len(data) > p.max_bytes and q > p.min_quality:
+            q = max(p.min_quality, q - 10)
+            data = _encode(rgb, fmt, q)
+        if len(data) <= p.max_bytes:
+            break
+
+    mime = "image/webp" if fmt == "webp" else "image/jpeg"
+    ih, iw = img.shape[:2]
+    info = {
+        "stage": stage, "size": [iw, ih], "format": fmt, "quality": q,
+        "bytes": len(data), "detail": p.detail, "tokens_est": estimate_tokens(iw, ih, p.detail),
+    }
+    return data, mime, info
+
+
+def to_data_url(data: bytes, mime: str) -> str:
+    return f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+def encode(bgr: np.ndarray, stage: str) -> Tuple[str, Dict[str, object]]:
+    """(data_url, info); see encode_bytes."""
+    data, mime, info = encode_bytes(bgr, stage)
+    return to_data_url(data, mime), info
+
+
+def image_part(data_url: str, stage: str) -> Dict[str, object]:
+    """Chat-completions content part with the stage's detail level."""
+    return {"type": "image_url", "image_url": {"url": data_url, "detail": PROFILES[stage].detail}}
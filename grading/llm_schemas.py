@@ -0,0 +1,225 @@
+# grading/llm_schemas.py
+"""
+Response schemas for every LLM stage (classifier, set code, card name, grader).
+
+Each stage has a dataclass plus the strict JSON schema sent as `response_format`, so
+the model must answer in exactly that shape and the reply goes through json.loads
+straight into the dataclass (no brace slicing). from_json() raises SchemaError on
+anything that doesn't fit; openai_client retries those a bounded number of times.
+"""
+from __future__ import annotations
+
+import json
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+SIDES = ["front", "back", "unknown"]
+QUALITIES = ["low", "medium", "high"]
+LANGUAGES = ["en", "jp", "unknown"]
+CATEGORIES = ["centering", "surface", "edges", "corners", "color"]
+
+
+class SchemaError(ValueError):
+    """The model's reply is not valid JSON for the stage's schema."""
+
+
+# =========================
+# Helpers
+# =========================
+def _obj(props: Dict[str, Any]) -> Dict[str, Any]:
+    # strict mode: every property required, nothing extra
+    return {"type": "object", "properties": props, "required": list(props), "additionalProperties": False}
+
+
+def _enum(values: List[str]) -> Dict[str, Any]:
+    return {"type": "string", "enum": values}
+
+
+def _response_format(name: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+def _load(raw: str, lenient: bool) -> Dict[str, Any]:
+    try:
+        data = json.loads(raw)
+    except ValueError as e:
+        s, t = raw.find("{"), raw.rfind("}")
+        if not (lenient and s != -1 and t > s):
+            raise SchemaError(f"reply is not JSON: {e}") from None
+        try:
+            data = json.loads(raw[s:t + 1])
+        except ValueError as e2:
+            raise SchemaError(f"reply is not JSON: {e2}") from None
+    if not isinstance(data, dict):
+        raise SchemaError("reply is not a JSON object")
+    return data
+
+
+def _field(d: Dict[str, Any], key: str) -> Any:
+    if key not in d:
+        raise SchemaError(f"missing field {key!r}")
+    return d[key]
+
+
+def _str(d: Dict[str, Any], key: str, choices: Optional[List[str]] = None) -> str:
+    v = _field(d, key)
+    if not isinstance(v, str):
+        raise SchemaError(f"{key!r} must be a string")
+    if choices is not None:
+        v = v.strip().lower()
+        if v not in choices:
+            raise SchemaError(f"{key!r}={v!r} not in {choices}")
+    return v
+
+
+def _num(d: Dict[str, Any], key: str) -> float:
+    v = _field(d, key)
+    if isinstance(v, bool) or not isinstance(v, (int, float)):
+        raise SchemaError(f"{key!r} must be a number")
+    return float(v)
+
+
+def _bool(d: Dict[str, Any], key: str) -> bool:
+    v = _field(d, key)
+    if not isinstance(v, bool):
+        raise SchemaError(f"{key!r} must be a boolean")
+    return v
+
+
+def _dict(d: Dict[str, Any], key: str) -> Dict[str, Any]:
+    v = _field(d, key)
+    if not isinstance(v, dict):
+        raise SchemaError(f"{key!r} must be an object")
+    return v
+
+
+# =========================
+# Stage 1: classifier
+# =========================
+@dataclass
+class Classification:
+    image_1: str = "unknown"
+    image_2: str = "unknown"
+    image_quality: str = "low"
+
+    NAME = "card_classification"
+    SCHEMA = _obj({
+        "detected_sides": _obj({"image_1": _enum(SIDES), "image_2": _enum(SIDES)}),
+        "image_quality": _enum(QUALITIES),
+    })
+
+    @classmethod
+    def from_json(cls, raw: str, lenient: bool = False) -> "Classification":
+        d = _load(raw, lenient)
+        sides = _dict(d, "detected_sides")
+        return cls(_str(sides, "image_1", SIDES), _str(sides, "image_2", SIDES), _str(d, "image_quality", QUALITIES))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The gate dict the pipeline has always passed around."""
+        return {
+            "detected_sides": {"image_1": self.image_1, "image_2": self.image_2},
+            "image_quality": self.image_quality,
+        }
+
+
+# =========================
+# OCR fallbacks
+# =========================
+@dataclass
+class SetCodeRead:
+    set_code: str = ""
+    language: str = "unknown"
+
+    NAME = "set_code"
+    SCHEMA = _obj({"set_code": {"type": "string"}, "language": _enum(LANGUAGES)})
+
+    @classmethod
+    def from_json(cls, raw: str, lenient: bool = False) -> "SetCodeRead":
+        d = _load(raw, lenient)
+        return cls(_str(d, "set_code"), _str(d, "language", LANGUAGES))
+
+
+@dataclass
+class CardNameRead:
+    card_name: str = ""
+
+    NAME = "card_name"
+    SCHEMA = _obj({"card_name": {"type": "string"}})
+
+    @classmethod
+    def from_json(cls, raw: str, lenient: bool = False) -> "CardNameRead":
+        return cls(_str(_load(raw, lenient), "card_name"))
+
+
+# =========================
+# Stage 2: grader
+# =========================
+@dataclass
+class Observation:
+    category: str
+    side: str
+    note: str
+    box: Optional[List[float]] = None
+
+    SCHEMA = _obj({
+        "category": _enum(CATEGORIES),
+        "side": _enum(["front", "back"]),
+        "note": {"type": "string"},
+        "box": {"type": ["array", "null"], "items": {"type": "number"}},
+    })
+
+    @classmethod
+    def from_dict(cls, d: Any) -> "Observation":
+        if not isinstance(d, dict):
+            raise SchemaError("observation must be an object")
+        box = d.get("box")
+        if box is not None and not (isinstance(box, list) and all(isinstance(x, (int, float)) for x in box)):
+            raise SchemaError("observation box must be a list of numbers or null")
+        return cls(_str(d, "category", CATEGORIES), _str(d, "side", ["front", "back"]), _str(d, "note"),
+                   [float(x) for x in box] if box is not None else None)
+
+
+@dataclass
+class GradeReport:
+    scores: Dict[str, float] = field(default_factory=dict)
+    predicted_grade: float = 0.0
+    predicted_label: str = ""
+    needs_better_photos: bool = False
+    photo_feedback: str = ""
+    observations: List[Observation] = field(default_factory=list)
+    summary: str = ""
+
+    NAME = "card_grade"
+    SCHEMA = _obj({
+        "scores": _obj({k: {"type": "number"} for k in CATEGORIES}),
+        "predicted_grade": {"type": "number"},
+        "predicted_label": {"type": "string"},
+        "needs_better_photos": {"type": "boolean"},
+        "photo_feedback": {"type": "string"},
+        "observations": {"type": "array", "items": Observation.SCHEMA},
+        "summary": {"type": "string"},
+    })
+
+    @classmethod
+    def from_json(cls, raw: str, lenient: bool = False) -> "GradeReport":
+        d = _load(raw, lenient)
+        s = _dict(d, "scores")
+        obs = _field(d, "observations")
+        if not isinstance(obs, list):
+            raise SchemaError("'observations' must be an array")
+        return cls(
+            scores={k: _num(s, k) for k in CATEGORIES},
+            predicted_grade=_num(d, "predicted_grade"),
+            predicted_label=_str(d, "predicted_label").strip(),
+            needs_better_photos=_bool(d, "needs_better_photos"),
+            photo_feedback=_str(d, "photo_feedback").strip(),
+            observations=[Observation.from_dict(o) for o in obs],
+            summary=_str(d, "summary").strip(),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def response_format(out_cls) -> Dict[str, Any]:
+    return _response_format(out_cls.NAME, out_cls.SCHEMA)
@@ -0,0 +1,56 @@
+# grading/management/commands/bench_grade_rules.py
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from grading import grade_rules
+from grading.llm_schemas import GradeReport, SchemaError
+
+
+class Command(BaseCommand):
+    help = ("Benchmark the compiled grade-rule matcher against the naive keyword scan "
+            "over saved grader replies (*grader_raw*.txt from debug runs).")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "corpus",
+            nargs="?",
+            default="debug_runs",
+            help="Folder searched recursively for grader replies (default: debug_runs)",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=20,
+            help="Passes over the corpus per timing (default: 20).",
+        )
+
+    def handle(self, *args, **opts):
+        root = Path(opts["corpus"])
+        if not root.is_dir():
+            raise CommandError(f"{root} is not a directory")
+
+        results, skipped = [], 0
+        for p in sorted(root.rglob("*grader_raw*.txt")):
+            try:
+                results.append(GradeReport.from_json(p.read_text(encoding="utf-8"), lenient=True).to_dict())
+            except (OSError, SchemaError):
+                skipped += 1
+        if not results:
+            raise CommandError(f"No parseable grader replies under {root}")
+
+        r = grade_rules.benchmark(results, repeat=opts["repeat"])
+        self.stdout.write(
+            f"{r['results']} replies ({skipped} skipped): naive {r['naive_us']:.1f} µs/reply, "
+            f"compiled {r['compiled_us']:.1f} µs/reply ({r['naive_us'] / max(r['compiled_us'], 1e-9):.1f}x)"
+        )
+        fired = {}
+        for res in results:
+            for name in grade_rules.match(res):
+                fired[name] = fired.get(name, 0) + 1
+        for rule in grade_rules.RULES:
+            self.stdout.write(f"  {rule.name:<14} {fired.get(rule.name, 0)}")
+        if r["mismatches"]:
+            self.stdout.write(self.style.WARNING(f"{r['mismatches']} replies disagree with the naive scan"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Compiled matcher agrees with the naive scan on every reply."))
@@ -0,0 +1,40 @@
+# grading/management/commands/cv_model_server.py
+from django.core.management.base import BaseCommand, CommandError
+
+from grading import jobs
+
+
+class Command(BaseCommand):
+    help = ("Serve the CV grading model on a Unix socket so every grading process on the host "
+            "shares one loaded copy (point them at it with CARDGRADER_MODEL_SOCKET).")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--socket",
+            default=None,
+            help="Socket path (default: $CARDGRADER_MODEL_SOCKET).",
+        )
+        parser.add_argument(
+            "--weights",
+            default=jobs.CV_WEIGHTS_PATH,
+            help=f"Model weights (default: {jobs.CV_WEIGHTS_PATH}).",
+        )
+        parser.add_argument(
+            "--device",
+            default=None,
+            help="torch device (default: cuda if available, else cpu).",
+        )
+
+    def handle(self, *args, **opts):
+        from grading.ml import model_server  # lazy import: torch
+
+        path = opts["socket"] or model_server.SOCKET_PATH
+        if not path:
+            raise CommandError("No socket path: pass --socket or set CARDGRADER_MODEL_SOCKET")
+        self.stdout.write(f"Serving {opts['weights']} on {path} (Ctrl-C to stop).")
+        try:
+            model_server.serve(path, opts["weights"], jobs.CV_SIZE, opts["device"])
+        except KeyboardInterrupt:
+            pass
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
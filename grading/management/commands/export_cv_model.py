@@ -0,0 +1,71 @@
+# grading/management/commands/export_cv_model.py
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from grading import jobs
+
+
+class Command(BaseCommand):
+    help = ("Export the CV model weights to TorchScript (<weights>.ts) and ONNX (<weights>.onnx) "
+            "for the CPU inference backends, and check both against the eager model.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--weights",
+            default=jobs.CV_WEIGHTS_PATH,
+            help=f"Trained state_dict (default: {jobs.CV_WEIGHTS_PATH}).",
+        )
+        parser.add_argument(
+            "--size",
+            type=int,
+            default=jobs.CV_SIZE,
+            help=f"Input size the model is traced at (default: {jobs.CV_SIZE}).",
+        )
+        parser.add_argument(
+            "--formats",
+            default="torchscript,onnx",
+            help="Comma-separated: torchscript, onnx (default: both).",
+        )
+        parser.add_argument(
+            "--atol",
+            type=float,
+            default=1e-3,
+            help="Max allowed output difference vs the eager model (default: 1e-3).",
+        )
+
+    def handle(self, *args, **opts):
+        from grading.ml import export, model_server  # lazy import: torch
+
+        weights = Path(opts["weights"])
+        if not weights.exists():
+            raise CommandError(f"{weights} not found")
+        formats = {f.strip().lower() for f in opts["formats"].split(",") if f.strip()}
+        unknown = formats - {"torchscript", "onnx"}
+        if unknown:
+            raise CommandError(f"Unknown format(s): {', '.join(sorted(unknown))}")
+
+        size = opts["size"]
+        model = export.load_eager(weights)
+        failed = []
+        if "torchscript" in formats:
+            out = export.export_torchscript(model, weights.with_suffix(".ts"), size)
+            diff = export.max_abs_diff(model, model_server.TorchRegressor.torchscript(out), size)
+            self.stdout.write(f"TorchScript → {out} (max |Δ| {diff:.2e})")
+            if diff > opts["atol"]:
+                failed.append(out)
+        if "onnx" in formats:
+            out = export.export_onnx(model, weights.with_suffix(".onnx"), size)
+            if model_server.ort is None:
+                self.stdout.write(f"ONNX → {out} (onnxruntime not installed: parity not checked)")
+            else:
+                diff = export.max_abs_diff(model, model_server.OrtRegressor(out), size)
+                self.stdout.write(f"ONNX → {out} (max |Δ| {diff:.2e})")
+                if diff > opts["atol"]:
+                    failed.append(out)
+        if failed:
+            for out in failed:
+                out.unlink()  # model_server would pick it up otherwise
+            raise CommandError(f"{', '.join(p.name for p in failed)} differed from the eager model by more "
+                               f"than {opts['atol']} and were removed")
+        self.stdout.write(self.style.SUCCESS("Exported; model_server will use them (CARDGRADER_CV_BACKEND=auto)."))
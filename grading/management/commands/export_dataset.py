@@ -37,12 +37,21 @@ class Command(BaseCommand):
             action="store_true",
             help="Do not copy images, only write metadata with absolute paths.",
         )
+        parser.add_argument(
+            "--dedupe-phash",
+            type=int,
+            default=0,
+            help="Drop rows whose front+back perceptual hashes are within N bits of an "
+                 "earlier exported row, so re-uploads can't straddle train/val "
+                 "(default 0 = off; 6 is a good start). Needs opencv.",
+        )
 
     def handle(self, *args, **opts):
         out_dir = opts["out"]
         no_copy = opts["no_copy"]
         limit = opts["limit"]
         since_days = opts["since_days"]
+        dedupe_radius = opts["dedupe_phash"]
 
         images_dir = os.path.join(out_dir, "images")
         os.makedirs(out_dir, exist_ok=True)
@@ -77,6 +86,11 @@ class Command(BaseCommand):
         ]
 
         rows_written = 0
+        dupes_skipped = 0
+        seen = None
+        if dedupe_radius > 0:
+            from grading.ml.phash import BKTree  # lazy: cv2
+            seen = BKTree()
         with open(csv_path, "w", newline="", encoding="utf-8") as csvf, \
              open(jsonl_path, "w", encoding="utf-8") as jsonlf:
 
@@ -92,6 +106,10 @@ class Command(BaseCommand):
                 abs_front = gr.front_image.path
                 abs_back = gr.back_image.path if getattr(gr, "back_image", None) else None
 
+                if seen is not None and self._is_near_duplicate(gr, abs_front, abs_back, seen, dedupe_radius):
+                    dupes_skipped += 1
+                    continue
+
                 # Dest relative paths (for training)
                 rel_front = None
                 rel_back = None
@@ -141,9 +159,34 @@ class Command(BaseCommand):
 
         self.stdout.write(self.style.SUCCESS(
             f"Export complete → {out_dir}  "
-            f"[rows: {rows_written}, images: {'not copied' if no_copy else 'copied'}]"
+            f"[rows: {rows_written}, near-duplicates skipped: {dupes_skipped}, "
+            f"images: {'not copied' if no_copy else 'copied'}]"
         ))
 
+    @staticmethod
+    def _is_near_duplicate(gr, abs_front, abs_back, seen, radius) -> bool:
+        """Check gr against already-exported rows (BK-tree on the front hash), then remember it."""
+        from grading.ml.phash import from_hex, hamming, image_phash
+
+        front_hex, back_hex = gr.phash, gr.phash_back
+        if not front_hex:
+            # Rows hashed at grade time only with GRADING_PHASH_REUSE=1: hash here (export is read-only)
+            try:
+                front_hex = image_phash(abs_front)
+                back_hex = image_phash(abs_back) if abs_back else ""
+            except Exception:
+                return False
+            if not front_hex:
+                return False
+
+        front = from_hex(front_hex)
+        back = from_hex(back_hex) if back_hex else None
+        for _, other_back in seen.search(front, radius):
+            if back is None or other_back is None or hamming(back, other_back) <= radius:
+                return True
+        seen.add(front, back)
+        return False
+
     @staticmethod
     def _safe_copy(src, dst):
         try:
@@ -0,0 +1,126 @@
+# grading/management/commands/grade_worker.py
+import multiprocessing
+import os
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from grading import jobs
+
+
+class Command(BaseCommand):
+    help = ("Run queued grading jobs (DB-backed; start several processes for a pool). "
+            "Only useful with ENABLE_GRADING_QUEUE=1 on the web process.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help="Number of worker processes to fork (default: 1).",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when the queue is empty (default: 1.0).",
+        )
+        parser.add_argument(
+            "--max-jobs",
+            type=int,
+            default=None,
+            help="Exit after this many jobs per process (default: run forever).",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Drain the queue and exit instead of polling.",
+        )
+
+    def handle(self, *args, **opts):
+        if os.getenv("ENABLE_GRADING_QUEUE", "0") != "1":
+            self.stdout.write(self.style.WARNING(
+                "ENABLE_GRADING_QUEUE is not 1: the web process grades inline and queues nothing."))
+        processes = max(1, opts["processes"])
+        if processes == 1:
+            self._work(opts)
+            return
+
+        # Children must not inherit the parent's DB sockets.
+        connections.close_all()
+        # ...but should inherit the CV weights: loaded once here, shared by every child.
+        try:
+            if jobs.preload_cv_model():
+                self.stdout.write("CV model preloaded (shared by all workers).")
+        except Exception as e:
+            self.stdout.write(f"CV model not preloaded: {e}")
+        ctx = multiprocessing.get_context("fork")
+        procs = [ctx.Process(target=self._work, args=(opts,), daemon=False) for _ in range(processes)]
+        for p in procs:
+            p.start()
+        self.stdout.write(f"Started {processes} grade workers.")
+        try:
+            for p in procs:
+                p.join()
+        except KeyboardInterrupt:
+            for p in procs:
+                p.terminate()
+
+    def _work(self, opts):
+        stop = {"flag": False}
+
+        def _graceful(*_):
+            stop["flag"] = True  # finish the current job, then exit
+
+        signal.signal(signal.SIGTERM, _graceful)
+
+        me = jobs.worker_id()
+        done = 0
+        last_reclaim = 0.0
+        self._warm_up(me)
+        self.stdout.write(f"[{me}] grade worker ready.")
+
+        while not stop["flag"]:
+            close_old_connections()
+            now = time.monotonic()
+            if now - last_reclaim > 30:
+                n = jobs.reclaim_stale()
+                if n:
+                    self.stdout.write(f"[{me}] reclaimed {n} stale job(s).")
+                last_reclaim = now
+
+            gr = jobs.claim_next(me)
+            if gr is None:
+                if opts["once"]:
+                    break
+                time.sleep(opts["sleep"])
+                continue
+
+            started = time.monotonic()
+            jobs.run_job(gr)
+            done += 1
+            self.stdout.write(
+                f"[{me}] GradeRequest #{gr.pk} ({gr.engine}) → {gr.status} "
+                f"in {time.monotonic() - started:.1f}s"
+            )
+            if opts["max_jobs"] and done >= opts["max_jobs"]:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f"[{me}] exiting after {done} job(s)."))
+
+    def _warm_up(self, me):
+        """Load per-process engines before the first job instead of during it."""
+        try:
+            from grading.ml import ocr  # lazy: numpy / OCR engine
+            engine = ocr.warm_up()
+            self.stdout.write(f"[{me}] local OCR: {engine or 'none (LLM only)'}")
+        except Exception as e:
+            self.stdout.write(f"[{me}] local OCR unavailable: {e}")
+        try:
+            if os.path.exists(jobs.CV_WEIGHTS_PATH):
+                jobs._get_cv_model()  # lazy: torch; warms up with a dummy batch
+                self.stdout.write(f"[{me}] CV model ready.")
+        except Exception as e:
+            self.stdout.write(f"[{me}] CV model unavailable: {e}")
@@ -0,0 +1,156 @@
+# grading/management/commands/import_ptcg_catalog.py
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from grading.models import PtcgLookupMiss, PtcgSet
+from grading.utils import pokemon_cache
+
+_WS = " \t\r\n"
+
+
+def iter_json_array(path: Path, read_size: int = 1 << 16) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the objects of a top-level JSON array one at a time without loading the file.
+    A top-level {"data": [...]} (API export) is loaded whole instead.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as f:
+        buf = ""
+        while not buf:
+            more = f.read(read_size)
+            if not more:
+                return
+            buf = more.lstrip(_WS + "\ufeff")
+        if buf.startswith("{"):
+            obj = json.loads(buf + f.read())
+            yield from (obj.get("data") or [])
+            return
+        if not buf.startswith("["):
+            raise ValueError(f"{path}: expected a JSON array")
+        buf, pos, eof = buf[1:], 0, False
+        while True:
+            while pos < len(buf) and buf[pos] in _WS + ",":
+                pos += 1
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    raise ValueError(f"{path}: truncated JSON array") from None
+                more = f.read(read_size)
+                eof = not more
+                buf, pos = buf[pos:] + more, 0
+                continue
+            yield obj
+            pos = end  # the buffer is only compacted when more is read
+
+
+class Command(BaseCommand):
+    help = ("Bulk-load the Pokémon TCG set/card catalog from a JSON dump (pokemon-tcg-data layout: "
+            "sets/<lang>.json + cards/<lang>/<set_id>.json) into the local PTCG cache. Offline.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("dump", help="Dump folder (or a single cards/sets JSON file with --kind).")
+        parser.add_argument(
+            "--lang",
+            default="en",
+            help="Language subfolder/file of the dump (default: en).",
+        )
+        parser.add_argument(
+            "--kind",
+            choices=["sets", "cards"],
+            default=None,
+            help="Treat DUMP as a single file of this kind instead of a dump folder.",
+        )
+        parser.add_argument(
+            "--chunk",
+            type=int,
+            default=1000,
+            help="Rows per bulk insert (default: 1000).",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Re-import sets (and their cards) even when `updatedAt` is unchanged.",
+        )
+
+    def handle(self, *args, **opts):
+        root = Path(opts["dump"])
+        lang, chunk, force = opts["lang"], max(1, opts["chunk"]), opts["force"]
+        if opts["kind"]:
+            set_files = [root] if opts["kind"] == "sets" else []
+            card_files = [(root, False)] if opts["kind"] == "cards" else []
+        elif root.is_dir():
+            set_files = [p for p in (root / "sets" / f"{lang}.json", root / "sets.json") if p.exists()][:1]
+            card_dir = root / "cards" / lang
+            # (file, one file per set named after the set id?)
+            card_files = [(p, True) for p in sorted(card_dir.glob("*.json"))] if card_dir.is_dir() else \
+                [(p, False) for p in (root / "cards.json",) if p.exists()]
+        else:
+            raise CommandError(f"{root} is not a folder (use --kind for a single file)")
+        if not set_files and not card_files:
+            raise CommandError(f"No sets/cards JSON found under {root}")
+
+        known = dict(PtcgSet.objects.values_list("id", "updated_at"))
+        set_updated: Dict[str, str] = dict(known)
+        unchanged = set()
+        # Set rows are written with a blank updated_at and stamped only once all cards are
+        # in: an import that dies mid-cards leaves them looking changed, so the next
+        # incremental run re-imports their cards instead of skipping them for good.
+        to_stamp: Dict[str, str] = {}
+
+        # ---- sets ----
+        n_sets = 0
+        batch: List = []
+        for path in set_files:
+            for s in iter_json_array(path):
+                sid, upd = s.get("id"), s.get("updatedAt") or ""
+                if not sid:
+                    continue
+                set_updated[sid] = upd
+                if not force and upd and known.get(sid) == upd:
+                    unchanged.add(sid)
+                    continue
+                batch.append(pokemon_cache.set_row(s, ""))
+                to_stamp[sid] = upd
+                if len(batch) >= chunk:
+                    n_sets += pokemon_cache.bulk_upsert(batch); batch = []
+        n_sets += pokemon_cache.bulk_upsert(batch); batch = []
+
+        # ---- cards ----
+        n_cards = skipped = 0
+        for path, per_set in card_files:
+            for c in iter_json_array(path):
+                if not c.get("id"):
+                    continue
+                # API exports embed the set; the data repo has one file per set instead
+                sid = (c.get("set") or {}).get("id") or (path.stem if per_set else c["id"].rsplit("-", 1)[0])
+                if sid in unchanged:
+                    skipped += 1
+                    continue
+                batch.append(pokemon_cache.card_row(sid, c, set_updated.get(sid, "")))
+                if len(batch) >= chunk:
+                    n_cards += pokemon_cache.bulk_upsert(batch); batch = []
+            if opts["verbosity"] > 1:
+                self.stdout.write(f"  {path.name}: {n_cards + len(batch)} cards so far")
+        n_cards += pokemon_cache.bulk_upsert(batch)
+
+        by_updated: Dict[str, List[str]] = {}
+        for sid, upd in to_stamp.items():
+            if upd:
+                by_updated.setdefault(upd, []).append(sid)
+        with transaction.atomic():
+            for upd, sids in by_updated.items():
+                PtcgSet.objects.filter(id__in=sids).update(updated_at=upd)
+
+        # earlier "not found" answers may be wrong now
+        cleared = PtcgLookupMiss.objects.all().delete()[0]
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {n_sets} sets and {n_cards} cards "
+            f"({len(unchanged)} sets / {skipped} cards unchanged, {cleared} cached misses cleared)."
+        ))
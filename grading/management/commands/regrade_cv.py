@@ -0,0 +1,78 @@
+# grading/management/commands/regrade_cv.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from grading import jobs
+from grading.models import GradeRequest
+
+
+class Command(BaseCommand):
+    help = ("Re-run the CV model over stored grade requests in batches (e.g. after new weights). "
+            "Reports the change in overall grade; --save writes the new results for CV-engine rows.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all-engines",
+            action="store_true",
+            help="Also score AI-graded rows (report only, never saved).",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            help="Max number of rows (default: all).",
+        )
+        parser.add_argument(
+            "--batch",
+            type=int,
+            default=16,
+            help="Card pairs per forward pass (default: 16).",
+        )
+        parser.add_argument(
+            "--save",
+            action="store_true",
+            help="Store the new scores on CV-engine rows.",
+        )
+
+    def handle(self, *args, **opts):
+        qs = GradeRequest.objects.filter(status=GradeRequest.STATUS_DONE).exclude(front_image="").order_by("id")
+        if not opts["all_engines"]:
+            qs = qs.filter(engine="cv")
+        if opts["limit"]:
+            qs = qs[:opts["limit"]]
+        rows = list(qs.only("id", "engine", "front_image", "back_image", "predicted_grade"))
+        if not rows:
+            self.stdout.write("Nothing to re-grade.")
+            return
+
+        def _pairs():
+            for gr in rows:
+                yield gr.front_image.path, (gr.back_image.path if gr.back_image else None)
+
+        grader = jobs._get_cv_model()
+        started = time.monotonic()
+        n = saved = failed = 0
+        total_delta = 0.0
+        for gr, out in zip(rows, grader.predict_many(_pairs(), batch_size=opts["batch"])):
+            n += 1
+            if not out.get("success", True):
+                failed += 1
+                continue
+            delta = float(out.get("overall", 0)) - float(gr.predicted_grade)
+            total_delta += abs(delta)
+            if opts["verbosity"] > 1:
+                self.stdout.write(f"  #{gr.pk} ({gr.engine}) {float(gr.predicted_grade):.1f} -> "
+                                  f"{float(out.get('overall', 0)):.1f}")
+            if opts["save"] and gr.engine == "cv":
+                full = GradeRequest.objects.get(pk=gr.pk)
+                jobs.apply_cv_result(full, out)
+                full.save()
+                saved += 1
+
+        elapsed = time.monotonic() - started
+        ok = n - failed
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-graded {n} requests in {elapsed:.1f}s ({n / max(elapsed, 1e-9):.1f}/s): "
+            f"{failed} failed (photo gate or error), mean |Δ overall| {total_delta / max(ok, 1):.2f}, {saved} saved."
+        ))
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grading', '0003_graderequest_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradeCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('engine', models.CharField(max_length=10)),
+                ('result', models.JSONField(default=dict)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_hit_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
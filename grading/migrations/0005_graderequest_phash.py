@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grading', '0004_gradecacheentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='graderequest',
+            name='phash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='graderequest',
+            name='phash_back',
+            field=models.CharField(blank=True, default='', max_length=16),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grading', '0005_graderequest_phash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PtcgSet',
+            fields=[
+                ('id', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('ptcgo_code', models.CharField(blank=True, db_index=True, default='', max_length=16)),
+                ('name', models.CharField(blank=True, default='', max_length=120)),
+                ('data', models.JSONField(default=dict)),
+                ('updated_at', models.CharField(blank=True, default='', max_length=32)),
+                ('fetched_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PtcgCard',
+            fields=[
+                ('id', models.CharField(max_length=60, primary_key=True, serialize=False)),
+                ('set_id', models.CharField(max_length=40)),
+                ('number', models.CharField(blank=True, default='', max_length=16)),
+                ('name_lower', models.CharField(blank=True, default='', max_length=120)),
+                ('data', models.JSONField(default=dict)),
+                ('updated_at', models.CharField(blank=True, default='', max_length=32)),
+                ('fetched_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['set_id', 'number'], name='grading_ptc_set_id_fdbd8f_idx'), models.Index(fields=['set_id', 'name_lower'], name='grading_ptc_set_id_5ca2b1_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PtcgLookupMiss',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=8)),
+                ('key', models.CharField(max_length=200)),
+                ('checked_at', models.DateTimeField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'key'), name='uniq_ptcg_miss')],
+            },
+        ),
+    ]
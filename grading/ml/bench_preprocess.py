@@ -0,0 +1,112 @@
+# grading/ml/bench_preprocess.py
+"""
+Benchmark full-res vs pyramid quad detection for the three rectifiers.
+
+Usage:
+  python -m grading.ml.bench_preprocess --images dataset/images --max-side 1024 --repeat 3
+  # phone-sized inputs (the exported dataset is mostly ~1000-1440px):
+  python -m grading.ml.bench_preprocess --simulate-long-side 4032
+
+Importing openai_client needs OPENAI_API_KEY set (any value; no API calls are made).
+
+For each image, times (decode excluded) the full-resolution search (max_side=0)
+against the pyramid search (detect on a max_side copy, warp from the original), and
+reports how far the pyramid corners land from the full-res ones (in original pixels).
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+from pathlib import Path
+
+import cv2 as cv
+import numpy as np
+
+from grading.ml.cv_inference import _fallback_quad, _fallback_rectify
+from grading.ml.preprocess.pyramid import find_quad_pyramid
+from grading.ml.preprocess.rectify import _find_quad, rectify_card
+from grading.openai_client import _find_card_quad, _warp_card
+
+EXTS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+RECTIFIERS = {
+    # name: (full pipeline fn(img, max_side), quad finder)
+    "openai._warp_card":     (lambda img, m: _warp_card(img, max_side=m), _find_card_quad),
+    "rectify.rectify_card":  (lambda img, m: rectify_card(img, max_side=m), _find_quad),
+    "cv._fallback_rectify":  (lambda img, m: _fallback_rectify(img, max_side=m), _fallback_quad),
+}
+
+
+def _time_ms(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, (time.perf_counter() - t0) * 1000.0)
+    return best
+
+
+def _corner_err(a, b) -> float | None:
+    """Max distance between matched corners (order-independent), or None if either is missing."""
+    if a is None or b is None:
+        return None
+    a = np.asarray(a, np.float32).reshape(-1, 2)
+    b = np.asarray(b, np.float32).reshape(-1, 2)
+    d = np.linalg.norm(a[:, None, :] - b[None, :, :], axis=2)
+    return float(d.min(axis=1).max())
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--images", default="dataset/images")
+    ap.add_argument("--max-side", type=int, default=1024)
+    ap.add_argument("--repeat", type=int, default=3, help="best-of-N timing per image")
+    ap.add_argument("--limit", type=int, default=None)
+    ap.add_argument("--simulate-long-side", type=int, default=0,
+                    help="Upscale each image to this long side first (e.g. 4032 for a 12MP phone shot).")
+    args = ap.parse_args()
+
+    paths = sorted(p for p in Path(args.images).iterdir() if p.suffix.lower() in EXTS)
+    if args.limit:
+        paths = paths[:args.limit]
+    if not paths:
+        raise SystemExit(f"No images in {args.images}")
+
+    print(f"{len(paths)} images from {args.images} | pyramid max_side={args.max_side} | "
+          f"best of {args.repeat} | simulated long side={args.simulate_long_side or 'off'}")
+    for name, (run, finder) in RECTIFIERS.items():
+        full_ms, pyr_ms, errs = [], [], []
+        found_full = found_pyr = 0
+        for p in paths:
+            img = cv.imread(str(p), cv.IMREAD_COLOR)
+            if img is None:
+                continue
+            if args.simulate_long_side:
+                f = args.simulate_long_side / float(max(img.shape[:2]))
+                img = cv.resize(img, None, fx=f, fy=f, interpolation=cv.INTER_CUBIC)
+            full_ms.append(_time_ms(lambda: run(img, 0), args.repeat))
+            pyr_ms.append(_time_ms(lambda: run(img, args.max_side), args.repeat))
+
+            q_full = find_quad_pyramid(img, finder, max_side=0)
+            q_pyr = find_quad_pyramid(img, finder, max_side=args.max_side)
+            found_full += q_full is not None
+            found_pyr += q_pyr is not None
+            e = _corner_err(q_full, q_pyr)
+            if e is not None:
+                errs.append(e)
+
+        if not full_ms:
+            continue
+        f_med, p_med = statistics.median(full_ms), statistics.median(pyr_ms)
+        print(
+            f"{name:22s} full: mean {statistics.mean(full_ms):7.1f} ms  median {f_med:7.1f} ms | "
+            f"pyramid: mean {statistics.mean(pyr_ms):7.1f} ms  median {p_med:7.1f} ms | "
+            f"speedup x{f_med / max(p_med, 1e-6):.1f} | quads {found_full}→{found_pyr} | "
+            f"corner err median {statistics.median(errs) if errs else float('nan'):.1f}px "
+            f"max {max(errs) if errs else float('nan'):.1f}px"
+        )
+
+
+if __name__ == "__main__":
+    main()
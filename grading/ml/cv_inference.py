@@ -2,32 +2,36 @@
 from __future__ import annotations
 from pathlib import Path
 import os, uuid
-from typing import Union, Tuple
+from typing import Iterable, Iterator, Tuple, Union
 
 import numpy as np
 import cv2 as cv
-import torch
 from PIL import Image
 
+from grading import tracing
 from grading.ml.preprocess.rectify import rectify_card
 from grading.ml.preprocess.color import normalize_color
 from grading.ml.preprocess.quality import basic_quality_checks
+from grading.ml.preprocess.pyramid import DETECT_MAX_SIDE, find_quad_pyramid
 
-from .model import PairRegressor
-from .transforms import PairTransform  # same transform used in training
+from . import debug_writer, model_server
+from .eval_transform import pair_array  # PairTransform(train=False) without torch
+from .image_context import CardImage
 
 # ---------- config ----------
-DEBUG_DIR = os.environ.get("GRADING_DEBUG_DIR", "debug_runs")
 TARGET_MIN_SIDE = 1000        # where we *want* the rectified crop to be
 SOFT_MIN_SIDE   = 700         # accept anything this size and up, then upscale
 MIN_BLUR        = 110.0       # softer than before (was 140)
 MAX_GLARE       = 0.18        # softer than before (was 0.03)
 
-os.makedirs(DEBUG_DIR, exist_ok=True)
-
 
 # ---------- helpers ----------
-def _to_bgr(img_like: Union[np.ndarray, bytes, bytearray, Path, str, Image.Image]) -> np.ndarray:
+def _to_bgr(img_like: Union[np.ndarray, bytes, bytearray, Path, str, Image.Image, CardImage]) -> np.ndarray:
+    if isinstance(img_like, CardImage):
+        bgr = img_like.bgr
+        if bgr is None:
+            raise ValueError(f"Could not read image at {img_like.path}.")
+        return bgr
     if isinstance(img_like, np.ndarray):
         if img_like.ndim == 3 and img_like.shape[2] == 3:
             return img_like[..., ::-1].copy()  # assume RGB -> BGR
@@ -50,11 +54,8 @@ def _to_bgr(img_like: Union[np.ndarray, bytes, bytearray, Path, str, Image.Image
     raise ValueError("Unsupported image input type.")
 
 
-def _fallback_rectify(bgr: np.ndarray, ratio: float = 88/63) -> np.ndarray | None:
-    """
-    Extremely simple 'largest rectangle' fallback if rectify_card() fails.
-    Returns a perspective-warped BGR image with the Pokémon aspect (88x63).
-    """
+def _fallback_quad(bgr: np.ndarray) -> np.ndarray | None:
+    """Largest-contour minAreaRect box (4,2), or None if nothing card-sized is found."""
     h, w = bgr.shape[:2]
     gray = cv.cvtColor(bgr, cv.COLOR_BGR2GRAY)
     gray = cv.GaussianBlur(gray, (5, 5), 0)
@@ -71,7 +72,18 @@ def _fallback_rectify(bgr: np.ndarray, ratio: float = 88/63) -> np.ndarray | Non
         return None
 
     rect = cv.minAreaRect(cnt)
-    box = cv.boxPoints(rect).astype(np.float32)
+    return cv.boxPoints(rect).astype(np.float32)
+
+
+def _fallback_rectify(bgr: np.ndarray, ratio: float = 88/63, max_side: int = DETECT_MAX_SIDE) -> np.ndarray | None:
+    """
+    Extremely simple 'largest rectangle' fallback if rectify_card() fails.
+    Returns a perspective-warped BGR image with the Pokémon aspect (88x63).
+    The box is found on a downscaled copy; the warp samples the full-res image.
+    """
+    box = find_quad_pyramid(bgr, _fallback_quad, max_side=max_side)
+    if box is None:
+        return None
 
     # order the box points TL, TR, BR, BL
     def _order(pts):
@@ -119,35 +131,41 @@ def _maybe_upscale(img: np.ndarray, min_side_target: int = TARGET_MIN_SIDE) -> n
     return cv.resize(img, (new_w, new_h), interpolation=cv.INTER_CUBIC)
 
 
-def preprocess_one(bgr: np.ndarray, tag: str) -> Tuple[np.ndarray | None, dict]:
+def preprocess_one(bgr: np.ndarray, tag: str, ctx: CardImage | None = None) -> Tuple[np.ndarray | None, dict]:
     """
     rectify → color normalize → quality (soft gate) → optional upscale
-    Saves debug frames. Returns (image_or_None, report).
+    Saves debug frames (CARDGRADER_DEBUG, sampled) and tags the open trace span with the
+    rectifier used and the quality verdict. Returns (image_or_None, report).
+    With an image context the rectify_card() result is shared (e.g. with the perceptual hash).
     """
-    uid_tag = tag
     # 1) try main rectifier
-    rect = rectify_card(bgr)
+    rect = ctx.derive("rectify_card", lambda: rectify_card(bgr)) if ctx is not None else rectify_card(bgr)
     if rect is None or rect.image is None:
         # 2) fallback rectifier
         rect_img = _fallback_rectify(bgr)
         if rect_img is None:
-            print(f"[CVGrader] {uid_tag}: rectify failed (no card quadrilateral).")
+            tracing.tag(rectifier="none")
+            debug_writer.log(f"[CVGrader] {tag}: rectify failed (no card quadrilateral).")  # rare: failure path
             return None, {"ok": False, "reason": "Could not detect a reliable card quadrilateral."}
         image = rect_img
+        tracing.tag(rectifier="fallback")
     else:
         image = rect.image
+        tracing.tag(rectifier="main")
 
-    h, w = image.shape[:2]
-    print(f"[CVGrader] {uid_tag}: rectified size = {w}x{h}")
-    cv.imwrite(os.path.join(DEBUG_DIR, f"{tag}_rect_raw.jpg"), image)
+    debug_writer.save_image(image, f"{tag}_rect_raw.jpg")
 
     # 3) color normalize
     norm = normalize_color(image)
-    cv.imwrite(os.path.join(DEBUG_DIR, f"{tag}_rect_norm.jpg"), norm)
+    debug_writer.save_image(norm, f"{tag}_rect_norm.jpg")
 
     # 4) quality (softer thresholds)
     qr = basic_quality_checks(norm, min_side=SOFT_MIN_SIDE, min_blur=MIN_BLUR, max_glare=MAX_GLARE)
-    print(f"[CVGrader] {uid_tag}: quality ok={qr.ok} blur={qr.blur_var:.1f} glare={qr.glare_ratio:.4f} min_side={qr.min_side}")
+    tracing.tag(quality_ok=bool(qr.ok))
+    if debug_writer.active():
+        h, w = image.shape[:2]
+        debug_writer.log(f"[CVGrader] {tag}: rectified {w}x{h}; quality ok={qr.ok} blur={qr.blur_var:.1f} "
+                         f"glare={qr.glare_ratio:.4f} min_side={qr.min_side}")
 
     # 5) upscale if needed (even if quality said low min_side)
     norm = _maybe_upscale(norm, TARGET_MIN_SIDE)
@@ -163,47 +181,108 @@ def preprocess_one(bgr: np.ndarray, tag: str) -> Tuple[np.ndarray | None, dict]:
     return norm, report
 
 
+# ---------- edge fallback (analytical) ----------
+EDGE_BAND = 3
+CHIP_DIFF = 28       # grey levels off the card's median that count as a chip; tune on your photos
+CHIP_K = 180.0       # higher k makes it more forgiving
+
+
+def _border_strips(g: np.ndarray, band: int) -> Tuple[np.ndarray, ...]:
+    """The outer band as four non-overlapping strips (top, bottom, left, right)."""
+    return g[:band], g[-band:], g[band:-band, :band], g[band:-band, -band:]
+
+
+def _card_median(g: np.ndarray, band: int) -> np.float32:
+    h, w = g.shape
+    return np.median(g[band*2:h-band*2, band*2:w-band*2]).astype(np.float32)
+
+
+def _edge_fallback_score(rect_bgr: np.ndarray, band: int = EDGE_BAND) -> Tuple[float, float]:
+    """
+    Returns (score_0_10, chip_ratio).
+    chip_ratio = fraction of border-band pixels that deviate strongly from the card's median.
+    Only the band itself is compared (not a full-size diff image).
+    """
+    g = cv.cvtColor(rect_bgr, cv.COLOR_BGR2GRAY)
+    band = max(2, min(6, band))
+    ref = _card_median(g, band)
+    strips = _border_strips(g, band)
+    chips = sum(int((np.abs(s.astype(np.float32) - ref) > CHIP_DIFF).sum()) for s in strips)
+    chip_ratio = chips / float(sum(s.size for s in strips) + 1e-6)
+    # Map chip_ratio → score: 0.00 → 10, 0.5% → ~9, 1% → ~8, 2% → ~6, 5% → ~0
+    score = 10.0 * max(0.0, 1.0 - CHIP_K * chip_ratio)
+    return float(score), float(chip_ratio)
+
+
+def _save_edge_tiles(front_proc: np.ndarray, base: str, band: int = EDGE_BAND) -> None:
+    """Rectified front + chip overlay (red) for a sampled debug run."""
+    try:
+        debug_writer.save_image(front_proc, base + "_front_rect.jpg")
+        g = cv.cvtColor(front_proc, cv.COLOR_BGR2GRAY)
+        border = np.zeros(g.shape, bool)
+        for s in _border_strips(border, band):
+            s[...] = True
+        chip = (np.abs(g.astype(np.float32) - _card_median(g, band)) > CHIP_DIFF) & border
+        vis = front_proc.copy()
+        vis[chip] = (0, 0, 255)
+        debug_writer.save_image(vis, base + "_chip_overlay.jpg")
+    except Exception:
+        pass
+
+
+def _error_result(stage: str, exc: Exception) -> dict:
+    return {"success": False, "stage": stage, "message": str(exc) or exc.__class__.__name__}
+
+
 # ---------- main wrapper ----------
 class CVGrader:
     """
-    Unified inference wrapper with robust fallback + debug prints.
+    Unified inference wrapper with robust fallback. Stages are timed as trace spans
+    (cv_load / cv_preprocess / cv_model / cv_postprocess, no-ops without a trace);
+    diagnostics and debug images only exist in sampled debug runs.
+    Prefer model_server.get_grader() over constructing one per call.
     """
     def __init__(self,
                  weights_path: Union[str, Path] = "grading/ml/models/cardgrader_v1.pt",
                  size: int = 384,
-                 device: str | None = None) -> None:
-
-        self.device = torch.device(device or ("cuda" if torch.cuda.is_available() else "cpu"))
-        self.model = PairRegressor().to(self.device)
-        self.model.load_state_dict(torch.load(str(weights_path), map_location=self.device))
-        self.model.eval()
-        self.tf = PairTransform(train=False, size=size)
-
-    @torch.inference_mode()
-    def predict(self,
-                front: Union[np.ndarray, bytes, bytearray, Path, str, Image.Image],
-                back: Union[np.ndarray, bytes, bytearray, Path, str, Image.Image, None] = None
-                ) -> dict:
-
+                 device: str | None = None,
+                 model=None) -> None:
+
+        # shared, already warmed-up model (or the socket model server); use model_server.get_grader()
+        self.model = model if model is not None else model_server.regressor(weights_path, device)
+        self.size = size
+
+    @staticmethod
+    def _preprocess(src, bgr: np.ndarray, tag: str) -> Tuple[np.ndarray | None, dict]:
+        """preprocess_one, memoised on the image context when the caller passed one."""
+        if isinstance(src, CardImage):
+            return src.derive("cv_preprocess", lambda: preprocess_one(bgr, tag, ctx=src))
+        return preprocess_one(bgr, tag)
+
+    def _prepare(self, front, back) -> Tuple[dict | None, np.ndarray | None, dict]:
+        """Load + preprocess one pair. Returns (failure result or None, x [6,H,W], state for _finish)."""
         uid = uuid.uuid4().hex[:8]
-        print(f"[CVGrader] predict uid={uid}")
 
         # --- load to BGR ---
-        front_bgr = _to_bgr(front)
-        back_bgr  = _to_bgr(back) if back is not None else None
-        print(f"[CVGrader] {uid}: front_bgr shape={front_bgr.shape}; back={'yes' if back_bgr is not None else 'no'}")
+        with tracing.span("cv_load"):
+            front_bgr = _to_bgr(front)
+            back_bgr  = _to_bgr(back) if back is not None else None
+        if debug_writer.active():
+            debug_writer.log(f"[CVGrader] {uid}: front {front_bgr.shape}; back={'yes' if back_bgr is not None else 'no'}")
 
         # --- preprocess (rectify + normalize + quality) ---
-        front_proc, qf = preprocess_one(front_bgr, f"{uid}_front")
+        with tracing.span("cv_preprocess", side="front"):
+            front_proc, qf = self._preprocess(front, front_bgr, f"{uid}_front")
         if front_proc is None:
             return {
                 "success": False, "stage": "preprocess_front",
                 "message": qf.get("reason", "Unknown failure")
-            }
+            }, None, {}
 
         back_proc, qb = (None, {"ok": False, "reason": "No back image provided."})
         if back_bgr is not None:
-            back_proc, qb = preprocess_one(back_bgr, f"{uid}_back")
+            with tracing.span("cv_preprocess", side="back"):
+                back_proc, qb = self._preprocess(back, back_bgr, f"{uid}_back")
             if back_proc is None:
                 back_proc = front_proc  # keep shape/channel expectations
 
@@ -212,22 +291,79 @@ class CVGrader:
             return {
                 "success": False, "stage": "quality_front",
                 "message": qf.get("reason", "Front failed quality checks")
-            }
+            }, None, {}
 
         if back_proc is None:
             back_proc = front_proc
 
-        # --- to PIL RGB for PairTransform ---
+        # --- to PIL RGB, then the training transform ---
         front_pil = Image.fromarray(cv.cvtColor(front_proc, cv.COLOR_BGR2RGB))
         back_pil  = Image.fromarray(cv.cvtColor(back_proc,  cv.COLOR_BGR2RGB))
 
-        sample = {"front": front_pil, "back": back_pil}
-        x = self.tf(sample)["pair"].unsqueeze(0).to(self.device)  # [1, 6, H, W]
-        x_np = x.detach().cpu().numpy()
-        print(f"[CVGrader] {uid}: tensor x shape={tuple(x.shape)} dtype={x.dtype} "
-              f"min={x_np.min():.4f} max={x_np.max():.4f} mean={x_np.mean():.4f}")
+        x = pair_array(front_pil, back_pil, self.size)  # [6, H, W]
+        return None, x, {"uid": uid, "front_proc": front_proc, "qf": qf}
 
-        out = self.model(x)[0].detach().cpu().tolist()  # [6] -> [cent, surface, edges, corners, color, overall]
+    @debug_writer.scoped("cv")
+    def predict(self,
+                front: Union[np.ndarray, bytes, bytearray, Path, str, Image.Image, CardImage],
+                back: Union[np.ndarray, bytes, bytearray, Path, str, Image.Image, CardImage, None] = None
+                ) -> dict:
+        failed, x, state = self._prepare(front, back)
+        if failed is not None:
+            return failed
+        # concurrent callers in this process (or on the model server) share one forward pass
+        with tracing.span("cv_model", backend=getattr(self.model, "backend", "")):
+            out = self.model(x[None])[0].tolist()
+        with tracing.span("cv_postprocess"):
+            return self._finish(out, **state)
+
+    def predict_many(self, pairs: Iterable[tuple], batch_size: int = model_server.BATCH_MAX) -> Iterator[dict]:
+        """
+        predict() for many (front, back) pairs, batch_size pairs per forward pass.
+        Yields results in input order; pairs are read lazily (offline re-grading). A pair
+        that raises gets a failed result (stage load/model/postprocess) instead of ending the run.
+        Each batch is one debug run, opened and closed between yields.
+        """
+        it = iter(pairs)
+        while True:
+            with debug_writer.run("cv"):
+                results = self._predict_batch(it, max(1, batch_size))
+            if not results:
+                return
+            yield from results
+
+    def _predict_batch(self, it: Iterator[tuple], batch_size: int) -> list:
+        """Read pairs until batch_size of them reach the model (or `it` runs out); results in order."""
+        pending: list = []  # (failed, x, state) in input order
+        ready = 0
+        for front, back in it:
+            try:
+                pending.append(self._prepare(front, back))
+            except Exception as e:  # unreadable image or a preprocessing bug: this pair only
+                pending.append((_error_result("load", e), None, {}))
+            if pending[-1][0] is None:
+                ready += 1
+                if ready >= batch_size:
+                    break
+
+        xs = [x for failed, x, _ in pending if failed is None]
+        try:
+            outs = iter(self.model(np.stack(xs)).tolist() if xs else [])
+        except Exception as e:
+            return [failed or _error_result("model", e) for failed, _, _ in pending]
+        results = []
+        for failed, _, state in pending:
+            if failed is not None:
+                results.append(failed)
+                continue
+            try:
+                results.append(self._finish(next(outs), **state))
+            except Exception as e:
+                results.append(_error_result("postprocess", e))
+        return results
+
+    def _finish(self, out: list, uid: str, front_proc: np.ndarray, qf: dict) -> dict:
+        """Model outputs [6] -> clamped scores + edge fallback + overall guard."""
         keys = ["centering", "surface", "edges", "corners", "color", "overall"]
 
         # --- clamp & pack
@@ -237,37 +373,7 @@ class CVGrader:
 
         # ========= Edge fallback (analytical) =========
         # Use the rectified FRONT image (better signal) to estimate chips along the border band.
-        def edge_fallback_score(rect_bgr: np.ndarray, band: int = 3) -> tuple[float, float]:
-            """
-            Returns (score_0_10, chip_ratio).
-            chip_ratio = fraction of border-band pixels that deviate strongly from local median
-            """
-            g = cv.cvtColor(rect_bgr, cv.COLOR_BGR2GRAY)
-            h, w = g.shape
-            band = max(2, min(6, band))
-
-            # border mask (outer band px) and a just-inside band for local reference
-            border = np.zeros_like(g, np.uint8)
-            border[:band, :] = 1; border[-band:, :] = 1; border[:, :band] = 1; border[:, -band:] = 1
-
-            inner = np.zeros_like(g, np.uint8)
-            inner[band*2:h-band*2, band*2:w-band*2] = 1
-
-            # local reference: robust central median
-            ref = np.median(g[inner > 0]).astype(np.float32)
-            diff = np.abs(g.astype(np.float32) - ref)
-            chip_mask = (diff > 28) & (border > 0)  # 28 is a good first cut; tune on your photos
-
-            chip_ratio = float(chip_mask.sum()) / float(border.sum() + 1e-6)
-
-            # Map chip_ratio → score: 0.00 → 10, 0.5% → ~9, 1% → ~8, 2% → ~6, 5% → ~0
-            # Adjust k to taste
-            k = 180.0   # higher k makes it more forgiving
-            score = 10.0 * max(0.0, 1.0 - k * chip_ratio)
-            return float(score), float(chip_ratio)
-
-        # Compute fallback on the *front* rectified image
-        ef_score, ef_ratio = edge_fallback_score(front_proc, band=3)
+        ef_score, ef_ratio = _edge_fallback_score(front_proc, band=EDGE_BAND)
 
         # Decide how to combine
         # ENV knobs:
@@ -282,28 +388,11 @@ class CVGrader:
                 scores["edges"] = clamp(0.5 * (edges_before + ef_score))
             else:  # override
                 scores["edges"] = clamp(ef_score)
+            tracing.tag(edges_fallback=mode)
 
-        # --- save useful debug tiles ---
-        try:
-            uid = uid  # from above
-            dbg_base = os.path.join(DEBUG_DIR, f"{uid}_edges")
-            os.makedirs(DEBUG_DIR, exist_ok=True)
-            # full rect for visual inspection
-            cv.imwrite(dbg_base + "_front_rect.jpg", front_proc)
-            # visualize border band & chip mask
-            g = cv.cvtColor(front_proc, cv.COLOR_BGR2GRAY)
-            h, w = g.shape
-            band = 3
-            border = np.zeros_like(g, np.uint8)
-            border[:band, :] = 255; border[-band:, :] = 255; border[:, :band] = 255; border[:, -band:] = 255
-            ref = np.median(g[band*2:h-band*2, band*2:w-band*2]).astype(np.float32)
-            chip = (np.abs(g.astype(np.float32) - ref) > 28).astype(np.uint8) * 255
-            chip_border = cv.bitwise_and(chip, border)
-            vis = front_proc.copy()
-            vis[chip_border > 0] = (0, 0, 255)  # mark chips in red
-            cv.imwrite(dbg_base + "_chip_overlay.jpg", vis)
-        except Exception:
-            pass
+        # --- debug tiles (sampled debug runs only; nothing is built otherwise) ---
+        if debug_writer.active():
+            _save_edge_tiles(front_proc, f"{uid}_edges")
 
         # ========= Overall calculation guard =========
         # Keep your “zero-hard-fail” rule configurable so one bad head doesn’t auto-zero during debugging.
@@ -0,0 +1,224 @@
+# grading/ml/debug_writer.py
+"""
+Background writer for debug artifacts (CARDGRADER_DEBUG=1).
+
+Callers only enqueue: a daemon thread drains a bounded queue in batches and does the
+disk I/O (JPEG encoding included), so debug mode costs the request thread next to
+nothing. When the queue is full, artifacts are dropped rather than blocking.
+
+Artifacts are grouped per grade: run("ai") / @scoped("cv") open a run directory
+DEBUG_DIR/<utc-ts>_<label>_<id>/ with files numbered in call order and one debug.log.
+Runs are sampled (CARDGRADER_DEBUG_SAMPLE=0.01 → 1% of grades write anything) and only
+the newest CARDGRADER_DEBUG_MAX_RUNS directories are kept. Writes outside any run are
+dropped (jobs.run_job opens one per grade), so nothing escapes sampling or pruning.
+debug.log lines also go to the "grading.ml.debug_writer" logger at DEBUG level.
+
+Image arrays are encoded later, on the writer thread: don't draw on them after
+handing them over (pipeline arrays are read-only by convention anyway).
+"""
+from __future__ import annotations
+
+import asyncio
+import atexit
+import functools
+import itertools
+import logging
+import os
+import queue
+import random
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+import cv2 as cv
+import numpy as np
+
+DEBUG = os.getenv("CARDGRADER_DEBUG", "0").strip() not in {"", "0", "false", "False"}
+DEBUG_DIR = Path(os.getenv("CARDGRADER_DEBUG_DIR") or os.getenv("GRADING_DEBUG_DIR") or "debug_runs")
+DEBUG_SAMPLE = float(os.getenv("CARDGRADER_DEBUG_SAMPLE", "1.0"))
+DEBUG_QUEUE_MAX = int(os.getenv("CARDGRADER_DEBUG_QUEUE", "1024"))
+DEBUG_MAX_RUNS = int(os.getenv("CARDGRADER_DEBUG_MAX_RUNS", "500"))
+
+logger = logging.getLogger(__name__)
+
+
+class _Run:
+    def __init__(self, label: str, sampled: bool) -> None:
+        ts = datetime.utcnow().strftime("%Y-%m-%dT%H-%M-%S.%f")
+        self.dir = DEBUG_DIR / f"{ts}_{label}_{uuid.uuid4().hex[:6]}"
+        self.sampled = sampled
+        self._seq = itertools.count(1)
+
+    def path(self, name: str) -> Path:
+        return self.dir / f"{next(self._seq):03d}_{name}"
+
+
+_RUN: ContextVar[Optional[_Run]] = ContextVar("debug_run", default=None)
+
+_queue: "queue.Queue[tuple]" = queue.Queue(maxsize=DEBUG_QUEUE_MAX)
+_writer: Optional[threading.Thread] = None
+_writer_lock = threading.Lock()
+dropped = 0
+
+
+# =========================
+# Runs
+# =========================
+@contextmanager
+def run(label: str = "run") -> Iterator[None]:
+    """Group everything written inside into one run directory (no-op if nested)."""
+    if not DEBUG or _RUN.get() is not None:
+        yield
+        return
+    token = _RUN.set(_Run(label, sampled=random.random() < DEBUG_SAMPLE))
+    try:
+        yield
+    finally:
+        _RUN.reset(token)
+
+
+def scoped(label: str):
+    """Decorator form of run(), for sync and async entry points."""
+    def deco(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def awrapper(*args, **kwargs):
+                with run(label):
+                    return await fn(*args, **kwargs)
+            return awrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with run(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def _current() -> Optional[_Run]:
+    r = _RUN.get()
+    return r if r is not None and r.sampled else None
+
+
+def active() -> bool:
+    """True when this grade's artifacts are being kept (skip building them otherwise)."""
+    return DEBUG and _current() is not None
+
+
+# =========================
+# Writer thread
+# =========================
+def _ensure_writer() -> None:
+    global _writer
+    if _writer is not None and _writer.is_alive():
+        return
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_drain_forever, name="debug-writer", daemon=True)
+            _writer.start()
+
+
+def _enqueue(item: tuple) -> None:
+    global dropped
+    _ensure_writer()
+    try:
+        _queue.put_nowait(item)
+    except queue.Full:
+        dropped += 1
+
+
+def _write_one(kind: str, path: Path, payload: Any, logs: dict) -> None:
+    if kind == "log":
+        logs.setdefault(path, []).append(payload)
+        return
+    if kind == "img":
+        ok, buf = cv.imencode(".jpg", payload)
+        if ok:
+            path.write_bytes(buf.tobytes())
+    elif kind == "text":
+        path.write_text(payload, encoding="utf-8")
+
+
+def _prune(new_dir: Path) -> None:
+    try:
+        runs = sorted(p for p in DEBUG_DIR.iterdir() if p.is_dir())
+    except FileNotFoundError:
+        return
+    for p in runs[:max(0, len(runs) - DEBUG_MAX_RUNS)]:
+        if p != new_dir:
+            shutil.rmtree(p, ignore_errors=True)
+
+
+def _drain_forever() -> None:
+    seen_dirs = set()
+    while True:
+        batch = [_queue.get()]
+        try:
+            while len(batch) < 256:
+                batch.append(_queue.get_nowait())
+        except queue.Empty:
+            pass
+        logs: dict = {}
+        for kind, path, payload in batch:
+            try:
+                if path.parent not in seen_dirs:
+                    seen_dirs.add(path.parent)
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    _prune(path.parent)
+                _write_one(kind, path, payload, logs)
+            except Exception:
+                pass
+        for path, lines in logs.items():  # one append per log file per batch
+            try:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+            except Exception:
+                pass
+        for _ in batch:
+            _queue.task_done()
+
+
+def flush(timeout: float = 5.0) -> None:
+    """Wait (bounded) until everything queued so far is on disk."""
+    if _writer is None:
+        return
+    done = threading.Event()
+    threading.Thread(target=lambda: (_queue.join(), done.set()), daemon=True).start()
+    done.wait(timeout)
+
+
+atexit.register(flush, 2.0)
+
+
+# =========================
+# Public API
+# =========================
+def log(msg: str) -> None:
+    r = _current() if DEBUG else None
+    if r is None:
+        return
+    logger.debug(msg)
+    _enqueue(("log", r.dir / "debug.log", msg))
+
+
+def save_text(text: str, name: str) -> Optional[Path]:
+    r = _current() if DEBUG else None
+    if r is None:
+        return None
+    p = r.path(name)
+    _enqueue(("text", p, text))
+    return p
+
+
+def save_image(img_bgr: Optional[np.ndarray], name: str) -> Optional[Path]:
+    r = _current() if DEBUG else None
+    if r is None or img_bgr is None:
+        return None
+    p = r.path(name)
+    _enqueue(("img", p, img_bgr))
+    return p
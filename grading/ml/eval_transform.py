@@ -0,0 +1,34 @@
+# grading/ml/eval_transform.py
+"""
+Inference-time input for PairRegressor without torch/torchvision.
+
+Mirrors PairTransform(train=False) step for step (Resize(size) on PIL with bilinear
+filtering, CenterCrop(size), ToTensor, ImageNet Normalize, channel-concat), so the ONNX
+Runtime backend can run without importing torch. Keep it in sync with transforms.py;
+the parity test in grading/tests.py compares the two.
+"""
+from __future__ import annotations
+
+import numpy as np
+from PIL import Image
+
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32).reshape(3, 1, 1)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32).reshape(3, 1, 1)
+
+
+def _resize_crop(img: Image.Image, size: int) -> np.ndarray:
+    w, h = img.size
+    short, long = (w, h) if w <= h else (h, w)
+    new_long = int(size * long / short)  # torchvision's rounding for Resize(int)
+    new_w, new_h = (size, new_long) if w <= h else (new_long, size)
+    if (new_w, new_h) != (w, h):
+        img = img.resize((new_w, new_h), Image.BILINEAR)
+    top = int(round((new_h - size) / 2.0))
+    left = int(round((new_w - size) / 2.0))
+    arr = np.asarray(img.convert("RGB"), dtype=np.float32)[top:top + size, left:left + size]
+    return (arr.transpose(2, 0, 1) / 255.0 - MEAN) / STD
+
+
+def pair_array(front: Image.Image, back: Image.Image, size: int = 384) -> np.ndarray:
+    """float32 [6, size, size]: normalised front RGB then back RGB."""
+    return np.concatenate([_resize_crop(front, size), _resize_crop(back, size)]).astype(np.float32, copy=False)
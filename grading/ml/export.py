@@ -0,0 +1,62 @@
+# grading/ml/export.py
+"""
+Export PairRegressor weights for the CPU inference backends in model_server:
+
+- TorchScript: traced and frozen -> <weights>.ts (model_server runs
+  optimize_for_inference on it at load: conv/bn folding, oneDNN where available)
+- ONNX (opset 17, dynamic batch and image size) for ONNX Runtime -> <weights>.onnx
+
+model_server picks these up automatically when they are at least as new as the weights.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+import torch
+
+from .model import PairRegressor
+
+ONNX_OPSET = 17
+
+
+def load_eager(weights_path: Union[str, Path]) -> PairRegressor:
+    model = PairRegressor()
+    model.load_state_dict(torch.load(str(weights_path), map_location="cpu"))
+    return model.eval()
+
+
+def _example(size: int, batch: int = 1) -> torch.Tensor:
+    return torch.zeros(batch, 6, size, size)
+
+
+def export_torchscript(model: torch.nn.Module, out_path: Union[str, Path], size: int = 384) -> Path:
+    with torch.no_grad():
+        traced = torch.jit.trace(model, _example(size), check_trace=False)
+    # frozen (weights as constants, conv+bn folded); the oneDNN rewrite happens at load time
+    # because optimize_for_inference output doesn't survive save/load
+    torch.jit.save(torch.jit.freeze(traced.eval()), str(out_path))
+    return Path(out_path)
+
+
+def export_onnx(model: torch.nn.Module, out_path: Union[str, Path], size: int = 384,
+                opset: int = ONNX_OPSET) -> Path:
+    torch.onnx.export(
+        model, (_example(size),), str(out_path),
+        input_names=["pair"], output_names=["scores"],
+        dynamic_axes={"pair": {0: "batch", 2: "height", 3: "width"}, "scores": {0: "batch"}},
+        opset_version=opset,
+        dynamo=False,  # the TorchScript-based exporter needs only `onnx`, not onnxscript
+    )
+    return Path(out_path)
+
+
+def max_abs_diff(model: torch.nn.Module, regressor, size: int = 384, batch: int = 2,
+                 seed: Optional[int] = 0) -> float:
+    """Largest output difference between the eager model and a model_server backend."""
+    rng = np.random.default_rng(seed)
+    x = rng.normal(0.0, 1.0, size=(batch, 6, size, size)).astype(np.float32)
+    with torch.inference_mode():
+        ref = model(torch.from_numpy(x)).numpy()
+    return float(np.abs(np.asarray(regressor(x)) - ref).max())
@@ -1,14 +1,14 @@
 # grading/ml/identify.py
 import cv2 as cv, numpy as np, re
 from pathlib import Path
-import easyocr
 
-_reader = easyocr.Reader(['en'], gpu=False)
+from grading.ml import ocr
 
 def ocr_bottom_text(img_bgr):
     h,w = img_bgr.shape[:2]
     roi = img_bgr[int(h*0.88):int(h*0.98), int(w*0.05):int(w*0.95)]
-    res = _reader.readtext(roi, detail=0)
+    be = ocr.get_backend()  # shared, lazily loaded engine (see ocr.py)
+    res = [b.text for b in be.read(roi)] if be is not None else []
     text = " ".join(res)
     num = re.search(r'\b(\d{1,3})\s*/\s*(\d{1,3})\b', text)
     code = re.search(r'\b[A-Z0-9]{2,5}\b', text)  # rough set code
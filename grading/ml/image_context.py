@@ -0,0 +1,68 @@
+# grading/ml/image_context.py
+"""
+Per-request image context.
+
+One CardImage per upload: the file is read and decoded once, and every derived
+artifact (LLM warp, its JPEG data URL, CV rectification, hashes) is memoised on the
+object under a string key, so the AI pipeline, the CV blend, the result cache and the
+perceptual hash all share the same work. Arrays handed out are shared: treat them as
+read-only (copy before drawing on them).
+"""
+from __future__ import annotations
+
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Union
+
+import cv2 as cv
+import numpy as np
+
+
+class CardImage:
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+        self._memo: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    @classmethod
+    def of(cls, img: Union["CardImage", str, Path, None]) -> Optional["CardImage"]:
+        """Wrap a path (no-op for an existing context / None)."""
+        if img is None or isinstance(img, CardImage):
+            return img
+        return cls(img)
+
+    def __fspath__(self) -> str:
+        return str(self.path)
+
+    def __str__(self) -> str:
+        return str(self.path)
+
+    def __repr__(self) -> str:
+        return f"CardImage({str(self.path)!r}, memo={sorted(self._memo)})"
+
+    def derive(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Compute `fn()` once per key for this image. Concurrent callers of the same key
+        (parallel pipeline stages) wait for the first one instead of redoing the work.
+        """
+        try:
+            return self._memo[key]
+        except KeyError:
+            pass
+        with self._guard:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            if key not in self._memo:
+                self._memo[key] = fn()
+        return self._memo[key]
+
+    @property
+    def data(self) -> bytes:
+        """Raw file bytes (hashing / passthrough upload)."""
+        return self.derive("bytes", self.path.read_bytes)
+
+    @property
+    def bgr(self) -> Optional[np.ndarray]:
+        """Full-resolution decode (same EXIF handling as cv2.imread). None if unreadable."""
+        return self.derive("bgr", lambda: cv.imread(str(self.path), cv.IMREAD_COLOR))
@@ -0,0 +1,147 @@
+# grading/ml/local_gate.py
+"""
+Local front/back + photo-quality gate.
+
+Card backs are a fixed design per game (see GAME_BACK_RULES in openai_client), so a
+colour signature is enough to tell a back from a front most of the time:
+  • reference backs in grading/assets/backs/<game>*.jpg|png → H-S histogram correlation
+  • otherwise a built-in prior: share of the game's back colour in the card body
+Quality reuses vision_checks.detect_blur / detect_glare.
+
+Every decision carries a verdict of "sure" or None; callers only act on sure answers
+and send anything ambiguous to the LLM classifier. The local gate can only *accept*: it
+answers for a sure front-then-back pair of usable quality, and anything that would reject
+or swap the upload (wrong order, two fronts, a low-quality reading) goes to the LLM, so a
+blue-heavy front or one soft photo is never turned away on a colour share or a single
+blur threshold.
+"""
+from __future__ import annotations
+
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from grading.ml.vision_checks import detect_blur, detect_glare
+
+BACK_REFS_DIR = Path(os.getenv("CARDGRADER_BACK_REFS", "grading/assets/backs"))
+
+# Built-in back priors: OpenCV hue range (0..180), min saturation, and the share of
+# body pixels in that band above which it's surely a back / below which surely a front.
+# Pokémon backs measure ~0.41 (the ball and logo cover the middle), fronts 0.0–0.2.
+# One Piece (blue, white or red backs) and MTG need reference images instead.
+GAME_BACK_PRIORS: Dict[str, Dict[str, float]] = {
+    "pokemon": {"h_lo": 95, "h_hi": 130, "s_min": 80, "back_at": 0.30, "front_below": 0.12},
+}
+
+# Reference-histogram thresholds (HISTCMP_CORREL)
+REF_BACK_AT = 0.80
+REF_FRONT_BELOW = 0.35
+
+# Quality: clearly fine / clearly unusable; anything in between is left to the LLM.
+# detect_glare counts near-white pixels, so clean scans with white text boxes already
+# read ~0.2: glare alone never rejects locally, it only lowers the rating or defers.
+BLUR_OK, BLUR_BAD = 120.0, 35.0          # variance of Laplacian on the 896x640 canvas
+GLARE_OK, GLARE_DEFER = 0.010, 0.250     # share of near-white pixels
+
+
+def _body(img_bgr: np.ndarray) -> np.ndarray:
+    """Central region (drops the border and any letterbox bars)."""
+    h, w = img_bgr.shape[:2]
+    return img_bgr[int(h * 0.12):int(h * 0.88), int(w * 0.12):int(w * 0.88)]
+
+
+def _hs_hist(img_bgr: np.ndarray) -> np.ndarray:
+    hsv = cv2.cvtColor(_body(img_bgr), cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1], None, [30, 32], [0, 180, 0, 256])
+    return cv2.normalize(hist, hist).flatten()
+
+
+@lru_cache(maxsize=None)
+def _reference_hists(game: str) -> Tuple[np.ndarray, ...]:
+    if not BACK_REFS_DIR.is_dir():
+        return ()
+    out: List[np.ndarray] = []
+    for p in sorted(BACK_REFS_DIR.glob(f"{game}*")):
+        if p.suffix.lower() not in {".jpg", ".jpeg", ".png", ".webp"}:
+            continue
+        img = cv2.imread(str(p), cv2.IMREAD_COLOR)
+        if img is not None:
+            out.append(_hs_hist(img))
+    return tuple(out)
+
+
+def has_signature(game: str) -> bool:
+    return bool(game) and (game in GAME_BACK_PRIORS or bool(_reference_hists(game)))
+
+
+def classify_side(img_bgr: Optional[np.ndarray], game: str) -> Tuple[Optional[str], float]:
+    """("front" | "back" | None, score). None = not sure."""
+    if img_bgr is None or not has_signature(game):
+        return None, 0.0
+
+    refs = _reference_hists(game)
+    if refs:
+        h = _hs_hist(img_bgr)
+        score = max(float(cv2.compareHist(h.astype(np.float32), r.astype(np.float32), cv2.HISTCMP_CORREL))
+                    for r in refs)
+        if score >= REF_BACK_AT:
+            return "back", score
+        if score <= REF_FRONT_BELOW:
+            return "front", score
+        return None, score
+
+    pr = GAME_BACK_PRIORS[game]
+    hsv = cv2.cvtColor(_body(img_bgr), cv2.COLOR_BGR2HSV)
+    H, S = hsv[..., 0], hsv[..., 1]
+    share = float(((H >= pr["h_lo"]) & (H <= pr["h_hi"]) & (S >= pr["s_min"])).mean())
+    if share >= pr["back_at"]:
+        return "back", share
+    if share <= pr["front_below"]:
+        return "front", share
+    return None, share
+
+
+def assess_quality(img_bgr: Optional[np.ndarray]) -> Tuple[Optional[str], Dict[str, float]]:
+    """("high" | "medium" | "low" | None, metrics). None = borderline, let the LLM judge."""
+    if img_bgr is None:
+        return "low", {}
+    _, blur_var = detect_blur(img_bgr)
+    _, glare = detect_glare(img_bgr)
+    metrics = {"blur_var": float(blur_var), "glare_ratio": float(glare)}
+    if blur_var < BLUR_BAD:
+        return "low", metrics
+    if blur_var < BLUR_OK or glare > GLARE_DEFER:
+        return None, metrics
+    return ("high" if glare <= GLARE_OK else "medium"), metrics
+
+
+def local_gate(img1: Optional[np.ndarray], img2: Optional[np.ndarray], game: str) -> Optional[Dict]:
+    """
+    Gate dict in the LLM classifier's shape for a sure front + back pair of usable
+    quality (judged on the worse image); None otherwise, including every case the gate
+    would reject or swap. Those are left to the LLM classifier.
+    """
+    if img2 is None or not has_signature(game):
+        return None
+    s1, sc1 = classify_side(img1, game)
+    s2, sc2 = classify_side(img2, game)
+    if (s1, s2) != ("front", "back"):
+        return None
+
+    q1, m1 = assess_quality(img1)
+    q2, m2 = assess_quality(img2)
+    if q1 in (None, "low") or q2 in (None, "low"):
+        return None
+    quality = "high" if q1 == q2 == "high" else "medium"
+
+    return {
+        "detected_sides": {"image_1": s1, "image_2": s2},
+        "image_quality": quality,
+        "source": "local",
+        "scores": {"image_1": sc1, "image_2": sc2},
+        "metrics": {"image_1": m1, "image_2": m2},
+    }
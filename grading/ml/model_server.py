@@ -0,0 +1,427 @@
+# grading/ml/model_server.py
+"""
+One CV model per host instead of one per grade.
+
+The model is loaded once per process (load_regressor), warmed up with a dummy batch, and
+shared from there. Every backend takes and returns numpy ([B,6,H,W] float32 -> [B,6]):
+ONNX Runtime over <weights>.onnx, frozen TorchScript (<weights>.ts) or the eager
+PairRegressor, whichever exported file is present (`manage.py export_cv_model`). With the
+ONNX backend the CV path never imports torch/torchvision.
+
+- in-process: get_grader() hands every caller (CV engine, CV blend in the AI grader) the
+  same CVGrader, so a grade never reloads the weights from disk;
+- across forked workers: `grade_worker --processes N` preloads the model before forking and
+  the parameters live in shared memory (share_memory()), so N workers hold one copy;
+- across unrelated processes: `manage.py cv_model_server` serves the model on a Unix socket
+  (CARDGRADER_MODEL_SOCKET). Clients keep preprocessing locally and only send the [B,6,H,W]
+  batch; if the socket is unreachable (at startup or later, per call) they fall back to a
+  local copy.
+
+Either way the model sits behind a BatchingRegressor: concurrent grades (server
+connections, inline grades in web threads) are gathered for a few milliseconds and run as
+one forward pass, which on CPU gives noticeably more pairs/second than batches of one.
+CVGrader.predict_many() batches explicitly for offline re-grading.
+"""
+from __future__ import annotations
+
+import io
+import logging
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+try:
+    import torch
+except ImportError:  # ONNX Runtime-only install
+    torch = None
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+WEIGHTS_PATH = os.getenv("CARDGRADER_WEIGHTS", "grading/ml/models/cardgrader_v1.pt")
+SIZE = int(os.getenv("CARDGRADER_CV_SIZE", "384"))
+SOCKET_PATH = os.getenv("CARDGRADER_MODEL_SOCKET", "").strip()
+SOCKET_TIMEOUT_S = float(os.getenv("CARDGRADER_MODEL_SOCKET_TIMEOUT", "30"))
+# Dynamic batching: up to BATCH_MAX pairs per forward, waiting at most BATCH_WAIT_MS for
+# company after the first one arrives. CARDGRADER_CV_BATCH=1 turns it off.
+BATCH_MAX = int(os.getenv("CARDGRADER_CV_BATCH", "8"))
+BATCH_WAIT_MS = float(os.getenv("CARDGRADER_CV_BATCH_WAIT_MS", "5"))
+# auto | onnx | torchscript | eager. auto = the first of <weights>.onnx (with onnxruntime
+# installed), <weights>.ts, <weights>.pt that exists and isn't older than the .pt.
+BACKEND = os.getenv("CARDGRADER_CV_BACKEND", "auto").strip().lower()
+ORT_THREADS = int(os.getenv("CARDGRADER_ORT_THREADS", "0"))  # 0 = onnxruntime's default
+# int8: serve only the statically quantised <weights>.int8.onnx (python -m grading.ml.quantize).
+# No silent fp32 fallback: results are cached under the quantised fingerprint (jobs.cv_fingerprint).
+QUANT = os.getenv("CARDGRADER_CV_QUANT", "").strip().lower()
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct("!Q")  # frame = 8-byte length + np.save() payload
+
+_lock = threading.Lock()
+_regressors: Dict[Tuple[str, int, str], Any] = {}
+_graders: Dict[Tuple[str, int], "object"] = {}
+_batchers: Dict[int, "BatchingRegressor"] = {}
+
+
+# =========================
+# Backends: numpy float32 [B,6,H,W] in, [B,6] out
+# =========================
+class TorchRegressor:
+    """Eager PairRegressor or an exported TorchScript module."""
+
+    backend = "eager"
+
+    def __init__(self, module, device: str = "cpu") -> None:
+        self.module = module
+        self.device = torch.device(device)
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        with torch.inference_mode():
+            return self.module(torch.from_numpy(np.ascontiguousarray(x)).to(self.device)).cpu().numpy()
+
+    @classmethod
+    def eager(cls, weights_path: Union[str, Path], device: str = "cpu") -> "TorchRegressor":
+        from .model import PairRegressor  # lazy import: torchvision
+        module = PairRegressor().to(device)
+        module.load_state_dict(torch.load(str(weights_path), map_location=device))
+        module.eval()
+        if device == "cpu":
+            module.share_memory()  # forked workers map the same pages
+        return cls(module, device)
+
+    @classmethod
+    def torchscript(cls, path: Union[str, Path], device: str = "cpu") -> "TorchRegressor":
+        module = torch.jit.load(str(path), map_location=device).eval()
+        try:
+            module = torch.jit.optimize_for_inference(module)
+        except Exception:
+            pass  # already-optimised or non-frozen module: run it as is
+        reg = cls(module, device)
+        reg.backend = "torchscript"
+        return reg
+
+
+class OrtRegressor:
+    """ONNX Runtime session over the exported graph (no torch needed)."""
+
+    backend = "onnx"
+
+    def __init__(self, path: Union[str, Path], threads: int = ORT_THREADS) -> None:
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            opts.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(path), opts, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: np.ascontiguousarray(x, dtype=np.float32)})[0]
+
+
+def _artifacts(weights_path: Union[str, Path], device: str) -> List[Tuple[str, Path]]:
+    """(backend, file) candidates for these weights, in preference order."""
+    pt = Path(weights_path)
+    pt_mtime = pt.stat().st_mtime if pt.exists() else 0.0
+    order = {"auto": ["onnx", "torchscript", "eager"], "onnx": ["onnx"],
+             "torchscript": ["torchscript"], "eager": ["eager"]}.get(BACKEND, ["eager"])
+    if QUANT:
+        order = ["onnx-int8"] if QUANT == "int8" else []
+    suffix = {"onnx-int8": ".int8.onnx", "onnx": ".onnx", "torchscript": ".ts"}
+    out = []
+    for name in order:
+        path = pt if name == "eager" else pt.with_suffix(suffix[name])
+        if not path.exists() or (name != "eager" and path.stat().st_mtime < pt_mtime):
+            continue  # missing, or exported from older weights
+        if name.startswith("onnx") and (ort is None or device != "cpu"):
+            continue
+        if not name.startswith("onnx") and torch is None:
+            continue
+        out.append((name, path))
+    return out
+
+
+def _default_device() -> str:
+    return "cuda" if torch is not None and torch.cuda.is_available() else "cpu"
+
+
+def warm_up(model, size: int = SIZE) -> None:
+    """One dummy forward so the first real grade doesn't pay for allocator/kernel setup."""
+    model(np.zeros((1, 6, size, size), dtype=np.float32))
+
+
+def load_regressor(weights_path: Union[str, Path] = WEIGHTS_PATH,
+                   device: Optional[str] = None,
+                   warm: bool = True):
+    """The process-wide model for these weights (best available backend, warmed up once)."""
+    device = str(device or _default_device())
+    candidates = _artifacts(weights_path, device)
+    if not candidates:
+        if QUANT:
+            raise FileNotFoundError(
+                f"CARDGRADER_CV_QUANT={QUANT}: no usable {Path(weights_path).with_suffix('.int8.onnx')} "
+                f"(only int8 is supported; run python -m grading.ml.quantize, needs onnxruntime and a CPU device)")
+        raise FileNotFoundError(f"No usable CV model for {weights_path} (backend={BACKEND})")
+    name, path = candidates[0]
+    key = (str(path.resolve()), path.stat().st_mtime_ns, device)  # replaced files load fresh
+    model = _regressors.get(key)
+    if model is not None:
+        return model
+    with _lock:
+        model = _regressors.get(key)
+        if model is None:
+            if name.startswith("onnx"):
+                model = OrtRegressor(path)
+                model.backend = name
+            elif name == "torchscript":
+                model = TorchRegressor.torchscript(path, device)
+            else:
+                model = TorchRegressor.eager(path, device)
+            if warm:
+                warm_up(model)
+            _regressors[key] = model
+    return model
+
+
+def preload_for_fork(weights_path: Union[str, Path] = WEIGHTS_PATH) -> bool:
+    """
+    Load the CPU model in a parent that is about to fork workers. Loaded single-threaded
+    and without the warm-up forward: an intra-op thread pool started before fork() is not
+    usable in the children. Each child warms up on its first get_grader(). Only the eager
+    model is preloaded (its parameters are in shared memory); ONNX Runtime sessions are
+    not fork-safe and are small enough to load per worker.
+    """
+    candidates = _artifacts(weights_path, "cpu")
+    if torch is None or not candidates or candidates[0][0] != "eager":
+        return False
+    n = torch.get_num_threads()
+    torch.set_num_threads(1)
+    try:
+        load_regressor(weights_path, "cpu", warm=False)
+    finally:
+        torch.set_num_threads(n)
+    return True
+
+
+# =========================
+# Dynamic batching
+# =========================
+class BatchingRegressor:
+    """
+    Callable like the wrapped backend ([b,6,H,W] -> [b,6]), but concurrent calls are queued
+    and run together: one thread collects requests for up to max_wait_ms or max_batch
+    pairs, runs a single forward pass and hands each caller its rows.
+    """
+
+    def __init__(self, model, max_batch: int = BATCH_MAX, max_wait_ms: float = BATCH_WAIT_MS) -> None:
+        self.model = model
+        self.backend = getattr(model, "backend", "")
+        self.max_batch = max(1, max_batch)
+        self.max_wait_s = max(0.0, max_wait_ms) / 1000.0
+        self.batches = 0
+        self.items = 0
+        self._q: "queue.Queue[Tuple[np.ndarray, Future]]" = queue.Queue()
+        self._thread_pid = 0
+        self._start_lock = threading.Lock()
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        self._ensure_thread()
+        fut: Future = Future()
+        self._q.put((x, fut))
+        return fut.result()
+
+    def stats(self) -> Dict[str, float]:
+        return {"batches": self.batches, "items": self.items,
+                "mean_batch": round(self.items / self.batches, 2) if self.batches else 0.0}
+
+    def _ensure_thread(self) -> None:
+        if self._thread_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread_pid != os.getpid():  # threads don't survive fork(): one per process
+                self._q = queue.Queue()
+                threading.Thread(target=self._loop, name="cv-batcher", daemon=True).start()
+                self._thread_pid = os.getpid()
+
+    def _loop(self) -> None:
+        q = self._q
+        while True:
+            items = [q.get()]
+            n = items[0][0].shape[0]
+            deadline = time.monotonic() + self.max_wait_s
+            while n < self.max_batch:
+                try:
+                    item = q.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                items.append(item)
+                n += item[0].shape[0]
+            self._run(items)
+
+    def _run(self, items: List[Tuple[np.ndarray, Future]]) -> None:
+        groups: Dict[tuple, List[Tuple[np.ndarray, Future]]] = {}
+        for x, fut in items:
+            groups.setdefault(tuple(x.shape[1:]), []).append((x, fut))
+        for group in groups.values():  # only same-sized inputs can share a batch
+            try:
+                out = self.model(np.concatenate([x for x, _ in group]))
+                self.batches += 1
+                self.items += out.shape[0]
+                for part, (_, fut) in zip(np.split(out, np.cumsum([x.shape[0] for x, _ in group])[:-1]), group):
+                    fut.set_result(part)
+            except BaseException as e:  # noqa: BLE001 - every waiting caller gets the error
+                for _, fut in group:
+                    if not fut.done():
+                        fut.set_exception(e)
+
+
+def batched(model) -> "BatchingRegressor | object":
+    """The process-wide batching front of a model (the model itself when batching is off)."""
+    if BATCH_MAX <= 1:
+        return model
+    with _lock:
+        return _batchers.setdefault(id(model), BatchingRegressor(model))
+
+
+# =========================
+# Unix-socket model server
+# =========================
+def _send(sock: socket.socket, arr: np.ndarray) -> None:
+    buf = io.BytesIO()
+    np.save(buf, arr, allow_pickle=False)
+    data = buf.getvalue()
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    chunks = []
+    while n:
+        chunk = sock.recv(min(n, 1 << 20))
+        if not chunk:
+            raise ConnectionError("model server closed the connection")
+        chunks.append(chunk)
+        n -= len(chunk)
+    return b"".join(chunks)
+
+
+def _recv(sock: socket.socket) -> np.ndarray:
+    (n,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return np.load(io.BytesIO(_recv_exact(sock, n)), allow_pickle=False)
+
+
+class RemoteRegressor:
+    """
+    Callable like the local backends ([B,6,H,W] -> [B,6]), evaluated by cv_model_server.
+    A call the server can't answer (socket gone, refused, timed out) is run on the local
+    process-wide model instead, so a server that dies mid-life degrades rather than fails.
+    """
+
+    backend = "remote"
+
+    def __init__(self, socket_path: str, timeout_s: float = SOCKET_TIMEOUT_S,
+                 weights_path: Union[str, Path] = WEIGHTS_PATH, device: Optional[str] = None) -> None:
+        self.socket_path = socket_path
+        self.timeout_s = timeout_s
+        self.weights_path = weights_path
+        self.device = device
+        self._down = False  # log once per outage, not once per grade
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        try:
+            out = self._remote(x)
+        except OSError as e:
+            if not self._down:
+                logger.warning("CV model server %s unavailable (%s); running the model locally.",
+                               self.socket_path, e)
+                self._down = True
+            return batched(load_regressor(self.weights_path, self.device))(x)
+        if self._down:
+            logger.info("CV model server %s is answering again.", self.socket_path)
+            self._down = False
+        return out
+
+    def _remote(self, x: np.ndarray) -> np.ndarray:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(self.timeout_s)
+            s.connect(self.socket_path)
+            _send(s, np.asarray(x, dtype=np.float32))
+            return _recv(s)
+
+    def ping(self) -> bool:
+        try:
+            self._remote(np.zeros((1, 6, 32, 32), dtype=np.float32))
+            return True
+        except OSError:
+            return False
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        srv = self.server
+        try:
+            x = _recv(self.request)
+        except (OSError, ValueError):
+            return
+        out = srv.model(x)  # batched with the other connections' requests
+        _send(self.request, out)
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(socket_path: str = SOCKET_PATH, weights_path: Union[str, Path] = WEIGHTS_PATH,
+          size: int = SIZE, device: Optional[str] = None) -> None:
+    """Serve the model on a Unix socket until interrupted (manage.py cv_model_server)."""
+    if not socket_path:
+        raise ValueError("No socket path (set CARDGRADER_MODEL_SOCKET)")
+    model = load_regressor(weights_path, device, warm=False)
+    warm_up(model, size)
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)  # stale socket from a previous run
+    with _Server(socket_path, _Handler) as srv:
+        srv.model = BatchingRegressor(model)
+        try:
+            srv.serve_forever()
+        finally:
+            os.unlink(socket_path)
+
+
+# =========================
+# Entry point for callers
+# =========================
+def regressor(weights_path: Union[str, Path] = WEIGHTS_PATH, device: Optional[str] = None):
+    """The model server when one is configured and answering, else the local process-wide model."""
+    if SOCKET_PATH:
+        remote = RemoteRegressor(SOCKET_PATH, weights_path=weights_path, device=device)
+        if remote.ping():
+            return remote
+        logger.warning("CV model server %s not answering; loading the model locally.", SOCKET_PATH)
+    return batched(load_regressor(weights_path, device))
+
+
+def get_grader(weights_path: Union[str, Path] = WEIGHTS_PATH, size: int = SIZE):
+    """The process-wide CVGrader for these weights/input size."""
+    key = (str(Path(weights_path).resolve()), size)
+    grader = _graders.get(key)
+    if grader is not None:
+        return grader
+    from .cv_inference import CVGrader  # lazy import: cv_inference imports this module
+    with _lock:
+        grader = _graders.get(key)
+    if grader is None:
+        grader = CVGrader(weights_path=weights_path, size=size)
+        with _lock:
+            grader = _graders.setdefault(key, grader)
+    return grader
@@ -0,0 +1,190 @@
+# grading/ml/ocr.py
+"""
+Local OCR for the two short text reads in the AI pipeline (set code, card name).
+
+Pluggable backends, chosen by CARDGRADER_OCR:
+  auto      → EasyOCR if installed, else Tesseract (pytesseract), else none
+  easyocr   → EasyOCR only
+  tesseract → Tesseract only
+  llm/off   → no local engine (callers go straight to the LLM)
+
+Engines load lazily, once per process (warm_up() lets a worker pay that at boot), and
+calls are serialised per engine since neither reader is thread-safe. Readers return
+a confidence so callers can fall back to the LLM when the local read is shaky.
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+OCR_BACKEND = os.getenv("CARDGRADER_OCR", "auto").strip().lower()
+OCR_MIN_CONF = float(os.getenv("CARDGRADER_OCR_MIN_CONF", "0.6"))
+
+LANG_TOKENS = {"EN": "en", "JP": "jp"}
+_CODE_TOKEN = re.compile(r"^[A-Z]{2,4}[0-9]{0,3}[A-Z]?$")
+_NAME_NOISE = re.compile(r"^(BASIC|STAGE\s*[12]|HP\s*\d*|\d+\s*HP|\d+|TRAINER|ITEM|SUPPORTER|STADIUM|POK[EÉ]MON)$", re.I)
+
+
+@dataclass
+class OcrBox:
+    text: str
+    conf: float     # 0..1
+    height: float   # px, for "biggest text" heuristics
+    x: float        # left edge, for reading order
+
+
+class _EasyOCRBackend:
+    name = "easyocr"
+
+    def __init__(self) -> None:
+        import easyocr  # lazy: torch-sized import
+        self._reader = easyocr.Reader(["en"], gpu=False, verbose=False)
+        self._lock = threading.Lock()
+
+    def read(self, img_bgr: np.ndarray) -> List[OcrBox]:
+        with self._lock:
+            res = self._reader.readtext(img_bgr, detail=1, paragraph=False)
+        out = []
+        for box, text, conf in res:
+            ys = [p[1] for p in box]
+            xs = [p[0] for p in box]
+            out.append(OcrBox(str(text), float(conf), float(max(ys) - min(ys)), float(min(xs))))
+        return out
+
+
+class _TesseractBackend:
+    name = "tesseract"
+
+    def __init__(self) -> None:
+        import pytesseract  # lazy
+        pytesseract.get_tesseract_version()  # raises if the binary is missing
+        self._tess = pytesseract
+        self._lock = threading.Lock()
+
+    def read(self, img_bgr: np.ndarray) -> List[OcrBox]:
+        import cv2 as cv
+        rgb = cv.cvtColor(img_bgr, cv.COLOR_BGR2RGB)
+        with self._lock:
+            d = self._tess.image_to_data(rgb, config="--psm 6", output_type=self._tess.Output.DICT)
+        out = []
+        for text, conf, h, x in zip(d["text"], d["conf"], d["height"], d["left"]):
+            text = (text or "").strip()
+            c = float(conf)
+            if text and c >= 0:
+                out.append(OcrBox(text, c / 100.0, float(h), float(x)))
+        return out
+
+
+_BACKENDS = {"easyocr": _EasyOCRBackend, "tesseract": _TesseractBackend}
+
+
+_BACKEND_LOCK = threading.Lock()
+
+
+def get_backend():
+    """The local OCR engine for this process, or None (LLM only)."""
+    # The set-code and card-name stages run side by side; only one of them may load the engine.
+    with _BACKEND_LOCK:
+        return _load_backend()
+
+
+@lru_cache(maxsize=1)
+def _load_backend():
+    if OCR_BACKEND in {"llm", "off", "none", "0", ""}:
+        return None
+    order = ["easyocr", "tesseract"] if OCR_BACKEND == "auto" else [OCR_BACKEND]
+    for name in order:
+        cls = _BACKENDS.get(name)
+        if cls is None:
+            continue
+        try:
+            return cls()
+        except Exception:
+            continue
+    return None
+
+
+def warm_up() -> Optional[str]:
+    """Load the engine (and its models) now instead of on the first grade. Returns its name."""
+    be = get_backend()
+    if be is None:
+        return None
+    try:
+        be.read(np.full((32, 96, 3), 255, dtype=np.uint8))
+    except Exception:
+        pass
+    return be.name
+
+
+def _read(img_bgr: Optional[np.ndarray]) -> Optional[List[OcrBox]]:
+    be = get_backend()
+    if be is None or img_bgr is None:
+        return None
+    try:
+        return be.read(img_bgr)
+    except Exception:
+        return None
+
+
+def parse_set_code(boxes: Iterable[OcrBox], known_codes: Iterable[str]) -> Tuple[dict, float]:
+    """
+    Pick the set code out of the bottom-strip text. A token the set tables know is
+    trusted at the engine's confidence; an unknown code-shaped token is halved so it
+    only wins when the engine is very sure.
+    """
+    known = {c.upper() for c in known_codes}
+    tokens: List[Tuple[str, float]] = []
+    for b in boxes:
+        for t in re.split(r"[\s.\-_/]+", b.text.upper()):
+            if t:
+                tokens.append((t, b.conf))
+
+    best: Tuple[str, str, float] = ("", "unknown", 0.0)
+    for i, (tok, conf) in enumerate(tokens):
+        if not _CODE_TOKEN.match(tok) or tok in LANG_TOKENS:
+            continue
+        lang = "unknown"
+        if i + 1 < len(tokens) and tokens[i + 1][0] in LANG_TOKENS:
+            lang = LANG_TOKENS[tokens[i + 1][0]]
+        score = conf if tok in known else conf * 0.5
+        if score > best[2]:
+            best = (tok, lang, score)
+
+    code, lang, conf = best
+    if code and lang != "unknown":
+        code = f"{code} {'EN' if lang == 'en' else 'JP'}"
+    return {"set_code": code, "language": lang}, conf
+
+
+def parse_card_name(boxes: Iterable[OcrBox]) -> Tuple[str, float]:
+    """The card name is the tallest non-boilerplate text in the title bar."""
+    cands = [b for b in boxes if b.text.strip() and not _NAME_NOISE.match(b.text.strip())]
+    if not cands:
+        return "", 0.0
+    tallest = max(b.height for b in cands)
+    # same line as the tallest box → part of the name ("Charizard ex", "Professor's Research")
+    line = sorted((b for b in cands if b.height >= 0.7 * tallest), key=lambda b: b.x)
+    name = " ".join(b.text.strip() for b in line)
+    conf = min(b.conf for b in line)
+    return name, conf
+
+
+def read_set_code(strip_bgr: Optional[np.ndarray], known_codes: Iterable[str]) -> Optional[Tuple[dict, float]]:
+    """(parsed, confidence) from the local engine, or None if there is no engine."""
+    boxes = _read(strip_bgr)
+    if boxes is None:
+        return None
+    return parse_set_code(boxes, known_codes)
+
+
+def read_card_name(strip_bgr: Optional[np.ndarray]) -> Optional[Tuple[str, float]]:
+    boxes = _read(strip_bgr)
+    if boxes is None:
+        return None
+    return parse_card_name(boxes)
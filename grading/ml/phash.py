@@ -0,0 +1,113 @@
+# grading/ml/phash.py
+"""
+Perceptual hashing for near-duplicate card photos.
+
+dHash (64-bit difference hash) over the *rectified* card, so re-encodes, resizes and
+small framing changes of the same photo land within a few bits of each other.
+BKTree gives sub-linear Hamming-radius lookups over many stored hashes.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import cv2 as cv
+import numpy as np
+
+from grading.ml.image_context import CardImage
+from grading.ml.preprocess.rectify import rectify_card
+
+HASH_BITS = 64
+
+
+def dhash(bgr: np.ndarray, size: int = 8) -> int:
+    """Row-wise difference hash of a BGR (or gray) image → int with size*size bits."""
+    gray = cv.cvtColor(bgr, cv.COLOR_BGR2GRAY) if bgr.ndim == 3 else bgr
+    small = cv.resize(gray, (size + 1, size), interpolation=cv.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).tobytes().hex(), 16)
+
+
+def to_hex(h: int) -> str:
+    return f"{h:0{HASH_BITS // 4}x}"
+
+
+def from_hex(s: str) -> int:
+    return int(s, 16)
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def rectified(bgr: np.ndarray, ctx: Optional[CardImage] = None) -> np.ndarray:
+    """Canonical card crop for hashing; falls back to the full frame if no quad is found."""
+    rect = ctx.derive("rectify_card", lambda: rectify_card(bgr)) if ctx is not None else rectify_card(bgr)
+    return rect.image if rect is not None and rect.image is not None else bgr
+
+
+def image_phash(img: Union[np.ndarray, Path, str, CardImage, None], already_rectified: bool = False) -> str:
+    """Hex dHash of a card image (path, image context or BGR array); '' if it can't be read."""
+    if img is None:
+        return ""
+    if isinstance(img, CardImage):
+        ctx = img
+        return ctx.derive("phash", lambda: "" if ctx.bgr is None else to_hex(dhash(rectified(ctx.bgr, ctx))))
+    bgr = img if isinstance(img, np.ndarray) else cv.imread(str(img), cv.IMREAD_COLOR)
+    if bgr is None:
+        return ""
+    return to_hex(dhash(bgr if already_rectified else rectified(bgr)))
+
+
+class BKTree:
+    """
+    Burkhard–Keller tree over Hamming distance. Each node stores (hash, payloads);
+    children are keyed by their distance to the parent, so a radius-r query only
+    descends into children with |d - key| <= r.
+    """
+    __slots__ = ("_root", "_size")
+
+    def __init__(self, items: Iterable[Tuple[int, object]] = ()) -> None:
+        self._root: Optional[list] = None  # [hash, [payloads], {dist: node}]
+        self._size = 0
+        for h, payload in items:
+            self.add(h, payload)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, h: int, payload: object) -> None:
+        self._size += 1
+        if self._root is None:
+            self._root = [h, [payload], {}]
+            return
+        node = self._root
+        while True:
+            d = hamming(h, node[0])
+            if d == 0:
+                node[1].append(payload)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [h, [payload], {}]
+                return
+            node = child
+
+    def search(self, h: int, radius: int) -> List[Tuple[int, object]]:
+        """All (distance, payload) within `radius`, nearest first."""
+        out: List[Tuple[int, object]] = []
+        if self._root is None:
+            return out
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= radius:
+                out.extend((d, p) for p in node[1])
+            children: Dict[int, list] = node[2]
+            for k in range(max(1, d - radius), d + radius + 1):
+                child = children.get(k)
+                if child is not None:
+                    stack.append(child)
+        out.sort(key=lambda t: t[0])
+        return out
@@ -4,9 +4,10 @@ from dataclasses import dataclass
 from typing import Optional, Tuple
 import cv2 as cv
 import numpy as np
-import os
 
-DEBUG_DIR = os.environ.get("GRADING_DEBUG_DIR", "debug_runs")
+from grading.ml import debug_writer
+from .pyramid import DETECT_MAX_SIDE, find_quad_pyramid
+
 
 @dataclass
 class RectResult:
@@ -68,20 +69,21 @@ def _find_quad(img: np.ndarray) -> Optional[np.ndarray]:
     # Pass 1: normal
     quad, overlay = pass_once(5, 50, 140, 5, 1)
     if quad is not None:
-        cv.imwrite(os.path.join(DEBUG_DIR, "rectify_pass1_overlay.jpg"), overlay)
+        debug_writer.save_image(overlay, "rectify_pass1_overlay.jpg")
         return quad
 
     # Pass 2: more aggressive
     quad, overlay = pass_once(7, 20, 200, 7, 2)
-    cv.imwrite(os.path.join(DEBUG_DIR, "rectify_pass2_overlay.jpg"), overlay)
+    debug_writer.save_image(overlay, "rectify_pass2_overlay.jpg")
     return quad
 
-def rectify_card(bgr: np.ndarray) -> Optional[RectResult]:
+def rectify_card(bgr: np.ndarray, max_side: int = DETECT_MAX_SIDE) -> Optional[RectResult]:
     """
     Detect the card quadrilateral and warp it to a canonical aspect.
+    Detection runs on a downscaled copy (pyramid.py); the warp uses the full-res image.
     Returns None if no convincing quad found.
     """
-    quad = _find_quad(bgr)
+    quad = find_quad_pyramid(bgr, _find_quad, max_side=max_side)
     if quad is None:
         return None
     warped = _warp(bgr, quad, out_h=1100)
@@ -0,0 +1,194 @@
+# grading/ml/quantize.py
+"""
+Post-training static INT8 quantisation of the CV grader, calibrated on real card photos.
+
+Usage:
+  python -m grading.ml.quantize --weights grading/ml/models/cardgrader_v1.pt --images dataset/images
+  # then serve it:  CARDGRADER_CV_QUANT=int8  (next to CARDGRADER_WEIGHTS)
+
+Importing openai_client isn't needed; cv2, onnx and onnxruntime are (torch only to export
+the fp32 ONNX model if <weights>.onnx is missing or older than the weights).
+
+Pairs are <id>_front.* / <id>_back.* in --images (export_dataset layout), run through the
+production preprocessing (rectify, colour normalise, pair_array). Even-indexed pairs
+calibrate the activation ranges (QDQ, per-channel int8 weights); odd-indexed pairs are
+held out for the report: per-head MAE of int8 against fp32 (and of both against the
+dataset's labels when --csv has them), per-pair latency and model size. The report is
+also written to <weights>.int8.json.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from grading.ml import model_server
+from grading.ml.cv_inference import CVGrader
+
+EXTS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+HEADS = ["centering", "surface", "edges", "corners", "color", "overall"]
+
+
+def _pairs(images: Path) -> List[Tuple[str, Path, Path]]:
+    """(id, front, back) for every <id>_front.* (back = front when there's no back image)."""
+    files = {p.stem: p for p in images.iterdir() if p.suffix.lower() in EXTS}
+    out = []
+    for stem, front in sorted(files.items()):
+        if stem.endswith("_front"):
+            pid = stem[:-len("_front")]
+            out.append((pid, front, files.get(f"{pid}_back", front)))
+    return out
+
+
+def _labels(csv_path: Optional[Path]) -> Dict[str, List[float]]:
+    if csv_path is None or not csv_path.exists():
+        return {}
+    out = {}
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            try:
+                vals = [float(row[h]) for h in HEADS[:-1]]
+                vals.append(float(row.get("overall_grade") or row["predicted_grade"]))
+            except (KeyError, TypeError, ValueError):
+                continue
+            out[str(row.get("id", ""))] = vals
+    return out
+
+
+def _inputs(grader: CVGrader, pairs) -> Tuple[List[str], np.ndarray]:
+    ids, xs = [], []
+    for pid, front, back in pairs:
+        try:
+            failed, x, _ = grader._prepare(str(front), str(back))
+        except ValueError:
+            continue
+        if failed is None:
+            ids.append(pid)
+            xs.append(x)
+    return ids, (np.stack(xs) if xs else np.zeros((0,)))
+
+
+def _fp32_onnx(weights: Path, size: int) -> Path:
+    path = weights.with_suffix(".onnx")
+    if not path.exists() or path.stat().st_mtime < weights.stat().st_mtime:
+        from grading.ml import export  # lazy import: torch
+        export.export_onnx(export.load_eager(weights), path, size)
+    return path
+
+
+class _Calibration:
+    """onnxruntime CalibrationDataReader over preprocessed pairs, one per batch."""
+
+    def __init__(self, input_name: str, xs: np.ndarray) -> None:
+        self._it = iter([{input_name: x[None]} for x in xs])
+
+    def get_next(self):
+        return next(self._it, None)
+
+
+def quantize(fp32_path: Path, out_path: Path, calib: np.ndarray, per_channel: bool = True) -> Path:
+    from onnxruntime import quantization as q  # lazy import
+
+    prepped = out_path.with_suffix(".prep.onnx")
+    try:
+        q.quant_pre_process(str(fp32_path), str(prepped))  # shape inference + graph cleanup
+        src = prepped
+    except Exception:
+        src = fp32_path
+    name = model_server.OrtRegressor(src).input_name
+    q.quantize_static(
+        str(src), str(out_path), _Calibration(name, calib),
+        quant_format=q.QuantFormat.QDQ,
+        per_channel=per_channel,
+        activation_type=q.QuantType.QUInt8,
+        weight_type=q.QuantType.QInt8,
+        calibrate_method=q.CalibrationMethod.MinMax,
+    )
+    if prepped.exists():
+        prepped.unlink()
+    return out_path
+
+
+def _latency_ms(model, xs: np.ndarray, repeat: int) -> List[float]:
+    model(xs[:1])  # warm-up
+    out = []
+    for x in xs:
+        best = float("inf")
+        for _ in range(repeat):
+            t = time.perf_counter()
+            model(x[None])
+            best = min(best, (time.perf_counter() - t) * 1000.0)
+        out.append(best)
+    return out
+
+
+def _mae(a: np.ndarray, b: np.ndarray) -> Dict[str, float]:
+    err = np.abs(np.clip(a, 0, 10) - np.clip(b, 0, 10)).mean(axis=0)
+    return {h: round(float(e), 4) for h, e in zip(HEADS, err)}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--weights", default=model_server.WEIGHTS_PATH)
+    ap.add_argument("--images", default="dataset/images")
+    ap.add_argument("--csv", default="dataset/metadata.csv", help="labels for the accuracy report (by id)")
+    ap.add_argument("--size", type=int, default=model_server.SIZE)
+    ap.add_argument("--repeat", type=int, default=3, help="best-of-N timing per pair")
+    ap.add_argument("--per-tensor", action="store_true", help="per-tensor instead of per-channel weights")
+    args = ap.parse_args()
+
+    weights = Path(args.weights)
+    fp32_path = _fp32_onnx(weights, args.size)
+    fp32 = model_server.OrtRegressor(fp32_path)
+    pairs = _pairs(Path(args.images))
+    ids, xs = _inputs(CVGrader(weights, size=args.size, model=fp32), pairs)
+    if len(ids) < 2:
+        raise SystemExit(f"Need at least 2 usable pairs in {args.images} (got {len(ids)} of {len(pairs)})")
+    calib, held = xs[0::2], xs[1::2]
+    held_ids = ids[1::2]
+    print(f"{len(pairs)} pairs, {len(ids)} usable: {len(calib)} calibrate, {len(held)} held out")
+
+    out_path = weights.with_suffix(".int8.onnx")
+    quantize(fp32_path, out_path, calib, per_channel=not args.per_tensor)
+    int8 = model_server.OrtRegressor(out_path)
+
+    y32, y8 = fp32(held), int8(held)
+    lat32, lat8 = _latency_ms(fp32, held, args.repeat), _latency_ms(int8, held, args.repeat)
+    report = {
+        "weights": str(weights), "int8_model": str(out_path), "size": args.size,
+        "calibration_pairs": len(calib), "held_out_pairs": len(held),
+        "mae_int8_vs_fp32": _mae(y8, y32),
+        "max_abs_int8_vs_fp32": round(float(np.abs(y8 - y32).max()), 4),
+        "latency_ms_median": {"fp32": round(statistics.median(lat32), 1), "int8": round(statistics.median(lat8), 1)},
+        "model_mb": {"fp32": round(fp32_path.stat().st_size / 1e6, 1), "int8": round(out_path.stat().st_size / 1e6, 1)},
+    }
+    labels = _labels(Path(args.csv) if args.csv else None)
+    labelled = [i for i, pid in enumerate(held_ids) if pid in labels]
+    if labelled:
+        y = np.array([labels[held_ids[i]] for i in labelled], dtype=np.float32)
+        report["labelled_pairs"] = len(labelled)
+        report["mae_vs_labels"] = {"fp32": _mae(y32[labelled], y), "int8": _mae(y8[labelled], y)}
+    with open(weights.with_suffix(".int8.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'head':<10} {'int8 vs fp32':>12}" + (f" {'fp32 vs label':>14} {'int8 vs label':>14}" if labelled else ""))
+    for h in HEADS:
+        line = f"{h:<10} {report['mae_int8_vs_fp32'][h]:>12.3f}"
+        if labelled:
+            line += f" {report['mae_vs_labels']['fp32'][h]:>14.3f} {report['mae_vs_labels']['int8'][h]:>14.3f}"
+        print(line)
+    lat = report["latency_ms_median"]
+    print(f"latency median: fp32 {lat['fp32']:.1f} ms, int8 {lat['int8']:.1f} ms "
+          f"(x{lat['fp32'] / max(lat['int8'], 1e-6):.2f}) | size {report['model_mb']['fp32']} MB → "
+          f"{report['model_mb']['int8']} MB")
+    print(f"Wrote {out_path} (enable with CARDGRADER_CV_QUANT=int8)")
+
+
+if __name__ == "__main__":
+    main()
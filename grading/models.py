@@ -6,6 +6,18 @@ from django.conf import settings
 from django.db import models
 
 class GradeRequest(models.Model):
+    # Job lifecycle (see grading/jobs.py). Rows graded in-request go straight to DONE.
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL
     )
@@ -30,11 +42,29 @@ class GradeRequest(models.Model):
 
     raw_json = models.JSONField(default=dict, blank=True)
 
+    # Perceptual hashes (64-bit dHash, hex) of the rectified front/back; see grading/phash_index.py
+    phash = models.CharField(max_length=16, blank=True, default="", db_index=True)
+    phash_back = models.CharField(max_length=16, blank=True, default="")
+
+    # Job queue
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_DONE, db_index=True)
+    engine = models.CharField(max_length=10, blank=True, default="")  # "ai" | "cv"
+    job_params = models.JSONField(default=dict, blank=True)  # e.g. ptcgo_code, collector_number
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=64, blank=True, default="")
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ["-created_at"]
 
+    @property
+    def is_pending(self) -> bool:
+        return self.status in (self.STATUS_QUEUED, self.STATUS_RUNNING)
+
     def __str__(self):
         who = self.user.username if self.user else "guest"
         return f"GradeRequest #{self.pk} by {who} – PSA~{self.predicted_grade}"
@@ -75,3 +105,65 @@ class GradedCard(models.Model):
 
     def __str__(self):
         return f"{self.card_name or 'Unnamed Card'} - {self.predicted_label or 'Ungraded'}"
+
+
+class GradeCacheEntry(models.Model):
+    """
+    Content-addressed grade results (see grading/result_cache.py). The key hashes the
+    image bytes + every input that can change the answer, so a hit is a safe replay.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    engine = models.CharField(max_length=10)
+    result = models.JSONField(default=dict)
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_hit_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.engine}:{self.key[:12]} ({self.hits} hits)"
+
+
+class PtcgSet(models.Model):
+    """pokemontcg.io set, cached locally (see grading/utils/pokemon_cache.py)."""
+    id = models.CharField(max_length=40, primary_key=True)  # e.g. "sv3pt5"
+    ptcgo_code = models.CharField(max_length=16, blank=True, default="", db_index=True)
+    name = models.CharField(max_length=120, blank=True, default="")
+    data = models.JSONField(default=dict)  # the dict pokemon_cache.get_set_by_code returns
+    updated_at = models.CharField(max_length=32, blank=True, default="")  # upstream `updatedAt`
+    fetched_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.ptcgo_code or '-'} {self.name} ({self.id})"
+
+
+class PtcgCard(models.Model):
+    """pokemontcg.io card, cached locally; looked up by (set, number) or (set, name)."""
+    id = models.CharField(max_length=60, primary_key=True)  # e.g. "sv3pt5-6"
+    set_id = models.CharField(max_length=40)
+    number = models.CharField(max_length=16, blank=True, default="")
+    name_lower = models.CharField(max_length=120, blank=True, default="")
+    data = models.JSONField(default=dict)  # the dict pokemon_cache.get_card_in_set returns
+    updated_at = models.CharField(max_length=32, blank=True, default="")
+    fetched_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["set_id", "number"]),
+            models.Index(fields=["set_id", "name_lower"]),
+        ]
+
+    def __str__(self):
+        return f"{self.set_id} #{self.number} {self.data.get('name', '')}"
+
+
+class PtcgLookupMiss(models.Model):
+    """Negative cache: a PTCG query that found nothing, so it isn't repeated every grade."""
+    kind = models.CharField(max_length=8)  # "set" | "card"
+    key = models.CharField(max_length=200)
+    checked_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["kind", "key"], name="uniq_ptcg_miss")]
+
+    def __str__(self):
+        return f"miss {self.kind}:{self.key}"
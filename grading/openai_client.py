@@ -1,23 +1,35 @@
 # grading/openai_client.py
 from __future__ import annotations
 
+import asyncio
 import base64
-import io
+import contextvars
+import hashlib
 import json
 import mimetypes
 import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Optional, Any, Tuple
+from typing import Dict, Optional, Any, Tuple, Union
 
 from grading.utils import pokemon_cache
 
 import cv2
 import numpy as np
-from PIL import Image
-from openai import OpenAI
-from datetime import datetime
+import httpx
+from openai import AsyncOpenAI, OpenAI
 import traceback
 
+from grading import exemplar_store, grade_rules, llm_payload, set_registry, tracing
+from grading.llm_schemas import (
+    CardNameRead, Classification, GradeReport, SchemaError, SetCodeRead, response_format,
+)
+from grading.ml import debug_writer, local_gate, ocr, symbol_match
+from grading.ml.image_context import CardImage
+from grading.ml.preprocess.pyramid import DETECT_MAX_SIDE, find_quad_pyramid
 from grading.ml.vision_checks import run_vision_checks_img
 
 # =========================
@@ -26,19 +38,76 @@ from grading.ml.vision_checks import run_vision_checks_img
 OPENAI_MODEL_GRADE = os.getenv("OPENAI_GRADING_MODEL", "gpt-4o")
 OPENAI_MODEL_CLASS = os.getenv("OPENAI_CLASSIFIER_MODEL", "gpt-4o-mini")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "32"))
+# Strict JSON-schema replies (grading/llm_schemas.py). 0 = plain text + lenient parsing,
+# for models without structured outputs. Replies that still miss the schema are
+# re-asked up to OPENAI_SCHEMA_RETRIES more times.
+OPENAI_STRUCTURED = os.getenv("OPENAI_STRUCTURED_OUTPUTS", "1").strip() not in {"", "0", "false", "False"}
+OPENAI_SCHEMA_RETRIES = max(0, int(os.getenv("OPENAI_SCHEMA_RETRIES", "1")))
 
 REQUIRE_FRONT_FIRST = True
 
-# Debugging
-DEBUG = os.getenv("CARDGRADER_DEBUG", "0").strip() not in {"", "0", "false", "False"}
-DEBUG_DIR = Path(os.getenv("CARDGRADER_DEBUG_DIR", "./debug_runs"))
-if DEBUG:
-    DEBUG_DIR.mkdir(parents=True, exist_ok=True)
+# Debugging (artifacts go through grading.ml.debug_writer: per-grade run dirs, sampled)
+DEBUG = debug_writer.DEBUG
 
 # CV blending (keep OFF until you train on more data)
 BLEND_CV_ALPHA = float(os.getenv("CV_BLEND_ALPHA", "0.0"))  # 0.0 = disabled
 CV_WEIGHTS = os.getenv("CARDGRADER_WEIGHTS", "grading/ml/models/cardgrader_v1.pt")
 
+# Stage fan-out: run independent stages (gate, preprocess, OCR, lookups, CV checks)
+# side by side and only join at the grader call. 0 = strictly serial (old behaviour).
+CONCURRENT_STAGES = os.getenv("CARDGRADER_CONCURRENT", "1").strip() not in {"", "0", "false", "False"}
+STAGE_WORKERS = int(os.getenv("CARDGRADER_STAGE_WORKERS", "8"))
+
+# Local front/back + quality gate (colour signature, blur/glare). Only uncertain
+# uploads reach the LLM classifier. 0 = always ask the LLM.
+LOCAL_GATE = os.getenv("CARDGRADER_LOCAL_GATE", "1").strip() not in {"", "0", "false", "False"}
+
+
+def _sources_digest() -> str:
+    """sha1 over the prompt/rule sources: this module, grade_rules, llm_schemas, the set tables."""
+    h = hashlib.sha1()
+    for path in (Path(__file__), Path(grade_rules.__file__), Path(__file__).with_name("llm_schemas.py"),
+                 Path(set_registry.REGISTRY_PATH)):
+        try:
+            h.update(path.read_bytes())
+        except OSError:
+            h.update(b"missing")
+        h.update(b"\0")
+    return h.hexdigest()[:12]
+
+
+def _cv_weights_stat() -> str:
+    try:
+        st = os.stat(CV_WEIGHTS)
+    except OSError:
+        return "missing"
+    return f"{st.st_size}:{int(st.st_mtime)}"
+
+
+@lru_cache(maxsize=1)
+def cache_fingerprint() -> Dict[str, Any]:
+    """
+    Everything config-side that changes a grade; part of the result-cache key.
+    Hashing the prompt/rule sources means any prompt, rule, schema or set-table edit
+    invalidates old entries; retrained blend weights do too (size/mtime, as cv_fingerprint).
+    """
+    blend = BLEND_CV_ALPHA > 0.0
+    return {
+        "code": _sources_digest(),
+        "grade_model": OPENAI_MODEL_GRADE,
+        "class_model": OPENAI_MODEL_CLASS,
+        "structured": OPENAI_STRUCTURED,
+        "require_front_first": REQUIRE_FRONT_FIRST,
+        "cv_alpha": BLEND_CV_ALPHA,
+        "cv_weights": CV_WEIGHTS if blend else "",
+        "cv_weights_stat": _cv_weights_stat() if blend else "",
+        "ocr": f"{ocr.OCR_BACKEND}@{ocr.OCR_MIN_CONF}",
+        "payload": llm_payload.fingerprint(),
+        "local_gate": LOCAL_GATE,
+    }
+
 client = OpenAI(api_key=OPENAI_API_KEY)
 
 # =========================
@@ -100,150 +169,157 @@ def _coerce_card_images(imgs_obj) -> dict:
         "url":   getattr(imgs_obj, "url",   "") or "",
     }
 
-def _nowts() -> str:
-    return datetime.utcnow().strftime("%Y-%m-%dT%H-%M-%S.%fZ")
-
-
-def _dbg_path(name: str) -> Path:
-    return DEBUG_DIR / f"{_nowts()}_{name}"
-
-
 def _debug(msg: str):
-    if not DEBUG:
-        return
-    line = f"[CARDGRADER DEBUG] {msg}"
-    print(line)
-    try:
-        with open(_dbg_path("debug.log"), "a", encoding="utf-8") as f:
-            f.write(line + "\n")
-    except Exception:
-        pass
+    debug_writer.log(f"[CARDGRADER DEBUG] {msg}")
 
 
 def _save_json_debug(obj: Any, name: str):
-    if not DEBUG:
-        return
+    if not debug_writer.active():
+        return  # skip the sanitize/dumps too
     try:
-        p = _dbg_path(name)
-        with open(p, "w", encoding="utf-8") as f:
-            json.dump(_json_sanitize(obj), f, ensure_ascii=False, indent=2, default=str)
-        _debug(f"Saved JSON → {p}")
+        text = json.dumps(_json_sanitize(obj), ensure_ascii=False, indent=2, default=str)
+        _debug(f"Saved JSON → {debug_writer.save_text(text, name)}")
     except Exception:
         _debug("Failed to save JSON: " + traceback.format_exc())
 
 
-
 def _save_text_debug(text: str, name: str):
-    if not DEBUG:
-        return
-    try:
-        p = _dbg_path(name)
-        with open(p, "w", encoding="utf-8") as f:
-            f.write(text)
-        _debug(f"Saved text → {p}")
-    except Exception:
-        _debug("Failed to save text: " + traceback.format_exc())
+    if debug_writer.active():
+        _debug(f"Saved text → {debug_writer.save_text(text, name)}")
 
 
 def _save_img_debug(img_bgr: Optional[np.ndarray], name: str):
-    if not DEBUG or img_bgr is None:
-        return
-    try:
-        p = _dbg_path(name)
-        cv2.imwrite(str(p), img_bgr)
-        _debug(f"Saved image → {p}")
-    except Exception:
-        _debug("Failed to save image: " + traceback.format_exc())
+    if debug_writer.active() and img_bgr is not None:
+        _debug(f"Saved image → {debug_writer.save_image(img_bgr, name)}")
 
 # =========================
-# Optional PokémonTCG.io SDK
+# Stage runner (bounded thread pool)
 # =========================
-POKEMONTCG_API_KEY = os.getenv("POKEMONTCG_IO_API_KEY", "").strip()
-_PTCG_AVAILABLE = False
-try:
-    from pokemontcgsdk import Card as _PTCG_Card
-    from pokemontcgsdk import Set as _PTCG_Set
-    from pokemontcgsdk import RestClient as _PTCG_RestClient
-    if POKEMONTCG_API_KEY:
-        _PTCG_RestClient.configure(POKEMONTCG_API_KEY)
-    _PTCG_AVAILABLE = True
-except Exception:
-    _PTCG_AVAILABLE = False
+_STAGE_POOL: Optional[ThreadPoolExecutor] = None
+_STAGE_POOL_LOCK = threading.Lock()
 
-_PTCG_CACHE: Dict[str, Dict[str, Any]] = {}
 
+def _stage_pool() -> ThreadPoolExecutor:
+    """One bounded pool per worker process, shared by all in-flight grades."""
+    global _STAGE_POOL
+    if _STAGE_POOL is None:
+        with _STAGE_POOL_LOCK:
+            if _STAGE_POOL is None:
+                _STAGE_POOL = ThreadPoolExecutor(max_workers=max(1, STAGE_WORKERS),
+                                                 thread_name_prefix="cardgrader-stage")
+    return _STAGE_POOL
 
-def _ptcg_cache_get(k: str) -> Optional[Dict[str, Any]]:
-    return _PTCG_CACHE.get(k)
 
+class _Deferred:
+    """Serial stand-in for a Future: the stage only runs when .result() is first called."""
 
-def _ptcg_cache_put(k: str, v: Dict[str, Any]) -> None:
-    _PTCG_CACHE[k] = v
+    def __init__(self, fn, *args, **kwargs):
+        self._call = (fn, args, kwargs)
+        self._done = False
+        self._value = None
 
+    def result(self):
+        if not self._done:
+            fn, args, kwargs = self._call
+            self._value = fn(*args, **kwargs)
+            self._done = True
+        return self._value
 
-def _ptcg_lookup_set(ptcgo_code: str) -> Optional[Dict[str, Any]]:
-    """Find set by PTCGO code (e.g., SVI, PAL, TEF)."""
-    if not _PTCG_AVAILABLE or not ptcgo_code:
-        return None
-    key = f"set::{ptcgo_code.upper()}"
-    hit = _ptcg_cache_get(key)
-    if hit:
-        return hit
-    try:
-        sets = _PTCG_Set.where(q=f'ptcgoCode:{ptcgo_code}')
-        if sets:
-            s = sets[0]
-            data = {
-                "set_id": s.id,
-                "set_name": s.name,
-                "series": getattr(s, "series", ""),
-                "releaseDate": getattr(s, "releaseDate", ""),
-                "ptcgoCode": getattr(s, "ptcgoCode", ""),
-                "images": getattr(s, "images", {}) or {},
-            }
-            _ptcg_cache_put(key, data)
-            return data
-    except Exception:
-        return None
-    return None
+    def cancel(self) -> bool:
+        return not self._done
 
 
-def _ptcg_lookup_card_in_set(set_id: str, number_or_name: str) -> Optional[Dict[str, Any]]:
-    """Try to find a card in a set by collector number (preferred) or name."""
-    if not _PTCG_AVAILABLE or not set_id:
-        return None
-    key = f"card::{set_id}::{(number_or_name or '').lower()}"
-    hit = _ptcg_cache_get(key)
-    if hit:
-        return hit
+def _stage(fn, *args, **kwargs):
+    """
+    Start a pipeline stage. Concurrent mode submits it to the stage pool right away;
+    serial mode defers it so stages still run one by one, in the order they're joined.
+    Stages must never call _stage() themselves (nested submits can starve the pool).
+    """
+    if CONCURRENT_STAGES:
+        # carry the request's trace (contextvars) into the pool thread
+        return _stage_pool().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+    return _Deferred(fn, *args, **kwargs)
+
+
+def _cancel_stages(*futures) -> None:
+    """Drop speculative work we no longer need (already-running stages just finish)."""
+    for f in futures:
+        if f is not None:
+            f.cancel()
+
+# =========================
+# LLM transport (sync client + shared async pool)
+# =========================
+_ASYNC_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+
+
+def _async_client() -> AsyncOpenAI:
+    """
+    One AsyncOpenAI (and one keep-alive httpx pool) per event loop. Under ASGI that is
+    one per worker, shared by every grade in flight; under WSGI each async view gets a
+    fresh loop, and a pool bound to a closed loop can't be reused anyway.
+    """
+    loop = asyncio.get_running_loop()
+    c = _ASYNC_CLIENTS.get(loop)
+    if c is None:
+        c = AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            timeout=OPENAI_TIMEOUT,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS,
+                                    max_keepalive_connections=OPENAI_MAX_CONNECTIONS),
+            ),
+        )
+        _ASYNC_CLIENTS[loop] = c
+    return c
+
+
+def _create_kwargs(model: str, messages: list, temperature: float, out_cls) -> Dict[str, Any]:
+    kw = {"model": model, "temperature": temperature, "messages": messages}
+    if out_cls is not None and OPENAI_STRUCTURED:
+        kw["response_format"] = response_format(out_cls)
+    return kw
+
+
+def _chat(model: str, messages: list, temperature: float = 0.0, out_cls=None) -> str:
+    resp = client.chat.completions.create(**_create_kwargs(model, messages, temperature, out_cls))
+    tracing.record_llm(model, messages, resp.usage)
+    return (resp.choices[0].message.content or "").strip()
+
+
+async def _achat(model: str, messages: list, temperature: float = 0.0, out_cls=None) -> str:
+    resp = await _async_client().chat.completions.create(**_create_kwargs(model, messages, temperature, out_cls))
+    tracing.record_llm(model, messages, resp.usage)
+    return (resp.choices[0].message.content or "").strip()
+
+
+def _parse_reply(raw: str, out_cls, debug_name: str, attempt: int):
+    _save_text_debug(raw, f"{debug_name}_raw.txt" if attempt == 0 else f"{debug_name}_raw_retry{attempt}.txt")
     try:
-        if number_or_name:
-            # Prefer collector number
-            cards = _PTCG_Card.where(q=f'set.id:{set_id} number:{number_or_name}')
-            if not cards:
-                # fallback: try name exact
-                cards = _PTCG_Card.where(q=f'set.id:{set_id} name:"{number_or_name}"')
-        else:
-            cards = []
-        if cards:
-            c = cards[0]
-            data = {
-                "card_id": c.id,
-                "name": c.name,
-                "number": getattr(c, "number", ""),
-                "rarity": getattr(c, "rarity", ""),
-                "subtypes": getattr(c, "subtypes", []) or [],
-                "supertype": getattr(c, "supertype", ""),
-                "types": getattr(c, "types", []) or [],
-                "regulationMark": getattr(c, "regulationMark", ""),
-                "images": getattr(c, "images", {}) or {},
-                "tcgplayer": getattr(c, "tcgplayer", {}) or {},
-            }
-            _ptcg_cache_put(key, data)
-            return data
-    except Exception:
+        return out_cls.from_json(raw, lenient=not OPENAI_STRUCTURED)
+    except SchemaError as e:
+        _debug(f"{debug_name}: schema violation (attempt {attempt + 1}/{OPENAI_SCHEMA_RETRIES + 1}): {e}")
         return None
-    return None
+
+
+def _chat_parsed(model: str, messages: list, out_cls, debug_name: str, temperature: float = 0.0):
+    """
+    One stage call parsed into `out_cls`. Only schema violations are retried (transport
+    errors propagate); raises SchemaError once the retry budget is spent.
+    """
+    for attempt in range(OPENAI_SCHEMA_RETRIES + 1):
+        parsed = _parse_reply(_chat(model, messages, temperature, out_cls), out_cls, debug_name, attempt)
+        if parsed is not None:
+            return parsed
+    raise SchemaError(f"{debug_name}: no schema-valid reply after {OPENAI_SCHEMA_RETRIES + 1} attempt(s)")
+
+
+async def _achat_parsed(model: str, messages: list, out_cls, debug_name: str, temperature: float = 0.0):
+    for attempt in range(OPENAI_SCHEMA_RETRIES + 1):
+        parsed = _parse_reply(await _achat(model, messages, temperature, out_cls), out_cls, debug_name, attempt)
+        if parsed is not None:
+            return parsed
+    raise SchemaError(f"{debug_name}: no schema-valid reply after {OPENAI_SCHEMA_RETRIES + 1} attempt(s)")
 
 # =========================
 # Game back references (for the game-aware prompt)
@@ -275,20 +351,8 @@ except Exception:
     _SYMBOL_UTILS_OK = False
 
 # ===== Fallback symbol detection (ROI + template matching) =====
-_SYMBOL_TEMPLATES: Dict[str, np.ndarray] = {}
-
-def _load_symbol_templates():
-    """Lazy-load small grayscale templates from grading/assets/symbols/*.png."""
-    global _SYMBOL_TEMPLATES
-    if _SYMBOL_TEMPLATES:
-        return
-    base = Path("grading/assets/symbols")
-    if not base.exists():
-        return
-    for p in base.glob("*.png"):
-        img = cv2.imread(str(p), cv2.IMREAD_GRAYSCALE)
-        if img is not None:
-            _SYMBOL_TEMPLATES[p.stem] = img
+SYMBOL_TEMPLATE_DIR = Path(os.getenv("CARDGRADER_SYMBOL_DIR", "grading/assets/symbols"))
+SYMBOL_TOPK = 5
 
 
 def _crop_symbol_region(img_bgr: Optional[np.ndarray]) -> Optional[np.ndarray]:
@@ -303,24 +367,17 @@ def _crop_symbol_region(img_bgr: Optional[np.ndarray]) -> Optional[np.ndarray]:
 
 
 def _detect_symbol_by_template(roi_bgr: Optional[np.ndarray]) -> Tuple[Optional[str], float]:
+    """Best template for the ROI (symbol_match: precomputed pyramid, coarse-to-fine)."""
     if roi_bgr is None:
         return (None, 0.0)
-    _load_symbol_templates()
-    if not _SYMBOL_TEMPLATES:
+    matcher = symbol_match.get_matcher(SYMBOL_TEMPLATE_DIR)
+    if matcher is None:
         return (None, 0.0)
-    gray = cv2.cvtColor(roi_bgr, cv2.COLOR_BGR2GRAY)
-    best_key, best_score = None, 0.0
-    for key, tmpl in _SYMBOL_TEMPLATES.items():
-        for s in (0.6, 0.8, 1.0, 1.2):
-            th = max(8, int(tmpl.shape[0] * s)); tw = max(8, int(tmpl.shape[1] * s))
-            t = cv2.resize(tmpl, (tw, th), interpolation=cv2.INTER_AREA)
-            if gray.shape[0] < th or gray.shape[1] < tw:
-                continue
-            res = cv2.matchTemplate(gray, t, cv2.TM_CCOEFF_NORMED)
-            _, maxVal, _, _ = cv2.minMaxLoc(res)
-            if maxVal > best_score:
-                best_score, best_key = float(maxVal), key
-    return (best_key, best_score)
+    top = matcher.match(cv2.cvtColor(roi_bgr, cv2.COLOR_BGR2GRAY), k=SYMBOL_TOPK)
+    if not top:
+        return (None, 0.0)
+    _debug("Symbol template top-k: " + ", ".join(f"{k}={v:.3f}" for k, v in top))
+    return top[0]
 
 
 def _detect_set_symbol_key(img_bgr: np.ndarray) -> Tuple[Optional[str], float]:
@@ -336,245 +393,19 @@ def _detect_set_symbol_key(img_bgr: np.ndarray) -> Tuple[Optional[str], float]:
     return _detect_symbol_by_template(roi)
 
 # =========================
-# Minimal set-code resolver + mappings
+# Set-code resolver (tables + fuzzy lookup: set_registry)
 # =========================
 
-def _norm_code(code: str) -> str:
-    if not code:
-        return ""
-    code = code.strip()
-    for ch in ".-_/\\|:;,":
-        code = code.replace(ch, " ")
-    code = " ".join(code.split()).lower()
-    return code
-
-SYMBOL_STYLE_MAP: Dict[str, Dict[str, str]] = {
-    # Scarlet & Violet
-    "svi en":   {"set_name": "Scarlet & Violet", "era": "SV", "border": "silver", "language": "en"},
-    "pal en":   {"set_name": "Paldea Evolved", "era": "SV", "border": "silver", "language": "en"},
-    "obf en":   {"set_name": "Obsidian Flames", "era": "SV", "border": "silver", "language": "en"},
-    "par en":   {"set_name": "Paradox Rift", "era": "SV", "border": "silver", "language": "en"},
-    "tef en":   {"set_name": "Temporal Forces", "era": "SV", "border": "silver", "language": "en"},
-    "twm en":   {"set_name": "Twilight Masquerade", "era": "SV", "border": "silver", "language": "en"},
-    "sfa en":   {"set_name": "Shrouded Fable", "era": "SV", "border": "silver", "language": "en"},
-    "scr en":   {"set_name": "Stellar Crown", "era": "SV", "border": "silver", "language": "en"},
-    "ssp en":   {"set_name": "Surging Sparks", "era": "SV", "border": "silver", "language": "en"},
-    "pre en":   {"set_name": "Prismatic Evolutions", "era": "SV", "border": "silver", "language": "en"},
-    "sv151 en": {"set_name": "Scarlet & Violet 151", "era": "SV", "border": "silver", "language": "en"},
-
-    # Sword & Shield
-    "ssh en": {"set_name": "Sword & Shield", "era": "SWSH", "border": "yellow", "language": "en"},
-    "rcl en": {"set_name": "Rebel Clash", "era": "SWSH", "border": "yellow", "language": "en"},
-    "daa en": {"set_name": "Darkness Ablaze", "era": "SWSH", "border": "yellow", "language": "en"},
-    "viv en": {"set_name": "Vivid Voltage", "era": "SWSH", "border": "yellow", "language": "en"},
-    "bst en": {"set_name": "Battle Styles", "era": "SWSH", "border": "yellow", "language": "en"},
-    "cre en": {"set_name": "Chilling Reign", "era": "SWSH", "border": "yellow", "language": "en"},
-    "evs en": {"set_name": "Evolving Skies", "era": "SWSH", "border": "yellow", "language": "en"},
-    "fst en": {"set_name": "Fusion Strike", "era": "SWSH", "border": "yellow", "language": "en"},
-    "brs en": {"set_name": "Brilliant Stars", "era": "SWSH", "border": "yellow", "language": "en"},
-    "asr en": {"set_name": "Astral Radiance", "era": "SWSH", "border": "yellow", "language": "en"},
-    "lor en": {"set_name": "Lost Origin", "era": "SWSH", "border": "yellow", "language": "en"},
-    "sit en": {"set_name": "Silver Tempest", "era": "SWSH", "border": "yellow", "language": "en"},
-    "pgo en": {"set_name": "Pokémon GO", "era": "SWSH", "border": "yellow", "language": "en"},
-    "cel en": {"set_name": "Celebrations", "era": "SWSH", "border": "yellow", "language": "en"},
-    "clc en": {"set_name": "Celebrations Classic Collection", "era": "SWSH", "border": "yellow", "language": "en"},
-    "shf en": {"set_name": "Shining Fates", "era": "SWSH", "border": "yellow", "language": "en"},
-    "cpp en": {"set_name": "Champion’s Path", "era": "SWSH", "border": "yellow", "language": "en"},
-    "crz en": {"set_name": "Crown Zenith", "era": "SWSH", "border": "yellow", "language": "en"},
-
-    # Sun & Moon
-    "sm1 en":  {"set_name": "Sun & Moon", "era": "SM", "border": "yellow", "language": "en"},
-    "sm2 en":  {"set_name": "Guardians Rising", "era": "SM", "border": "yellow", "language": "en"},
-    "sm3 en":  {"set_name": "Burning Shadows", "era": "SM", "border": "yellow", "language": "en"},
-    "sm4 en":  {"set_name": "Crimson Invasion", "era": "SM", "border": "yellow", "language": "en"},
-    "sm5 en":  {"set_name": "Ultra Prism", "era": "SM", "border": "yellow", "language": "en"},
-    "sm6 en":  {"set_name": "Forbidden Light", "era": "SM", "border": "yellow", "language": "en"},
-    "sm7 en":  {"set_name": "Celestial Storm", "era": "SM", "border": "yellow", "language": "en"},
-    "sm8 en":  {"set_name": "Lost Thunder", "era": "SM", "border": "yellow", "language": "en"},
-    "sm9 en":  {"set_name": "Team Up", "era": "SM", "border": "yellow", "language": "en"},
-    "sm10 en": {"set_name": "Unbroken Bonds", "era": "SM", "border": "yellow", "language": "en"},
-    "sm11 en": {"set_name": "Unified Minds", "era": "SM", "border": "yellow", "language": "en"},
-    "sm12 en": {"set_name": "Cosmic Eclipse", "era": "SM", "border": "yellow", "language": "en"},
-    "drm en":  {"set_name": "Dragon Majesty", "era": "SM", "border": "yellow", "language": "en"},
-    "hif en":  {"set_name": "Hidden Fates", "era": "SM", "border": "yellow", "language": "en"},
-    "dep en":  {"set_name": "Detective Pikachu", "era": "SM", "border": "yellow", "language": "en"},
-
-    # XY
-    "xy en":   {"set_name": "XY Base Set", "era": "XY", "border": "yellow", "language": "en"},
-    "flf en":  {"set_name": "Flashfire", "era": "XY", "border": "yellow", "language": "en"},
-    "frf en":  {"set_name": "Furious Fists", "era": "XY", "border": "yellow", "language": "en"},
-    "phf en":  {"set_name": "Phantom Forces", "era": "XY", "border": "yellow", "language": "en"},
-    "prc en":  {"set_name": "Primal Clash", "era": "XY", "border": "yellow", "language": "en"},
-    "ros en":  {"set_name": "Roaring Skies", "era": "XY", "border": "yellow", "language": "en"},
-    "aor en":  {"set_name": "Ancient Origins", "era": "XY", "border": "yellow", "language": "en"},
-    "bkt en":  {"set_name": "BREAKthrough", "era": "XY", "border": "yellow", "language": "en"},
-    "bkp en":  {"set_name": "BREAKpoint", "era": "XY", "border": "yellow", "language": "en"},
-    "gen en":  {"set_name": "Generations", "era": "XY", "border": "yellow", "language": "en"},
-    "fac en":  {"set_name": "Fates Collide", "era": "XY", "border": "yellow", "language": "en"},
-    "sts en":  {"set_name": "Steam Siege", "era": "XY", "border": "yellow", "language": "en"},
-    "evo en":  {"set_name": "Evolutions", "era": "XY", "border": "yellow", "language": "en"},
-    "dcr en":  {"set_name": "Double Crisis", "era": "XY", "border": "yellow", "language": "en"},
-
-    # Black & White
-    "bw en":   {"set_name": "Black & White", "era": "BW", "border": "yellow", "language": "en"},
-    "emp en":  {"set_name": "Emerging Powers", "era": "BW", "border": "yellow", "language": "en"},
-    "nvi en":  {"set_name": "Noble Victories", "era": "BW", "border": "yellow", "language": "en"},
-    "nde en":  {"set_name": "Next Destinies", "era": "BW", "border": "yellow", "language": "en"},
-    "dex en":  {"set_name": "Dark Explorers", "era": "BW", "border": "yellow", "language": "en"},
-    "drx en":  {"set_name": "Dragons Exalted", "era": "BW", "border": "yellow", "language": "en"},
-    "bcr en":  {"set_name": "Boundaries Crossed", "era": "BW", "border": "yellow", "language": "en"},
-    "pls en":  {"set_name": "Plasma Storm", "era": "BW", "border": "yellow", "language": "en"},
-    "plf en":  {"set_name": "Plasma Freeze", "era": "BW", "border": "yellow", "language": "en"},
-    "plb en":  {"set_name": "Plasma Blast", "era": "BW", "border": "yellow", "language": "en"},
-    "ltr en":  {"set_name": "Legendary Treasures", "era": "BW", "border": "yellow", "language": "en"},
-    "drv en":  {"set_name": "Dragon Vault", "era": "BW", "border": "yellow", "language": "en"},
-
-    # HeartGold & SoulSilver
-    "hs en":   {"set_name": "HeartGold & SoulSilver", "era": "HGSS", "border": "yellow", "language": "en"},
-    "ul en":   {"set_name": "Unleashed", "era": "HGSS", "border": "yellow", "language": "en"},
-    "ud en":   {"set_name": "Undaunted", "era": "HGSS", "border": "yellow", "language": "en"},
-    "tm en":   {"set_name": "Triumphant", "era": "HGSS", "border": "yellow", "language": "en"},
-    "col en":  {"set_name": "Call of Legends", "era": "HGSS", "border": "yellow", "language": "en"},
-
-    # Platinum
-    "pl1 en":  {"set_name": "Platinum", "era": "Platinum", "border": "yellow", "language": "en"},
-    "pl2 en":  {"set_name": "Rising Rivals", "era": "Platinum", "border": "yellow", "language": "en"},
-    "pl3 en":  {"set_name": "Supreme Victors", "era": "Platinum", "border": "yellow", "language": "en"},
-    "pl4 en":  {"set_name": "Arceus", "era": "Platinum", "border": "yellow", "language": "en"},
-
-    # Diamond & Pearl
-    "dp1 en":  {"set_name": "Diamond & Pearl", "era": "DP", "border": "yellow", "language": "en"},
-    "dp2 en":  {"set_name": "Mysterious Treasures", "era": "DP", "border": "yellow", "language": "en"},
-    "dp3 en":  {"set_name": "Secret Wonders", "era": "DP", "border": "yellow", "language": "en"},
-    "dp4 en":  {"set_name": "Great Encounters", "era": "DP", "border": "yellow", "language": "en"},
-    "dp5 en":  {"set_name": "Majestic Dawn", "era": "DP", "border": "yellow", "language": "en"},
-    "dp6 en":  {"set_name": "Legends Awakened", "era": "DP", "border": "yellow", "language": "en"},
-    "dp7 en":  {"set_name": "Stormfront", "era": "DP", "border": "yellow", "language": "en"},
-
-    # EX Series
-    "rs en":   {"set_name": "EX Ruby & Sapphire", "era": "EX", "border": "yellow", "language": "en"},
-    "ss en":   {"set_name": "EX Sandstorm", "era": "EX", "border": "yellow", "language": "en"},
-    "dr en":   {"set_name": "EX Dragon", "era": "EX", "border": "yellow", "language": "en"},
-    "ma en":   {"set_name": "EX Team Magma vs Team Aqua", "era": "EX", "border": "yellow", "language": "en"},
-    "hl en":   {"set_name": "EX Hidden Legends", "era": "EX", "border": "yellow", "language": "en"},
-    "rg en":   {"set_name": "EX FireRed & LeafGreen", "era": "EX", "border": "yellow", "language": "en"},
-    "rr en":   {"set_name": "EX Team Rocket Returns", "era": "EX", "border": "yellow", "language": "en"},
-    "dx en":   {"set_name": "EX Deoxys", "era": "EX", "border": "yellow", "language": "en"},
-    "em en":   {"set_name": "EX Emerald", "era": "EX", "border": "yellow", "language": "en"},
-    "uf en":   {"set_name": "EX Unseen Forces", "era": "EX", "border": "yellow", "language": "en"},
-    "ds en":   {"set_name": "EX Delta Species", "era": "EX", "border": "yellow", "language": "en"},
-    "lm en":   {"set_name": "EX Legend Maker", "era": "EX", "border": "yellow", "language": "en"},
-    "hp en":   {"set_name": "EX Holon Phantoms", "era": "EX", "border": "yellow", "language": "en"},
-    "cg en":   {"set_name": "EX Crystal Guardians", "era": "EX", "border": "yellow", "language": "en"},
-    "df en":   {"set_name": "EX Dragon Frontiers", "era": "EX", "border": "yellow", "language": "en"},
-    "pk en":   {"set_name": "EX Power Keepers", "era": "EX", "border": "yellow", "language": "en"},
-
-    # e-Card
-    "exp en":  {"set_name": "Expedition Base Set", "era": "e-Card", "border": "yellow", "language": "en"},
-    "aqu en":  {"set_name": "Aquapolis", "era": "e-Card", "border": "yellow", "language": "en"},
-    "skyr en": {"set_name": "Skyridge", "era": "e-Card", "border": "yellow", "language": "en"},
-
-    # Base/WotC
-    "bs en":   {"set_name": "Base Set", "era": "Base/WotC", "border": "yellow", "language": "en"},
-    "ju en":   {"set_name": "Jungle", "era": "Base/WotC", "border": "yellow", "language": "en"},
-    "fo en":   {"set_name": "Fossil", "era": "Base/WotC", "border": "yellow", "language": "en"},
-    "b2 en":   {"set_name": "Base Set 2", "era": "Base/WotC", "border": "yellow", "language": "en"},
-    "tr en":   {"set_name": "Team Rocket", "era": "Base/WotC", "border": "yellow", "language": "en"},
-    "g1 en":   {"set_name": "Gym Heroes", "era": "Base/WotC", "border": "yellow", "language": "en"},
-    "g2 en":   {"set_name": "Gym Challenge", "era": "Base/WotC", "border": "yellow", "language": "en"},
-    "n1 en":   {"set_name": "Neo Genesis", "era": "Base/WotC", "border": "yellow", "language": "en"},
-    "n2 en":   {"set_name": "Neo Discovery", "era": "Base/WotC", "border": "yellow", "language": "en"},
-    "n3 en":   {"set_name": "Neo Revelation", "era": "Base/WotC", "border": "yellow", "language": "en"},
-    "n4 en":   {"set_name": "Neo Destiny", "era": "Base/WotC", "border": "yellow", "language": "en"},
-    "lc en":   {"set_name": "Legendary Collection", "era": "Base/WotC", "border": "yellow", "language": "en"},
-    "si en":   {"set_name": "Southern Islands", "era": "Base/WotC", "border": "yellow", "language": "en"},
-
-    # POP & Promos
-    "pop1 en": {"set_name": "POP Series 1", "era": "Promo", "border": "yellow", "language": "en"},
-    "pop2 en": {"set_name": "POP Series 2", "era": "Promo", "border": "yellow", "language": "en"},
-    "pop3 en": {"set_name": "POP Series 3", "era": "Promo", "border": "yellow", "language": "en"},
-    "pop4 en": {"set_name": "POP Series 4", "era": "Promo", "border": "yellow", "language": "en"},
-    "pop5 en": {"set_name": "POP Series 5", "era": "Promo", "border": "yellow", "language": "en"},
-    "pop6 en": {"set_name": "POP Series 6", "era": "Promo", "border": "yellow", "language": "en"},
-    "pop7 en": {"set_name": "POP Series 7", "era": "Promo", "border": "yellow", "language": "en"},
-    "pop8 en": {"set_name": "POP Series 8", "era": "Promo", "border": "yellow", "language": "en"},
-    "pop9 en": {"set_name": "POP Series 9", "era": "Promo", "border": "yellow", "language": "en"},
-    "p en":    {"set_name": "Black Star Promos", "era": "Promo", "border": "yellow", "language": "en"},
-}
-
-
-SET_CODE_MAP = SYMBOL_STYLE_MAP
-
-
-
-
-
-CODE_TO_PTCGO = {
-    # Scarlet & Violet (examples)
-    "SVI": "SVI", "PAL": "PAL", "OBF": "OBF", "PAR": "PAR", "TEF": "TEF",
-    "TWM": "TWM", "SFA": "SFA", "SCR": "SCR", "SSP": "SSP", "PRE": "PRE", "SV151": "MEW",
-
-    # Sword & Shield (examples)
-    "SSH": "SSH", "RCL": "RCL", "DAA": "DAA", "VIV": "VIV", "BST": "BST",
-    "CRE": "CRE", "EVS": "EVS", "FST": "FST", "BRS": "BRS", "ASR": "ASR",
-    "LOR": "LOR", "SIT": "SIT", "PGO": "PGO", "CEL": "CEL", "CLC": "CLC",
-    "SHF": "SHF", "CPP": "CPA", "CRZ": "CRZ",
-
-    # Sun & Moon (examples)
-    "SM1": "SUM", "SM2": "GRI", "SM3": "BUS", "SM4": "CIN", "SM5": "UPR",
-    "SM6": "FLI", "SM7": "CES", "SM8": "LOT", "SM9": "TEU", "SM10": "UNB",
-    "SM11": "UNM", "SM12": "CEC", "DRM": "DRM", "HIF": "HIF", "DEP": "DET",
-
-    # XY (examples)
-    "XY": "XY", "FLF": "FLF", "FRF": "FFI", "PHF": "PHF", "PRC": "PRC",
-    "ROS": "ROS", "AOR": "AOR", "BKT": "BKT", "BKP": "BKP", "GEN": "GEN",
-    "FAC": "FCO", "STS": "STS", "EVO": "EVO", "DCR": "DCR",
-
-    # Base/WotC (examples)
-    "BS": "BASE", "JU": "JNG", "FO": "FOS", "B2": "B2", "TR": "TR",
-    "G1": "G1", "G2": "G2", "N1": "N1", "N2": "N2", "N3": "N3",
-    "N4": "N4", "LC": "LC", "SI": "SI",
-
-    # Promos / misc
-    "POP1": "POP1", "POP2": "POP2", "POP3": "POP3", "POP4": "POP4", "POP5": "POP5",
-    "POP6": "POP6", "POP7": "POP7", "POP8": "POP8", "POP9": "POP9",
-    "P": "PR",  # generic promos
-}
-
-
-
-    # Enrich from local Pokémon cache (wrapping the API) if possible
-    # Enrich from local Pokémon cache (wrapping the API) if possible
 def _ptcgo_from_code(code: str) -> str:
-        """
-        Convert various OCR/typed codes into a PTCGO code if possible.
-        Accepts things like 'SM12', 'sm12 en', 'EVS EN', 'PAR', etc.
-        """
-        if not code:
-            return ""
-        nc = (code or "").strip().upper()
-        # take first token like 'SM12' or 'EVS'
-        tok = nc.split()[0]
-        # If already a known PTCGO code, return it; else try map
-        if tok in CODE_TO_PTCGO.values():
-            return tok
-        return CODE_TO_PTCGO.get(tok, "")
-
+    """
+    Convert various OCR/typed codes into a PTCGO code if possible.
+    Accepts things like 'SM12', 'sm12 en', 'EVS EN', 'PAR', and OCR misreads like '5VI'.
+    """
+    return set_registry.ptcgo(code)
 
 
 def _fallback_resolve_set_info(code: str, lang_hint: str = "unknown") -> Dict[str, str]:
-    nc = _norm_code(code)
-    info = {}
-    if nc in SET_CODE_MAP:
-        info = dict(SET_CODE_MAP[nc])
-    else:
-        first = nc.split(" ")[0] if nc else ""
-        info = dict(SET_CODE_MAP.get(first, {}))
-        if not info and nc:
-            toks = nc.split(" ")
-            if len(toks) >= 2:
-                two = " ".join(toks[:2])
-                info = dict(SET_CODE_MAP.get(two, {}))
+    info = set_registry.style(code)
     info.setdefault("set_name", "")
     info.setdefault("era", "")
     info.setdefault("border", "")
@@ -603,29 +434,32 @@ def _resolve_from_symbol(key: str) -> Dict[str, Any]:
 # =========================
 # Image I/O helpers
 # =========================
-def _file_to_data_url(path: Path) -> str:
+def _file_to_data_url(path: Union[Path, CardImage]) -> str:
     mime, _ = mimetypes.guess_type(str(path))
     if not mime:
         mime = "image/jpeg"
-    b64 = base64.b64encode(Path(path).read_bytes()).decode("utf-8")
+    data = path.data if isinstance(path, CardImage) else Path(path).read_bytes()
+    b64 = base64.b64encode(data).decode("utf-8")
     return f"data:{mime};base64,{b64}"
 
 
-def _bgr_to_data_url(img_bgr: np.ndarray, mime="image/jpeg", quality=92) -> str:
-    img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
-    pil = Image.fromarray(img_rgb)
-    buf = io.BytesIO()
-    pil.save(buf, format="JPEG", quality=quality)
-    b64 = base64.b64encode(buf.getvalue()).decode("utf-8")
-    return f"data:{mime};base64,{b64}"
+def _bgr_to_data_url(img_bgr: np.ndarray, stage: str) -> str:
+    """Encode for one LLM stage (size/format/quality/detail from llm_payload.PROFILES)."""
+    url, info = llm_payload.encode(img_bgr, stage)
+    _debug(f"Payload {stage}: {info['size'][0]}x{info['size'][1]} {info['format']} q{info['quality']} "
+           f"{info['bytes'] / 1024:.0f} KiB ~{info['tokens_est']} tokens")
+    return url
 
 
-def _img_part(path: Path) -> Dict[str, Any]:
-    return {"type": "image_url", "image_url": {"url": _file_to_data_url(path)}}
+def _img_part(path: Union[Path, CardImage]) -> Dict[str, Any]:
+    """Classifier image: the raw upload, downscaled for a low-detail look."""
+    ctx = CardImage.of(path)
 
+    def _encode() -> str:
+        bgr = ctx.bgr
+        return _bgr_to_data_url(bgr, "classifier") if bgr is not None else _file_to_data_url(ctx)
 
-def _img_part_from_data_url(data_url: str) -> Dict[str, Any]:
-    return {"type": "image_url", "image_url": {"url": data_url}}
+    return llm_payload.image_part(ctx.derive("payload:classifier", _encode), "classifier")
 
 
 def _safe_float(x, d=0.0):
@@ -637,44 +471,12 @@ def _safe_float(x, d=0.0):
 # =========================
 # Caps / labels / summaries
 # =========================
-def _apply_sanity_caps(result: Dict[str, Any]) -> Dict[str, Any]:
+def _apply_sanity_caps(result: Dict[str, Any], fired: Optional[frozenset] = None) -> Dict[str, Any]:
     """
-    If LLM summary/observations imply heavy flaws, cap overall grade accordingly.
+    If LLM summary/observations imply heavy flaws, cap overall grade accordingly
+    (rules and keywords live in grade_rules.RULES).
     """
-    text = (result.get("summary", "") + " " +
-            " ".join(o.get("note", "") for o in (result.get("observations") or []))).lower()
-
-    def cap(grade_cap: float, qualifier: Optional[str] = None):
-        if result["predicted_grade"] > grade_cap:
-            result["predicted_grade"] = float(grade_cap)
-        if qualifier and qualifier not in (result.get("predicted_label") or ""):
-            lbl = result.get("predicted_label") or ""
-            result["predicted_label"] = (lbl + f" [{qualifier}]").strip()
-
-    # Writing/ink/marker/scribble ⇒ MK qualifier + cap to 3
-    # Do NOT cap purely from text; CV handles MK. If LLM strongly insists,
-    # just soft-cap overall to 7.5 unless CV confirms.
-    if any(k in text for k in ["ink", "writing", "written", "marker", "pen", "crayon"]):
-        if result["predicted_grade"] > 7.5:
-            result["predicted_grade"] = 7.5
-
-    # Crease/bend/tear/paper loss ⇒ cap at 4
-    if any(k in text for k in ["crease", "bent", "bend", "fold", "tear", "rip", "paper loss", "missing paper"]):
-        cap(4.0, None)
-
-    # Any “heavy/obvious/large/significant” ⇒ cap ≤7.5
-    if any(k in text for k in ["heavy", "obvious", "large", "significant"]):
-        cap(7.5, None)
-
-    # Grades 9–10 require no visible wear
-    if result["predicted_grade"] >= 9.0:
-        visible = any(k in text for k in [
-            "whitening", "chip", "scratch", "dent", "dimple", "stain", "ink", "marker", "corner wear", "edge wear"
-        ])
-        if visible:
-            cap(8.0, None)
-
-    return result
+    return grade_rules.apply_caps(result, grade_rules.match(result) if fired is None else fired)
 
 
 def _fit_to_canvas(img_bgr: np.ndarray, target_h: int = 896, target_w: int = 640) -> Optional[np.ndarray]:
@@ -735,10 +537,10 @@ def _four_point_warp(img_bgr: np.ndarray, pts: np.ndarray, target_h: int = 896,
     return warp
 
 
-def _warp_card(img_bgr, target_h=896, target_w=640):
+def _find_card_quad(img_bgr) -> Optional[np.ndarray]:
     """
     Try hard to find a quadrilateral card; if we can't find an exact 4-pt contour,
-    fall back to the minAreaRect box (4 points). If that still fails, return None.
+    fall back to the minAreaRect box (4 points). Returns (4,2) points or None.
     """
     try:
         gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
@@ -763,56 +565,66 @@ def _warp_card(img_bgr, target_h=896, target_w=640):
     for eps in (0.02, 0.03, 0.04, 0.06):
         approx = cv2.approxPolyDP(cnt, eps * peri, True)
         if len(approx) == 4:
-            pts = approx.reshape(4, 2).astype("float32")
-            warp = _four_point_warp(img_bgr, pts, target_h=target_h, target_w=target_w)
-            if warp is not None:
-                return warp
+            return approx.reshape(4, 2).astype("float32")
 
     try:
         rect = cv2.minAreaRect(cnt)  # ((cx,cy),(w,h),angle)
-        box = cv2.boxPoints(rect)    # 4 points
-        warp = _four_point_warp(img_bgr, box, target_h=target_h, target_w=target_w)
-        if warp is not None:
-            return warp
+        return cv2.boxPoints(rect).astype("float32")  # 4 points
     except Exception:
         pass
 
     return None
 
 
-def _preprocess_card_to_data_url(path: Path) -> str:
-    img_bgr = cv2.imread(str(path))
+def _warp_card(img_bgr, target_h=896, target_w=640, max_side: int = DETECT_MAX_SIDE):
+    """
+    Find the card corners on a downscaled copy (pyramid mode, see preprocess/pyramid.py),
+    then warp once from the full-resolution original. max_side=0 searches at full res.
+    Returns None if no quad is found.
+    """
     if img_bgr is None:
-        return _file_to_data_url(path)
-    warped = _warp_card(img_bgr)
-    if warped is None:
-        warped = _fit_to_canvas(img_bgr)
-    pil = Image.fromarray(cv2.cvtColor(warped, cv2.COLOR_BGR2RGB))
-    return _to_data_url_from_pil(pil)
-
-
-def _to_data_url_from_pil(img: Image.Image, mime="image/jpeg") -> str:
-    buf = io.BytesIO()
-    img.save(buf, format="JPEG", quality=92)
-    b64 = base64.b64encode(buf.getvalue()).decode("utf-8")
-    return f"data:{mime};base64,{b64}"
+        return None
+    pts = find_quad_pyramid(img_bgr, _find_card_quad, max_side=max_side)
+    if pts is None:
+        return None
+    return _four_point_warp(img_bgr, pts, target_h=target_h, target_w=target_w)
+
+
+def _preprocess_card_to_data_url(path: Union[Path, CardImage]) -> str:
+    ctx = CardImage.of(path)
+
+    def _encode() -> str:
+        img = _preprocess_card_to_np(ctx)
+        if img is None:
+            img = ctx.bgr
+        if img is None:
+            return _file_to_data_url(ctx)
+        return _bgr_to_data_url(img, "grader")
 
+    return ctx.derive("llm_warp_data_url", _encode)
 
-def _preprocess_card_to_np(path: Path) -> Optional[np.ndarray]:
+
+def _preprocess_card_to_np(path: Union[Path, CardImage]) -> Optional[np.ndarray]:
     """
     Return a normalized front image (warped if possible; else letterboxed fallback)
     so downstream strips and OCR always have a stable 896x640 canvas.
+    Memoised on the image context, so the data-URL and OCR paths share one decode + warp.
     """
-    img_bgr = cv2.imread(str(path))
-    if img_bgr is None:
-        return None
-    warped = _warp_card(img_bgr)
-    if warped is not None:
-        return warped
-    return _fit_to_canvas(img_bgr)
+    ctx = CardImage.of(path)
+
+    def _warp() -> Optional[np.ndarray]:
+        img_bgr = ctx.bgr
+        if img_bgr is None:
+            return None
+        warped = _warp_card(img_bgr)
+        if warped is not None:
+            return warped
+        return _fit_to_canvas(img_bgr)
+
+    return ctx.derive("llm_warp", _warp)
 
 # =========================
-# OCR-lite for set code & name (LLM)
+# OCR-lite for set code & name (local engine, LLM fallback)
 # =========================
 SET_CODE_PROMPT = (
     "You will see a cropped bottom border of a TCG card. "
@@ -855,89 +667,147 @@ def _crop_top_strip(img_bgr: Optional[np.ndarray], frac: float = 0.16) -> Option
     return out
 
 
-def _extract_set_code_via_llm(img_bgr: Optional[np.ndarray]) -> Dict[str, str]:
+def _set_code_messages(img_bgr: Optional[np.ndarray]) -> Optional[list]:
     if img_bgr is None:
-        return {"set_code": "", "language": "unknown"}
+        return None
     strip = _crop_bottom_strip(img_bgr, 0.18)
     if strip is None:
+        return None
+    strip_url = _bgr_to_data_url(strip, "ocr_strip")
+    return [
+        {"role": "system", "content": SET_CODE_PROMPT},
+        {"role": "user", "content": [
+            {"type": "text", "text": "Read the set code from this bottom strip."},
+            llm_payload.image_part(strip_url, "ocr_strip"),
+        ]},
+    ]
+
+
+def _set_code_result(read: SetCodeRead) -> Dict[str, str]:
+    code = read.set_code.replace(".", " ").replace("-", " ").strip()
+    code = " ".join(code.split())
+    parsed = {"set_code": code, "language": read.language}
+    _save_json_debug(parsed, "llm_ocr_set_code_parsed.json")
+    return parsed
+
+
+def _extract_set_code_via_llm(img_bgr: Optional[np.ndarray]) -> Dict[str, str]:
+    messages = _set_code_messages(img_bgr)
+    if messages is None:
         return {"set_code": "", "language": "unknown"}
-    strip_url = _bgr_to_data_url(strip, quality=95)
     try:
         _debug(f"LLM OCR set_code: model={OPENAI_MODEL_CLASS}")
-        resp = client.chat.completions.create(
-            model=OPENAI_MODEL_CLASS,
-            temperature=0.0,
-            messages=[
-                {"role": "system", "content": SET_CODE_PROMPT},
-                {"role": "user", "content": [
-                    {"type": "text", "text": "Read the set code from this bottom strip."},
-                    {"type": "image_url", "image_url": {"url": strip_url}}
-                ]},
-            ],
-        )
-        raw = (resp.choices[0].message.content or "").strip()
+        read = _chat_parsed(OPENAI_MODEL_CLASS, messages, SetCodeRead, "llm_ocr_set_code")
     except Exception as e:
         _debug("LLM OCR set_code: exception → " + str(e))
         _debug(traceback.format_exc())
         return {"set_code": "", "language": "unknown"}
+    return _set_code_result(read)
+
 
-    _save_text_debug(raw, "llm_ocr_set_code_raw.txt")
-    s, e = raw.find("{"), raw.rfind("}")
-    if s != -1 and e != -1 and e > s:
-        raw = raw[s:e + 1]
+async def _aextract_set_code_via_llm(img_bgr: Optional[np.ndarray]) -> Dict[str, str]:
+    messages = await asyncio.to_thread(_set_code_messages, img_bgr)
+    if messages is None:
+        return {"set_code": "", "language": "unknown"}
     try:
-        data = json.loads(raw)
-    except Exception:
-        _debug("LLM OCR set_code: JSON parse failed; raw clipped text saved.")
-        data = {}
-    code = str(data.get("set_code") or "").strip()
-    lang = str(data.get("language") or "unknown").strip().lower()
-    code = code.replace(".", " ").replace("-", " ").strip()
-    code = " ".join(code.split())
-    parsed = {"set_code": code, "language": lang if lang in {"en", "jp"} else "unknown"}
-    _save_json_debug(parsed, "llm_ocr_set_code_parsed.json")
-    return parsed
+        _debug(f"LLM OCR set_code (async): model={OPENAI_MODEL_CLASS}")
+        read = await _achat_parsed(OPENAI_MODEL_CLASS, messages, SetCodeRead, "llm_ocr_set_code")
+    except Exception as e:
+        _debug("LLM OCR set_code: exception → " + str(e))
+        _debug(traceback.format_exc())
+        return {"set_code": "", "language": "unknown"}
+    return _set_code_result(read)
 
 
-def _extract_card_name_via_llm(img_bgr: Optional[np.ndarray]) -> str:
+def _local_set_code(img_bgr: Optional[np.ndarray]) -> Optional[Dict[str, str]]:
+    """Local OCR read of the set code; None when there's no engine or it isn't confident."""
     if img_bgr is None:
-        return ""
+        return None
+    res = ocr.read_set_code(_crop_bottom_strip(img_bgr, 0.18), set_registry.known_codes())
+    if res is None:
+        return None
+    parsed, conf = res
+    _debug(f"Local OCR set_code: {parsed} conf={conf:.2f} (min {ocr.OCR_MIN_CONF})")
+    _save_json_debug({"parsed": parsed, "conf": conf}, "local_ocr_set_code.json")
+    return parsed if parsed["set_code"] and conf >= ocr.OCR_MIN_CONF else None
+
+
+def _extract_set_code(img_bgr: Optional[np.ndarray]) -> Dict[str, str]:
+    """Local OCR first; the LLM only when there's no engine or the read is low-confidence."""
+    return _local_set_code(img_bgr) or _extract_set_code_via_llm(img_bgr)
+
+
+async def _aextract_set_code(img_bgr: Optional[np.ndarray]) -> Dict[str, str]:
+    return (await asyncio.to_thread(_local_set_code, img_bgr)) or await _aextract_set_code_via_llm(img_bgr)
+
+
+def _card_name_messages(img_bgr: Optional[np.ndarray]) -> Optional[list]:
+    if img_bgr is None:
+        return None
     strip = _crop_top_strip(img_bgr, 0.16)
     if strip is None:
+        return None
+    strip_url = _bgr_to_data_url(strip, "ocr_strip")
+    return [
+        {"role": "system", "content": CARD_NAME_PROMPT},
+        {"role": "user", "content": [
+            {"type": "text", "text": "Read the card name from this top bar."},
+            llm_payload.image_part(strip_url, "ocr_strip"),
+        ]},
+    ]
+
+
+def _extract_card_name_via_llm(img_bgr: Optional[np.ndarray]) -> str:
+    messages = _card_name_messages(img_bgr)
+    if messages is None:
         return ""
-    strip_url = _bgr_to_data_url(strip, quality=95)
     try:
         _debug(f"LLM OCR card_name: model={OPENAI_MODEL_CLASS}")
-        resp = client.chat.completions.create(
-            model=OPENAI_MODEL_CLASS,
-            temperature=0.0,
-            messages=[
-                {"role": "system", "content": CARD_NAME_PROMPT},
-                {"role": "user", "content": [
-                    {"type": "text", "text": "Read the card name from this top bar."},
-                    {"type": "image_url", "image_url": {"url": strip_url}}
-                ]},
-            ],
-        )
-        raw = (resp.choices[0].message.content or "").strip()
+        read = _chat_parsed(OPENAI_MODEL_CLASS, messages, CardNameRead, "llm_ocr_card_name")
     except Exception as e:
         _debug("LLM OCR card_name: exception → " + str(e))
         _debug(traceback.format_exc())
         return ""
+    card_name = read.card_name.strip()
+    _save_json_debug({"card_name": card_name}, "llm_ocr_card_name_parsed.json")
+    return card_name
+
 
-    _save_text_debug(raw, "llm_ocr_card_name_raw.txt")
-    s, e = raw.find("{"), raw.rfind("}")
-    if s != -1 and e != -1 and e > s:
-        raw = raw[s:e + 1]
+async def _aextract_card_name_via_llm(img_bgr: Optional[np.ndarray]) -> str:
+    messages = await asyncio.to_thread(_card_name_messages, img_bgr)
+    if messages is None:
+        return ""
     try:
-        data = json.loads(raw)
-    except Exception:
-        _debug("LLM OCR card_name: JSON parse failed; raw clipped text saved.")
-        data = {}
-    card_name = str(data.get("card_name") or "").strip()
+        _debug(f"LLM OCR card_name (async): model={OPENAI_MODEL_CLASS}")
+        read = await _achat_parsed(OPENAI_MODEL_CLASS, messages, CardNameRead, "llm_ocr_card_name")
+    except Exception as e:
+        _debug("LLM OCR card_name: exception → " + str(e))
+        _debug(traceback.format_exc())
+        return ""
+    card_name = read.card_name.strip()
     _save_json_debug({"card_name": card_name}, "llm_ocr_card_name_parsed.json")
     return card_name
 
+
+def _local_card_name(img_bgr: Optional[np.ndarray]) -> Optional[str]:
+    if img_bgr is None:
+        return None
+    res = ocr.read_card_name(_crop_top_strip(img_bgr, 0.16))
+    if res is None:
+        return None
+    name, conf = res
+    _debug(f"Local OCR card_name: '{name}' conf={conf:.2f} (min {ocr.OCR_MIN_CONF})")
+    _save_json_debug({"card_name": name, "conf": conf}, "local_ocr_card_name.json")
+    return name if name and conf >= ocr.OCR_MIN_CONF else None
+
+
+def _extract_card_name(img_bgr: Optional[np.ndarray]) -> str:
+    return _local_card_name(img_bgr) or _extract_card_name_via_llm(img_bgr)
+
+
+async def _aextract_card_name(img_bgr: Optional[np.ndarray]) -> str:
+    return (await asyncio.to_thread(_local_card_name, img_bgr)) or await _aextract_card_name_via_llm(img_bgr)
+
 # =========================
 # Stage 1: gating / classification
 # =========================
@@ -956,44 +826,77 @@ CLASSIFY_PROMPT = (
     "}\n"
 )
 
-def _classify_images(img1: Path, img2: Optional[Path]) -> Dict[str, Any]:
+def _classify_messages(img1: Path, img2: Optional[Path]) -> list:
     content = [{"type": "text", "text": "Classify these two images (order matters)."}]
     content.append(_img_part(img1))
     if img2:
         content.append(_img_part(img2))
     else:
         content.append({"type": "text", "text": "Second image is missing."})
+    return [
+        {"role": "system", "content": CLASSIFY_PROMPT},
+        {"role": "user", "content": content},
+    ]
+
 
+def _classifier_result(c: Classification) -> Dict[str, Any]:
+    data = c.to_dict()
+    _save_json_debug(data, "classifier_parsed.json")
+    return data
+
+
+def _classify_images(img1: Path, img2: Optional[Path]) -> Dict[str, Any]:
+    messages = _classify_messages(img1, img2)
     try:
         _debug(f"Classifier call: model={OPENAI_MODEL_CLASS}")
-        resp = client.chat.completions.create(
-            model=OPENAI_MODEL_CLASS,
-            temperature=0.0,
-            messages=[
-                {"role": "system", "content": CLASSIFY_PROMPT},
-                {"role": "user", "content": content},
-            ],
-        )
-        raw = (resp.choices[0].message.content or "{}").strip()
+        c = _chat_parsed(OPENAI_MODEL_CLASS, messages, Classification, "classifier")
     except Exception as e:
         _debug("Classifier exception: " + str(e))
         _debug(traceback.format_exc())
-        raw = "{}"
+        c = Classification()
+    return _classifier_result(c)
 
-    _save_text_debug(raw, "classifier_raw.txt")
+
+async def _aclassify_images(img1: Path, img2: Optional[Path]) -> Dict[str, Any]:
+    messages = await asyncio.to_thread(_classify_messages, img1, img2)
     try:
-        data = json.loads(raw)
+        _debug(f"Classifier call (async): model={OPENAI_MODEL_CLASS}")
+        c = await _achat_parsed(OPENAI_MODEL_CLASS, messages, Classification, "classifier")
+    except Exception as e:
+        _debug("Classifier exception: " + str(e))
+        _debug(traceback.format_exc())
+        c = Classification()
+    return _classifier_result(c)
+
+
+def _local_gate(img1: Path, img2: Optional[Path], game_hint: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Gate on the warped canvases (shared with preprocessing); None = ask the LLM."""
+    game = (game_hint or "").lower()
+    if not LOCAL_GATE or not local_gate.has_signature(game):
+        return None
+    try:
+        gate = local_gate.local_gate(
+            _preprocess_card_to_np(img1),
+            _preprocess_card_to_np(img2) if img2 else None,
+            game,
+        )
     except Exception:
-        s, e = raw.find("{"), raw.rfind("}")
-        data = json.loads(raw[s:e + 1]) if s != -1 and e != -1 and e > s else {}
-    ds = data.get("detected_sides") or {}
-    data["detected_sides"] = {
-        "image_1": str(ds.get("image_1", "unknown")),
-        "image_2": str(ds.get("image_2", "unknown")),
-    }
-    data["image_quality"] = (data.get("image_quality") or "low").lower()
-    _save_json_debug(data, "classifier_parsed.json")
-    return data
+        _debug("Local gate failed; using the LLM classifier.\n" + traceback.format_exc())
+        return None
+    _save_json_debug({"local_gate": gate}, "local_gate.json")
+    return gate
+
+
+def _gate_images(img1: Path, img2: Optional[Path], game_hint: Optional[str]) -> Dict[str, Any]:
+    gate = _local_gate(img1, img2, game_hint)
+    tracing.tag(source="local" if gate else "llm")
+    return gate or _classify_images(img1, img2)
+
+
+async def _agate_images(img1: Path, img2: Optional[Path], game_hint: Optional[str]) -> Dict[str, Any]:
+    gate = await asyncio.to_thread(_local_gate, img1, img2, game_hint)
+    tracing.tag(source="local" if gate else "llm")
+    return gate or await _aclassify_images(img1, img2)
 
 # =========================
 # Stage 2: grading prompts
@@ -1140,143 +1043,118 @@ def _best_exemplar_from_cache(card_name: str,
     return out
 
 # =========================
-# Main entry
+# Trusted hints (user-typed ptcgo code + collector number)
 # =========================
-def grade_with_openai(front_path: Path,
-                      back_path: Optional[Path] = None,
-                      game_hint: Optional[str] = None,
-                      ptcgo_code: Optional[str] = None,
-                      collector_number: Optional[str] = None) -> Dict[str, Any]:
+def _resolve_trusted_hints(ptcgo_code: str, collector_number: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Resolve the user-supplied set code / number via the PTCG cache. Returns (set_info, card_info)."""
+    trusted_set_info: Dict[str, Any] = {}
+    trusted_card_info: Dict[str, Any] = {}
+    if not (ptcgo_code and collector_number):
+        return trusted_set_info, trusted_card_info
 
-    """Gate + crop + LLM grade (+ optional CV blend + set code/symbol + exemplar)."""
+    try:
+        s_hit = pokemon_cache.get_set_by_code(ptcgo_code)  # the wrapper around PTCG
+    except Exception:
+        s_hit = None
+    if s_hit:
+        simgs = _coerce_set_images(
+            s_hit.get("images") if isinstance(s_hit, dict) else getattr(s_hit, "images", {})
+        )
 
-    _debug(f"grade_with_openai start | front={front_path} back={back_path} game_hint={game_hint}")
-    _debug(f"Models | CLASS={OPENAI_MODEL_CLASS} GRADE={OPENAI_MODEL_GRADE}")
+        trusted_set_info = {
+            "set_name":     (s_hit.get("name") if isinstance(s_hit, dict) else getattr(s_hit, "name", "")) or "",
+            "ptcgoCode":    (s_hit.get("ptcgoCode") if isinstance(s_hit, dict) else getattr(s_hit, "ptcgoCode", "")) or "",
+            "set_id":       (s_hit.get("id") if isinstance(s_hit, dict) else getattr(s_hit, "id", "")) or "",
+            "set_logo_url":   simgs.get("logo", ""),
+            "set_symbol_url": simgs.get("symbol", "")
+        }
+        try:
+            # prefer exact collector number match first; fallback to name search (inside helper)
+            c_hit = pokemon_cache.get_card_in_set(trusted_set_info["set_id"], collector_number) or \
+                    pokemon_cache.get_card_in_set(trusted_set_info["set_id"], collector_number.split("/")[0])
+        except Exception:
+            c_hit = None
+        if c_hit:
+            cimgs = _coerce_card_images((c_hit.get("images") if isinstance(c_hit, dict) else None))
+            trusted_card_info = {
+                "card_name": c_hit.get("name", ""),
+                "number": c_hit.get("number", ""),
+                "rarity": c_hit.get("rarity", ""),
+                "subtypes": c_hit.get("subtypes", []) or [],
+                "supertype": c_hit.get("supertype", ""),
+                "types": c_hit.get("types", []) or [],
+                "regulationMark": c_hit.get("regulationMark", ""),
+                "card_large_url": cimgs.get("large", "") or cimgs.get("small", ""),
+            }
 
-    # 1) Gate: sides & quality
-    gate = _classify_images(front_path, back_path)
+    _save_json_debug({"trusted_set": trusted_set_info, "trusted_card": trusted_card_info}, "trusted_hints.json")
+    return trusted_set_info, trusted_card_info
+
+
+def _trusted_hints_complete(ptcgo_code: str, collector_number: str,
+                            trusted_set_info: Dict[str, Any], trusted_card_info: Dict[str, Any]) -> bool:
+    """True when the user's hints fully identify the card, so the OCR calls can be skipped."""
+    return bool(ptcgo_code and collector_number and trusted_set_info and trusted_card_info)
+
+# =========================
+# Pipeline steps shared by the sync and async entries
+# =========================
+def _gate_reject(feedback: str, gate: Dict[str, Any]) -> Dict[str, Any]:
+    return _json_sanitize({
+        "scores": {"centering": 0.0, "surface": 0.0, "edges": 0.0, "corners": 0.0, "color": 0.0},
+        "predicted_grade": 0.0,
+        "predicted_label": "—",
+        "needs_better_photos": True,
+        "photo_feedback": feedback,
+        "summary": "",
+        "debug": gate if DEBUG else {},
+    })
+
+
+def _check_gate(gate: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """Returns (rejection_result_or_None, swap_front_and_back)."""
     sides = gate.get("detected_sides", {})
     q = (gate.get("image_quality") or "low").lower()
     _save_json_debug({"gate": gate}, "gate_output.json")
 
+    swap = False
     # Enforce order
     if REQUIRE_FRONT_FIRST:
         if sides.get("image_1") != "front" or sides.get("image_2") != "back":
             _debug(f"Gating failed: require_front_first={REQUIRE_FRONT_FIRST} sides={sides}")
-            return _json_sanitize({
-                "scores": {"centering": 0.0, "surface": 0.0, "edges": 0.0, "corners": 0.0, "color": 0.0},
-                "predicted_grade": 0.0,
-                "predicted_label": "—",
-                "needs_better_photos": True,
-                "photo_feedback": "Upload the FRONT image first and the BACK image second.",
-                "summary": "",
-                "debug": gate if DEBUG else {},
-            })
+            return _gate_reject("Upload the FRONT image first and the BACK image second.", gate), False
     else:
         pair = {sides.get("image_1"), sides.get("image_2")}
         if not ("front" in pair and "back" in pair):
             _debug(f"Gating failed: need exactly one front and one back. sides={sides}")
-            return _json_sanitize({
-                "scores": {"centering": 0.0, "surface": 0.0, "edges": 0.0, "corners": 0.0, "color": 0.0},
-                "predicted_grade": 0.0,
-                "predicted_label": "—",
-                "needs_better_photos": True,
-                "photo_feedback": "Please upload exactly one FRONT and one BACK image.",
-                "summary": "",
-                "debug": gate if DEBUG else {},
-            })
+            return _gate_reject("Please upload exactly one FRONT and one BACK image.", gate), False
         if sides.get("image_1") == "back" and sides.get("image_2") == "front":
             _debug("Order swap: received back then front; swapping.")
-            front_path, back_path = back_path, front_path
+            swap = True
 
     if q not in {"medium", "high"}:
         _debug(f"Gate image_quality={q} (too low).")
-        return _json_sanitize({
-            "scores": {"centering": 0.0, "surface": 0.0, "edges": 0.0, "corners": 0.0, "color": 0.0},
-            "predicted_grade": 0.0,
-            "predicted_label": "—",
-            "needs_better_photos": True,
-            "photo_feedback": "Photo quality is too low (blur, glare or cropping).",
-            "summary": "",
-            "debug": gate if DEBUG else {},
-        })
-
-    # 2) Preprocess → data URLs and warped np
-    f_url = _preprocess_card_to_data_url(front_path)
-    b_url = _preprocess_card_to_data_url(back_path) if back_path else None
-    front_warp_bgr = _preprocess_card_to_np(front_path)
-    _debug(f"Preprocess done: data URLs made; front_warp_bgr is None? {front_warp_bgr is None}")
-    # --- NEW: if user supplied ptcgo_code + collector_number, trust and resolve via API/cache
-    trusted_set_info = {}
-    trusted_card_info = {}
-    ptcgo_code = (ptcgo_code or "").strip().upper()
-    collector_number = (collector_number or "").strip()
-
-    s_hit = None
-
-    if ptcgo_code and collector_number:
-        try:
-            s_hit = pokemon_cache.get_set_by_code(ptcgo_code)  # the wrapper around PTCG
-        except Exception:
-            s_hit = None
-        if s_hit:
-            simgs = _coerce_set_images(
-                s_hit.get("images") if isinstance(s_hit, dict) else getattr(s_hit, "images", {})
-            )
-
-            trusted_set_info = {
-                "set_name":     (s_hit.get("name") if isinstance(s_hit, dict) else getattr(s_hit, "name", "")) or "",
-                "ptcgoCode":    (s_hit.get("ptcgoCode") if isinstance(s_hit, dict) else getattr(s_hit, "ptcgoCode", "")) or "",
-                "set_id":       (s_hit.get("id") if isinstance(s_hit, dict) else getattr(s_hit, "id", "")) or "",
-                "set_logo_url":   simgs.get("logo", ""),
-                "set_symbol_url": simgs.get("symbol", "")
-            }
-            try:
-                # prefer exact collector number match first; fallback to name search (inside helper)
-                c_hit = pokemon_cache.get_card_in_set(trusted_set_info["set_id"], collector_number) or \
-                        pokemon_cache.get_card_in_set(trusted_set_info["set_id"], collector_number.split("/")[0])
-            except Exception:
-                c_hit = None
-            if c_hit:
-                cimgs = _coerce_card_images((c_hit.get("images") if isinstance(c_hit, dict) else None))
-                trusted_card_info = {
-                    "card_name": c_hit.get("name", ""),
-                    "number": c_hit.get("number", ""),
-                    "rarity": c_hit.get("rarity", ""),
-                    "subtypes": c_hit.get("subtypes", []) or [],
-                    "supertype": c_hit.get("supertype", ""),
-                    "types": c_hit.get("types", []) or [],
-                    "regulationMark": c_hit.get("regulationMark", ""),
-                    "card_large_url": cimgs.get("large", "") or cimgs.get("small", ""),
-                }
-
-        _save_json_debug({"trusted_set": trusted_set_info, "trusted_card": trusted_card_info}, "trusted_hints.json")
-
-    # 2b) OCR: set code & card name from warped front
-    set_code_info = {"set_code": "", "language": "unknown"}
-    set_code_txt = ""
-    set_lang_txt = "unknown"
-    card_name = ""
-
-    if not (ptcgo_code and collector_number and trusted_set_info and trusted_card_info):
-        # Fall back to OCR discovery
-        set_code_info = _extract_set_code_via_llm(front_warp_bgr)
-        set_code_txt = set_code_info.get("set_code", "")
-        set_lang_txt = set_code_info.get("language", "unknown")
-        card_name = _extract_card_name_via_llm(front_warp_bgr)
-    else:
-        # Take the trusted values
-        set_code_txt = trusted_set_info.get("ptcgoCode", ptcgo_code)
-        card_name = trusted_card_info.get("card_name", "")
-
-    _save_json_debug({"set_code_info": set_code_info, "card_name": card_name}, "ocr_meta.json")
-
-
-
+        return _gate_reject("Photo quality is too low (blur, glare or cropping).", gate), False
+    return None, swap
+
+
+def _merge_set_info(trusted_set_info: Dict[str, Any],
+                    trusted_card_info: Dict[str, Any],
+                    ptcgo_code: str,
+                    collector_number: str,
+                    set_code_txt: str,
+                    set_lang_txt: str,
+                    card_name: str,
+                    detect_symbol) -> Dict[str, Any]:
+    """
+    Trusted hints first; otherwise code-based resolve + emblem enrichment.
+    `detect_symbol` is a zero-arg callable returning (key, score); it's only called
+    when the trusted hints didn't resolve anything.
+    """
     # Always try emblem detection; merge if it adds useful info
     # Start with trusted info if available
     set_info = {}
-    
+
     if trusted_set_info or trusted_card_info:
         set_info = {
             "set_name": trusted_set_info.get("set_name", ""),
@@ -1301,9 +1179,7 @@ def grade_with_openai(front_path: Path,
         _save_json_debug({"set_info_initial": set_info}, "set_info_initial.json")
 
         # emblem detection as a fallback enrichment
-        sym_key, sym_score = (None, 0.0)
-        if front_warp_bgr is not None:
-            sym_key, sym_score = _detect_set_symbol_key(front_warp_bgr)
+        sym_key, sym_score = detect_symbol()
         _debug(f"Symbol detection: key={sym_key} score={sym_score}")
         if sym_key:
             sym_info = _resolve_from_symbol(sym_key) or {}
@@ -1321,10 +1197,11 @@ def grade_with_openai(front_path: Path,
                         "set_code": set_code_txt, "language": set_lang_txt}
 
     _save_json_debug({"set_info_after_symbol": set_info}, "set_info_after_symbol.json")
+    return set_info
 
 
-
-
+def _enrich_set_info(set_info: Dict[str, Any], set_code_txt: str, card_name: str) -> Dict[str, Any]:
+    """PTCG lookups from the OCR'd code + exemplar attach (blocking I/O through pokemon_cache)."""
     ptcgo = _ptcgo_from_code(set_code_txt)
     _debug(f"PTCGO derived from OCR: '{ptcgo}' from '{set_code_txt}'")
     if ptcgo:
@@ -1359,22 +1236,29 @@ def grade_with_openai(front_path: Path,
     set_info["card_large_url"] = set_info.get("card_large_url") or ex["card_large_url"]
     set_info["set_logo_url"] = set_info.get("set_logo_url") or ex["set_logo_url"]
     set_info["set_symbol_url"] = set_info.get("set_symbol_url") or ex["set_symbol_url"]
+    return set_info
 
+
+def _reference_part(url: str) -> Dict[str, Any]:
+    """Reference image from the local exemplar store; the remote URL if it can't be fetched."""
+    inlined = exemplar_store.data_url(url)
+    if inlined is None:
+        _debug(f"Reference not cached, sending remote URL: {url}")
+        return {"type": "image_url", "image_url": {"url": url}}
+    return llm_payload.image_part(inlined, "reference")
+
+
+def _grader_messages(set_info: Dict[str, Any],
+                     cv_flags: Dict[str, Any],
+                     game_hint: Optional[str],
+                     f_url: str,
+                     b_url: Optional[str]) -> Tuple[list, list]:
+    """Returns (messages, hint_parts) for the grader call."""
     # 3) Choose prompt
     system_prompt = _build_game_prompt((game_hint or "").lower())
     game_label = GAME_LABELS.get((game_hint or "").lower(), "TCG")
     _save_text_debug(system_prompt, "system_prompt.txt")
 
-    # 3b) Vision checks (front only here)
-    cv_flags = {}
-    try:
-        raw_flags = run_vision_checks_img(front_warp_bgr) if front_warp_bgr is not None else {}
-        cv_flags = _json_sanitize(raw_flags)
-    except Exception:
-        _debug("Vision checks threw an exception:\n" + traceback.format_exc())
-        cv_flags = {}
-    _save_json_debug({"cv_flags": cv_flags}, "cv_flags.json")
-
     # 4) LLM grade (pass hints + references)
     hint_parts = []
     if set_info.get("set_name"):  hint_parts.append(f"set:{set_info['set_name']}")
@@ -1387,15 +1271,15 @@ def grade_with_openai(front_path: Path,
     hint = " | " + " | ".join(hint_parts) if hint_parts else ""
 
     content = [{"type": "text", "text": f"FRONT then BACK of the same {game_label} card — grade per instructions.{hint}"}]
-    content.append(_img_part_from_data_url(f_url))
+    content.append(llm_payload.image_part(f_url, "grader"))
     if b_url:
-        content.append(_img_part_from_data_url(b_url))
+        content.append(llm_payload.image_part(b_url, "grader"))
 
     # Always attach some reference
     attached_ref = False
     if set_info.get("card_large_url"):
         content.append({"type": "text", "text": "Reference exemplar (database mint baseline):"})
-        content.append({"type": "image_url", "image_url": {"url": set_info["card_large_url"]}})
+        content.append(_reference_part(set_info["card_large_url"]))
         attached_ref = True
     else:
         # weaker but helpful: set logo/symbol
@@ -1404,9 +1288,9 @@ def grade_with_openai(front_path: Path,
         if logo or symb:
             content.append({"type": "text", "text": "Set reference (logo/symbol):"})
             if logo:
-                content.append({"type": "image_url", "image_url": {"url": logo}})
+                content.append(_reference_part(logo))
             if symb:
-                content.append({"type": "image_url", "image_url": {"url": symb}})
+                content.append(_reference_part(symb))
             attached_ref = True
 
     if attached_ref:
@@ -1414,44 +1298,38 @@ def grade_with_openai(front_path: Path,
         _save_json_debug({"reference_attached": True}, "reference_attached.json")
 
     _save_json_debug({"user_content": content}, "grade_user_content.json")
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": content},
+    ]
+    return messages, hint_parts
 
-    try:
-        _debug(f"Grader call: model={OPENAI_MODEL_GRADE}")
-        resp = client.chat_completions.create(  # alias-safe
-            model=OPENAI_MODEL_GRADE,
-            temperature=0.2,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": content},
-            ],
-        ) if hasattr(client, "chat_completions") else client.chat.completions.create(
-            model=OPENAI_MODEL_GRADE,
-            temperature=0.2,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": content},
-            ],
-        )
-        raw = (resp.choices[0].message.content or "{}").strip()
-    except Exception as e:
-        _debug("Grader exception: " + str(e))
-        _debug(traceback.format_exc())
-        raw = "{}"
 
-    _save_text_debug(raw, "grader_raw.txt")
+def _grader_result(report: Optional[GradeReport]) -> Dict[str, Any]:
+    data = report.to_dict() if report is not None else {}
+    _save_json_debug({"grader_parsed": data}, "grader_parsed.json")
+    return data
 
-    # Parse LLM
-    try:
-        data = json.loads(raw)
-    except Exception:
-        s, e = raw.find("{"), raw.rfind("}")
-        data = json.loads(raw[s:e + 1]) if s != -1 and e != -1 and e > s else {}
-    _save_json_debug({"grader_parsed": data}, "grader_parsed.json")  
 
+def _finalize_grade(data: Dict[str, Any],
+                    *,
+                    cv_flags: Dict[str, Any],
+                    cv_pred: Optional[Dict[str, Any]],
+                    set_info: Dict[str, Any],
+                    set_code_info: Dict[str, str],
+                    set_code_txt: str,
+                    set_lang_txt: str,
+                    card_name: str,
+                    gate: Dict[str, Any],
+                    hint_parts: list,
+                    grader_ok: bool = True) -> Dict[str, Any]:
+    """Post-process the grader JSON: guards, caps, CV rules/blend, detected metadata."""
     result = _normalize_grade_json(data)
     result = _enforce_observation_guard(result)
-    result = _apply_observation_thresholds(result)
-    result = _apply_sanity_caps(result)
+    fired = grade_rules.match(result)  # one keyword scan serves both rule passes
+    tracing.annotate(rules=sorted(fired))
+    result = _apply_observation_thresholds(result, fired)
+    result = _apply_sanity_caps(result, fired)
     # If the LLM gave < 7 and provided < 2 concrete observations, lift to 7.5
     if (result.get("predicted_grade", 0) < 7.0) and len(result.get("observations") or []) < 2 and not result.get("needs_better_photos"):
         result["predicted_grade"] = 7.5
@@ -1491,18 +1369,12 @@ def grade_with_openai(front_path: Path,
         result["photo_feedback"] = (fb + " Blur detected; results may be conservative.").strip()
 
     # 5) Optional CV blend (classical model)
-    if BLEND_CV_ALPHA > 0.0 and os.path.exists(CV_WEIGHTS) and back_path:
-        try:
-            from grading.ml.cv_inference import CVGrader
-            cv = CVGrader(weights_path=CV_WEIGHTS)
-            cv_pred = cv.predict(front_path, back_path)  # dict with keys: centering,...,overall
-            a = float(BLEND_CV_ALPHA)
-            for k in ["centering", "surface", "edges", "corners", "color"]:
-                result["scores"][k] = (1 - a) * result["scores"][k] + a * cv_pred.get(k, 0.0)
-            result["predicted_grade"] = (1 - a) * result["predicted_grade"] + a * cv_pred.get("overall", 0.0)
-            _save_json_debug({"cv_pred": cv_pred, "alpha": a}, "cv_blend.json")
-        except Exception:
-            _debug("CV blend failed; continuing LLM-only.\n" + traceback.format_exc())
+    if cv_pred is not None:
+        a = float(BLEND_CV_ALPHA)
+        for k in ["centering", "surface", "edges", "corners", "color"]:
+            result["scores"][k] = (1 - a) * result["scores"][k] + a * cv_pred.get(k, 0.0)
+        result["predicted_grade"] = (1 - a) * result["predicted_grade"] + a * cv_pred.get("overall", 0.0)
+        _save_json_debug({"cv_pred": cv_pred, "alpha": a}, "cv_blend.json")
 
     # 6) Attach detected metadata and make label/summary deterministic
     result["detected"] = {
@@ -1527,6 +1399,8 @@ def grade_with_openai(front_path: Path,
         "regulationMark": set_info.get("regulationMark", ""),
     }
     result = _coerce_label_and_summary(result, cv_flags, result["detected"])
+    # False when the grader call itself failed (the scores are fallbacks); callers must not cache those.
+    result["grader_ok"] = bool(grader_ok)
 
     # Embed debug blob if enabled (handy when surfacing to UI)
     if DEBUG:
@@ -1539,9 +1413,267 @@ def grade_with_openai(front_path: Path,
             "hint_parts": hint_parts,
         }
     _save_json_debug({"final_result": result}, "final_result.json")
-    _debug("grade_with_openai done.")
     return _json_sanitize(result)
 
+
+def _cv_blend_enabled(back_path: Optional[Path]) -> bool:
+    return BLEND_CV_ALPHA > 0.0 and os.path.exists(CV_WEIGHTS) and bool(back_path)
+
+
+def _cv_blend_predict(front_path: CardImage, back_path: CardImage) -> Dict[str, Any]:
+    from grading.ml import model_server  # lazy import: torch
+    return model_server.get_grader(CV_WEIGHTS).predict(front_path, back_path)  # dict with keys: centering,...,overall
+
+# =========================
+# Main entry
+# =========================
+@debug_writer.scoped("ai")
+def grade_with_openai(front_path: Union[Path, CardImage],
+                      back_path: Union[Path, CardImage, None] = None,
+                      game_hint: Optional[str] = None,
+                      ptcgo_code: Optional[str] = None,
+                      collector_number: Optional[str] = None) -> Dict[str, Any]:
+
+    """
+    Gate + crop + LLM grade (+ optional CV blend + set code/symbol + exemplar).
+
+    Stage graph (CARDGRADER_CONCURRENT=1):
+      gate ‖ preprocess(front, back) ‖ trusted lookup
+        → vision checks ‖ symbol detection ‖ OCR set code ‖ OCR card name
+        → PTCG lookups + exemplar
+        → grader call ‖ CV blend
+    """
+
+    # One decode/warp per upload, shared by every stage below (and the CV blend).
+    front_path, back_path = CardImage.of(front_path), CardImage.of(back_path)
+
+    _debug(f"grade_with_openai start | front={front_path} back={back_path} game_hint={game_hint}")
+    _debug(f"Models | CLASS={OPENAI_MODEL_CLASS} GRADE={OPENAI_MODEL_GRADE} concurrent={CONCURRENT_STAGES}")
+
+    ptcgo_code = (ptcgo_code or "").strip().upper()
+    collector_number = (collector_number or "").strip()
+
+    # 1) Gate: sides & quality (locally when the game's back is recognisable, else LLM).
+    #    Preprocessing and the trusted lookup don't depend on it,
+    #    so start them speculatively and drop them if the gate rejects the upload.
+    gate_f = _stage(tracing.wrap("gate", _gate_images), front_path, back_path, game_hint)
+    f_url_f = _stage(tracing.wrap("encode_front", _preprocess_card_to_data_url), front_path)
+    b_url_f = _stage(tracing.wrap("encode_back", _preprocess_card_to_data_url), back_path) if back_path else None
+    front_np_f = _stage(tracing.wrap("preprocess", _preprocess_card_to_np), front_path)
+    trusted_f = _stage(tracing.wrap("ptcg_trusted", _resolve_trusted_hints), ptcgo_code, collector_number)
+
+    gate = gate_f.result()
+    rejected, swap = _check_gate(gate)
+    if rejected is not None:
+        _cancel_stages(f_url_f, b_url_f, front_np_f, trusted_f)
+        return rejected
+    if swap:
+        front_path, back_path = back_path, front_path
+        f_url_f, b_url_f = b_url_f, f_url_f
+        _cancel_stages(front_np_f)
+        front_np_f = _stage(tracing.wrap("preprocess", _preprocess_card_to_np), front_path)
+
+    # 2) Preprocess → warped np (data URLs are joined right before the grader call)
+    front_warp_bgr = front_np_f.result()
+    _debug(f"Preprocess done: front_warp_bgr is None? {front_warp_bgr is None}")
+
+    # Pure-CPU checks on the warped front can start now. Symbol detection is only
+    # consumed when the trusted hints don't resolve, so it's speculative too.
+    flags_f = _stage(tracing.wrap("vision_checks", run_vision_checks_img), front_warp_bgr) if front_warp_bgr is not None else None
+    symbol_f = _stage(tracing.wrap("symbol_detect", _detect_set_symbol_key), front_warp_bgr) if front_warp_bgr is not None else None
+
+    # --- NEW: if user supplied ptcgo_code + collector_number, trust and resolve via API/cache
+    trusted_set_info, trusted_card_info = trusted_f.result()
+
+    # 2b) OCR: set code & card name from warped front (the two calls are independent)
+    set_code_info = {"set_code": "", "language": "unknown"}
+    set_code_txt = ""
+    set_lang_txt = "unknown"
+    card_name = ""
+
+    if not _trusted_hints_complete(ptcgo_code, collector_number, trusted_set_info, trusted_card_info):
+        # Fall back to OCR discovery
+        set_code_f = _stage(tracing.wrap("ocr_set_code", _extract_set_code), front_warp_bgr)
+        card_name_f = _stage(tracing.wrap("ocr_card_name", _extract_card_name), front_warp_bgr)
+        set_code_info = set_code_f.result()
+        set_code_txt = set_code_info.get("set_code", "")
+        set_lang_txt = set_code_info.get("language", "unknown")
+        card_name = card_name_f.result()
+    else:
+        # Take the trusted values
+        set_code_txt = trusted_set_info.get("ptcgoCode", ptcgo_code)
+        card_name = trusted_card_info.get("card_name", "")
+
+    _save_json_debug({"set_code_info": set_code_info, "card_name": card_name}, "ocr_meta.json")
+
+    if trusted_set_info or trusted_card_info:
+        _cancel_stages(symbol_f)
+    set_info = _merge_set_info(
+        trusted_set_info, trusted_card_info, ptcgo_code, collector_number,
+        set_code_txt, set_lang_txt, card_name,
+        detect_symbol=(symbol_f.result if symbol_f is not None else (lambda: (None, 0.0))),
+    )
+    with tracing.span("ptcg_lookup"):
+        set_info = _enrich_set_info(set_info, set_code_txt, card_name)
+
+    # 3b) Vision checks (front only here)
+    cv_flags = {}
+    try:
+        raw_flags = flags_f.result() if flags_f is not None else {}
+        cv_flags = _json_sanitize(raw_flags)
+    except Exception:
+        _debug("Vision checks threw an exception:\n" + traceback.format_exc())
+        cv_flags = {}
+    _save_json_debug({"cv_flags": cv_flags}, "cv_flags.json")
+
+    f_url = f_url_f.result()
+    b_url = b_url_f.result() if b_url_f is not None else None
+    messages, hint_parts = _grader_messages(set_info, cv_flags, game_hint, f_url, b_url)
+
+    # The CV blend only needs the two photos, so it runs while the grader call is in flight.
+    cv_blend_f = _stage(tracing.wrap("cv_blend", _cv_blend_predict), front_path, back_path) if _cv_blend_enabled(back_path) else None
+
+    try:
+        _debug(f"Grader call: model={OPENAI_MODEL_GRADE}")
+        with tracing.span("grader_call"):
+            report = _chat_parsed(OPENAI_MODEL_GRADE, messages, GradeReport, "grader", temperature=0.2)
+        grader_ok = True
+    except Exception as e:
+        # transport error or no schema-valid reply: fallback scores, never cached
+        _debug("Grader exception: " + str(e))
+        _debug(traceback.format_exc())
+        report = None
+        grader_ok = False
+    data = _grader_result(report)
+
+    cv_pred = None
+    if cv_blend_f is not None:
+        try:
+            cv_pred = cv_blend_f.result()
+        except Exception:
+            _debug("CV blend failed; continuing LLM-only.\n" + traceback.format_exc())
+
+    result = _finalize_grade(
+        data, cv_flags=cv_flags, cv_pred=cv_pred, set_info=set_info,
+        set_code_info=set_code_info, set_code_txt=set_code_txt, set_lang_txt=set_lang_txt,
+        card_name=card_name, gate=gate, hint_parts=hint_parts, grader_ok=grader_ok,
+    )
+    _debug("grade_with_openai done.")
+    return result
+
+
+@debug_writer.scoped("ai")
+async def grade_with_openai_async(front_path: Union[Path, CardImage],
+                                  back_path: Union[Path, CardImage, None] = None,
+                                  game_hint: Optional[str] = None,
+                                  ptcgo_code: Optional[str] = None,
+                                  collector_number: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Same pipeline as grade_with_openai, for ASGI views: the LLM calls go through the
+    shared AsyncOpenAI keep-alive pool and CPU/blocking stages run in worker threads,
+    so one event loop can keep many grades in flight.
+    """
+    front_path, back_path = CardImage.of(front_path), CardImage.of(back_path)
+
+    _debug(f"grade_with_openai_async start | front={front_path} back={back_path} game_hint={game_hint}")
+
+    ptcgo_code = (ptcgo_code or "").strip().upper()
+    collector_number = (collector_number or "").strip()
+
+    def _task(fn, *args):
+        return asyncio.ensure_future(asyncio.to_thread(fn, *args))
+
+    # 1) Gate ‖ speculative preprocessing ‖ trusted lookup
+    gate_t = asyncio.ensure_future(tracing.awrap("gate", _agate_images)(front_path, back_path, game_hint))
+    f_url_t = _task(tracing.wrap("encode_front", _preprocess_card_to_data_url), front_path)
+    b_url_t = _task(tracing.wrap("encode_back", _preprocess_card_to_data_url), back_path) if back_path else None
+    front_np_t = _task(tracing.wrap("preprocess", _preprocess_card_to_np), front_path)
+    trusted_t = _task(tracing.wrap("ptcg_trusted", _resolve_trusted_hints), ptcgo_code, collector_number)
+
+    gate = await gate_t
+    rejected, swap = _check_gate(gate)
+    if rejected is not None:
+        _cancel_stages(f_url_t, b_url_t, front_np_t, trusted_t)
+        return rejected
+    if swap:
+        front_path, back_path = back_path, front_path
+        f_url_t, b_url_t = b_url_t, f_url_t
+        _cancel_stages(front_np_t)
+        front_np_t = _task(tracing.wrap("preprocess", _preprocess_card_to_np), front_path)
+
+    # 2) Preprocess, then the CPU checks on the warped front
+    front_warp_bgr = await front_np_t
+    flags_t = _task(tracing.wrap("vision_checks", run_vision_checks_img), front_warp_bgr) if front_warp_bgr is not None else None
+
+    trusted_set_info, trusted_card_info = await trusted_t
+
+    # 2b) OCR (both calls in flight together)
+    set_code_info = {"set_code": "", "language": "unknown"}
+    set_lang_txt = "unknown"
+    if not _trusted_hints_complete(ptcgo_code, collector_number, trusted_set_info, trusted_card_info):
+        set_code_info, card_name = await asyncio.gather(
+            tracing.awrap("ocr_set_code", _aextract_set_code)(front_warp_bgr),
+            tracing.awrap("ocr_card_name", _aextract_card_name)(front_warp_bgr),
+        )
+        set_code_txt = set_code_info.get("set_code", "")
+        set_lang_txt = set_code_info.get("language", "unknown")
+    else:
+        set_code_txt = trusted_set_info.get("ptcgoCode", ptcgo_code)
+        card_name = trusted_card_info.get("card_name", "")
+    _save_json_debug({"set_code_info": set_code_info, "card_name": card_name}, "ocr_meta.json")
+
+    symbol = (None, 0.0)
+    if not (trusted_set_info or trusted_card_info) and front_warp_bgr is not None:
+        symbol = await asyncio.to_thread(tracing.wrap("symbol_detect", _detect_set_symbol_key), front_warp_bgr)
+    set_info = _merge_set_info(
+        trusted_set_info, trusted_card_info, ptcgo_code, collector_number,
+        set_code_txt, set_lang_txt, card_name, detect_symbol=lambda: symbol,
+    )
+    set_info = await asyncio.to_thread(tracing.wrap("ptcg_lookup", _enrich_set_info), set_info, set_code_txt, card_name)
+
+    cv_flags = {}
+    try:
+        cv_flags = _json_sanitize(await flags_t) if flags_t is not None else {}
+    except Exception:
+        _debug("Vision checks threw an exception:\n" + traceback.format_exc())
+        cv_flags = {}
+    _save_json_debug({"cv_flags": cv_flags}, "cv_flags.json")
+
+    f_url = await f_url_t
+    b_url = (await b_url_t) if b_url_t is not None else None
+    # may download reference images → off the event loop
+    messages, hint_parts = await asyncio.to_thread(_grader_messages, set_info, cv_flags, game_hint, f_url, b_url)
+
+    # 4) Grader call ‖ CV blend
+    cv_blend_t = _task(tracing.wrap("cv_blend", _cv_blend_predict), front_path, back_path) if _cv_blend_enabled(back_path) else None
+    try:
+        _debug(f"Grader call (async): model={OPENAI_MODEL_GRADE}")
+        with tracing.span("grader_call"):
+            report = await _achat_parsed(OPENAI_MODEL_GRADE, messages, GradeReport, "grader", temperature=0.2)
+        grader_ok = True
+    except Exception as e:
+        # transport error or no schema-valid reply: fallback scores, never cached
+        _debug("Grader exception: " + str(e))
+        _debug(traceback.format_exc())
+        report = None
+        grader_ok = False
+    data = _grader_result(report)
+
+    cv_pred = None
+    if cv_blend_t is not None:
+        try:
+            cv_pred = await cv_blend_t
+        except Exception:
+            _debug("CV blend failed; continuing LLM-only.\n" + traceback.format_exc())
+
+    result = _finalize_grade(
+        data, cv_flags=cv_flags, cv_pred=cv_pred, set_info=set_info,
+        set_code_info=set_code_info, set_code_txt=set_code_txt, set_lang_txt=set_lang_txt,
+        card_name=card_name, gate=gate, hint_parts=hint_parts, grader_ok=grader_ok,
+    )
+    _debug("grade_with_openai_async done.")
+    return result
+
 # =========================
 # Normalization helpers
 # =========================
@@ -1650,16 +1782,14 @@ def _enforce_observation_guard(result: Dict[str, Any]) -> Dict[str, Any]:
     return result
 
 
-def _apply_observation_thresholds(result: Dict[str, Any]) -> Dict[str, Any]:
+def _apply_observation_thresholds(result: Dict[str, Any], fired: Optional[frozenset] = None) -> Dict[str, Any]:
     """
     Require stronger evidence to drop below 9.5:
     - At least 2 concrete observations, or
     - One high-impact note (crease/dent/deep scratch).
     """
     obs = [o for o in (result.get("observations") or []) if isinstance(o, dict)]
-    high_impact = {"crease", "dent", "deep scratch"}
-    notes = " ".join((o.get("note", "") or "").lower() for o in obs)
-    has_high = any(word in notes for word in high_impact)
+    has_high = "high_impact" in (grade_rules.match(result) if fired is None else fired)
     if len(obs) < 2 and not has_high:
         for k in ["surface", "edges", "corners", "color"]:
             result["scores"][k] = max(result["scores"][k], 9.5)
@@ -0,0 +1,104 @@
+# grading/phash_index.py
+"""
+Near-duplicate lookup over graded requests.
+
+Each process keeps a BK-tree of GradeRequest.phash (front) for finished grades and
+tops it up incrementally (rows finished since the last refresh), so lookups stay
+sub-linear and the DB only ever sees a cheap "finished since" query. Jobs finish out of
+pk order across workers, so the window overlaps the previous one and already-indexed
+pks are skipped.
+
+Hashes are only computed on the grading path when reuse is on (GRADING_PHASH_REUSE=1):
+hashing runs a full-resolution rectify of both sides, which nothing else needs.
+export_dataset --dedupe-phash hashes unhashed rows itself, in memory.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from datetime import timedelta
+from pathlib import Path
+from typing import Optional, Tuple
+
+from django.utils import timezone
+
+from .models import GradeRequest
+
+PHASH_ENABLED = os.getenv("GRADING_PHASH", "1").strip() not in {"", "0", "false", "False"}
+# Reusing a prior grade for a near-identical upload is opt-in: two copies of the same
+# card shot the same way can hash close together and still differ in condition.
+PHASH_REUSE = os.getenv("GRADING_PHASH_REUSE", "0").strip() not in {"", "0", "false", "False"}
+PHASH_MAX_DIST = int(os.getenv("GRADING_PHASH_MAX_DIST", "4"))  # of 64 bits
+# how far back each refresh re-reads: covers commits that land after their finished_at
+# and clock skew between worker hosts
+PHASH_REFRESH_OVERLAP = timedelta(seconds=int(os.getenv("GRADING_PHASH_REFRESH_OVERLAP_S", "300")))
+
+
+class _Index:
+    def __init__(self) -> None:
+        self.tree = None
+        self.indexed = set()  # pks already in the tree
+        self.since = None  # start of the last refresh; None = full load
+        self.lock = threading.Lock()
+
+    def refresh(self) -> None:
+        from grading.ml.phash import BKTree, from_hex  # lazy: cv2
+
+        with self.lock:
+            if self.tree is None:
+                self.tree = BKTree()
+            now = timezone.now()
+            rows = (GradeRequest.objects
+                    .filter(status=GradeRequest.STATUS_DONE, needs_better_photos=False)
+                    .exclude(phash=""))
+            if self.since is not None:
+                rows = rows.filter(finished_at__gte=self.since - PHASH_REFRESH_OVERLAP)
+            for pk, front, back in rows.values_list("pk", "phash", "phash_back").iterator():
+                if pk in self.indexed:
+                    continue
+                self.tree.add(from_hex(front), (pk, back))
+                self.indexed.add(pk)
+            self.since = now
+
+    def search(self, front_hex: str, radius: int):
+        from grading.ml.phash import from_hex
+
+        self.refresh()
+        with self.lock:
+            return self.tree.search(from_hex(front_hex), radius)
+
+
+_INDEX = _Index()
+
+
+def compute(front_path: Path, back_path: Optional[Path]) -> Tuple[str, str]:
+    """(front_hex, back_hex) for an upload; blanks when hashing is off or fails."""
+    if not PHASH_ENABLED:
+        return "", ""
+    from grading.ml.phash import image_phash  # lazy: cv2
+    try:
+        return image_phash(front_path), image_phash(back_path) if back_path else ""
+    except Exception:
+        return "", ""
+
+
+def find_near_duplicate(gr: GradeRequest, radius: int = PHASH_MAX_DIST) -> Optional[GradeRequest]:
+    """
+    Closest finished request whose front AND back are within `radius` bits of gr's,
+    graded by the same engine with the same hints. None if nothing qualifies.
+    """
+    if not gr.phash:
+        return None
+    from grading.ml.phash import from_hex, hamming
+
+    for _, (pk, back_hex) in _INDEX.search(gr.phash, radius):
+        if pk == gr.pk:
+            continue
+        if bool(gr.phash_back) != bool(back_hex):
+            continue
+        if gr.phash_back and hamming(from_hex(gr.phash_back), from_hex(back_hex)) > radius:
+            continue
+        prior = GradeRequest.objects.filter(pk=pk).first()
+        if prior and prior.engine == gr.engine and prior.game == gr.game and prior.job_params == gr.job_params:
+            return prior
+    return None
@@ -0,0 +1,108 @@
+# grading/result_cache.py
+"""
+Content-addressed cache for grade results.
+
+Key = sha256 over the front/back image bytes plus everything else that feeds the
+answer (engine, game hint, user hints, model/weights fingerprint). Entries live in
+GradeCacheEntry; stale ones (TTL) and the least-recently-hit overflow (LRU) are
+evicted on write.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from django.db import IntegrityError
+from django.db.models import F
+from django.utils import timezone
+
+from .models import GradeCacheEntry
+
+CACHE_ENABLED = os.getenv("GRADING_RESULT_CACHE", "1").strip() not in {"", "0", "false", "False"}
+CACHE_TTL_DAYS = float(os.getenv("GRADING_RESULT_CACHE_TTL_DAYS", "30"))
+CACHE_MAX_ENTRIES = int(os.getenv("GRADING_RESULT_CACHE_MAX", "5000"))
+
+
+def file_digest(path: Optional[Path]) -> str:
+    if not path:
+        return ""
+    derive = getattr(path, "derive", None)  # CardImage: reuse the bytes it already holds
+    if derive is not None:
+        return derive("sha256", lambda: hashlib.sha256(path.data).hexdigest())
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def make_key(engine: str,
+             front_path: Path,
+             back_path: Optional[Path],
+             fingerprint: Dict[str, Any],
+             **params) -> str:
+    payload = {
+        "engine": engine,
+        "front": file_digest(front_path),
+        "back": file_digest(back_path),
+        "params": {k: (v or "") for k, v in sorted(params.items())},
+        "fingerprint": fingerprint,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def get(key: str) -> Optional[Dict[str, Any]]:
+    if not CACHE_ENABLED:
+        return None
+    entry = GradeCacheEntry.objects.filter(key=key).only("result", "created_at").first()
+    if entry is None:
+        return None
+    if CACHE_TTL_DAYS and entry.created_at < timezone.now() - timedelta(days=CACHE_TTL_DAYS):
+        GradeCacheEntry.objects.filter(pk=entry.pk).delete()
+        return None
+    GradeCacheEntry.objects.filter(pk=entry.pk).update(hits=F("hits") + 1, last_hit_at=timezone.now())
+    return entry.result
+
+
+def put(key: str, engine: str, result: Dict[str, Any]) -> None:
+    if not CACHE_ENABLED:
+        return
+    try:
+        GradeCacheEntry.objects.update_or_create(key=key, defaults={"engine": engine, "result": result})
+    except IntegrityError:
+        return  # another worker stored the same key first
+    evict()
+
+
+def evict() -> int:
+    """Drop expired entries, then the least recently hit ones above CACHE_MAX_ENTRIES."""
+    removed = 0
+    if CACHE_TTL_DAYS:
+        cutoff = timezone.now() - timedelta(days=CACHE_TTL_DAYS)
+        removed += GradeCacheEntry.objects.filter(created_at__lt=cutoff).delete()[0]
+    if CACHE_MAX_ENTRIES:
+        overflow = (GradeCacheEntry.objects
+                    .order_by("-last_hit_at")
+                    .values_list("pk", flat=True)[CACHE_MAX_ENTRIES:CACHE_MAX_ENTRIES + 500])
+        ids = list(overflow)
+        if ids:
+            removed += GradeCacheEntry.objects.filter(pk__in=ids).delete()[0]
+    return removed
+
+
+def cached(key: str,
+           engine: str,
+           compute: Callable[[], Dict[str, Any]],
+           cacheable: Callable[[Dict[str, Any]], bool] = lambda r: True) -> Dict[str, Any]:
+    """Return the cached result for `key`, or compute, store (if cacheable) and return it."""
+    hit = get(key)
+    if hit is not None:
+        return hit
+    result = compute()
+    if cacheable(result):
+        put(key, engine, result)
+    return result
@@ -0,0 +1,123 @@
+# grading/set_registry.py
+"""
+Set-code registry shared by the grader (openai_client) and the PTCG catalog cache.
+
+The tables live in grading/data/set_registry.json (override: CARDGRADER_SET_REGISTRY)
+and are loaded and indexed once at import:
+
+- styles:  normalised "<code> <lang>" -> set style (set_name / era / border / language)
+- ptcgo:   printed/typed code -> PTCGO code (the pokemontcg.io `ptcgoCode`)
+- aliases: other spellings -> printed code
+
+canonical() turns an OCR'd/typed token into a printed code with O(1) lookups, in order:
+exact code, alias, PTCGO code, OCR-confusion skeleton (5/S, 0/O/D, 1/I/L, 8/B, 2/Z, 6/G:
+"5V1" -> "SVI") and unique-prefix completion ("SV15" -> "SV151"). The last two only
+apply when they point at exactly one code; ambiguous reads resolve to nothing.
+"""
+from __future__ import annotations
+
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+from types import MappingProxyType
+from typing import Dict, FrozenSet, Mapping
+
+REGISTRY_PATH = Path(os.getenv("CARDGRADER_SET_REGISTRY") or Path(__file__).parent / "data" / "set_registry.json")
+
+_SEPARATORS = str.maketrans({ch: " " for ch in ".-_/\\|:;,"})
+_CONFUSABLE = str.maketrans({"5": "S", "0": "O", "D": "O", "Q": "O", "1": "I", "L": "I",
+                             "8": "B", "2": "Z", "6": "G"})
+_MIN_PREFIX = 3
+
+
+def _load(path: Path) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+_data = _load(REGISTRY_PATH)
+
+STYLES: Mapping[str, Mapping[str, str]] = MappingProxyType(
+    {k: MappingProxyType(dict(v)) for k, v in _data["styles"].items()})
+CODE_TO_PTCGO: Mapping[str, str] = MappingProxyType(dict(_data["ptcgo"]))
+ALIASES: Mapping[str, str] = MappingProxyType({k.upper(): v.upper() for k, v in _data["aliases"].items()})
+
+
+def _build_indexes():
+    codes = {k.split()[0].upper() for k in STYLES} | set(CODE_TO_PTCGO)
+    by_ptcgo: Dict[str, str] = {}
+    for code, pt in CODE_TO_PTCGO.items():
+        by_ptcgo.setdefault(pt, code)
+    skeletons: Dict[str, set] = {}
+    prefixes: Dict[str, set] = {}
+    for code in codes:
+        skeletons.setdefault(code.translate(_CONFUSABLE), set()).add(code)
+        for n in range(_MIN_PREFIX, len(code)):
+            prefixes.setdefault(code[:n], set()).add(code)
+    by_code: Dict[str, Dict[str, Mapping[str, str]]] = {}
+    for key, info in STYLES.items():
+        toks = key.split()
+        by_code.setdefault(toks[0].upper(), {})[toks[1] if len(toks) > 1 else ""] = info
+    unique = lambda idx: {k: next(iter(v)) for k, v in idx.items() if len(v) == 1}  # noqa: E731
+    return (frozenset(codes), MappingProxyType(by_ptcgo), MappingProxyType(unique(skeletons)),
+            MappingProxyType(unique(prefixes)), MappingProxyType(by_code))
+
+
+_CODES, _BY_PTCGO, _BY_SKELETON, _BY_PREFIX, _STYLES_BY_CODE = _build_indexes()
+
+
+@lru_cache(maxsize=4096)
+def norm(code: str) -> str:
+    """'SV1-EN ' -> 'sv1 en' (lower-case, separators to single spaces)."""
+    return " ".join((code or "").translate(_SEPARATORS).split()).lower()
+
+
+@lru_cache(maxsize=4096)
+def canonical(token: str) -> str:
+    """Printed set code for one OCR'd/typed token ('' if it can't be pinned to one code)."""
+    tok = (token or "").strip().upper()
+    if not tok:
+        return ""
+    if tok in _CODES:
+        return tok
+    if tok in ALIASES:
+        return ALIASES[tok]
+    if tok in _BY_PTCGO:
+        return _BY_PTCGO[tok]
+    return _BY_SKELETON.get(tok.translate(_CONFUSABLE)) or _BY_PREFIX.get(tok, "")
+
+
+def ptcgo(code: str) -> str:
+    """PTCGO code for 'SM12', 'sm12 en', 'EVS EN', 'PAR', '5VI', ... ('' if unknown)."""
+    toks = norm(code).split()
+    if not toks:
+        return ""
+    tok = toks[0].upper()
+    if tok in _BY_PTCGO:  # already a PTCGO code
+        return tok
+    canon = canonical(tok)
+    return CODE_TO_PTCGO.get(canon, "")
+
+
+def style(code: str) -> Dict[str, str]:
+    """Style info for a set code + optional language token ({} if unknown)."""
+    nc = norm(code)
+    if not nc:
+        return {}
+    if nc in STYLES:
+        return dict(STYLES[nc])
+    toks = nc.split()
+    for key in (toks[0], " ".join(toks[:2])):
+        if key in STYLES:
+            return dict(STYLES[key])
+    # tolerant path: canonical code, same language (or any when the read had none)
+    by_lang = _STYLES_BY_CODE.get(canonical(toks[0]), {})
+    lang = toks[1] if len(toks) > 1 else ""
+    info = by_lang.get(lang) if lang else next(iter(by_lang.values()), None)
+    return dict(info) if info else {}
+
+
+def known_codes() -> FrozenSet[str]:
+    """Printed and PTCGO codes (upper-case), e.g. for the local OCR's token scoring."""
+    return _CODES | frozenset(_BY_PTCGO)
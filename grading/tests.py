@@ -1,3 +1,229 @@
-from django.test import TestCase
+import importlib.util
+import io
+import json
+import tempfile
+import unittest
+import unittest.mock
+from datetime import timedelta
+from pathlib import Path
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from grading import jobs
+from grading.models import GradeRequest
+
+_HAS_TORCH = all(importlib.util.find_spec(m) for m in ("torch", "torchvision", "cv2"))
+_HAS_CV2 = all(importlib.util.find_spec(m) for m in ("cv2", "numpy"))
+_HAS_PTCG = importlib.util.find_spec("pokemontcgsdk") is not None
+_HAS_ORT = _HAS_TORCH and all(importlib.util.find_spec(m) for m in ("onnx", "onnxruntime"))
+
+
+@unittest.skipUnless(_HAS_TORCH, "needs torch, torchvision and opencv")
+class ExportParityTests(SimpleTestCase):
+    """Exported CV backends must score like the eager PairRegressor they came from."""
+
+    SIZE = 128  # any size works for the conv net; small keeps the test fast
+    ATOL = 1e-4
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        import torch
+        from grading.ml import export
+        from grading.ml.model import PairRegressor
+
+        torch.manual_seed(0)
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls.weights = Path(cls._tmp.name) / "cardgrader_test.pt"
+        torch.save(PairRegressor().state_dict(), cls.weights)
+        cls.eager = export.load_eager(cls.weights)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._tmp.cleanup()
+        super().tearDownClass()
+
+    def test_torchscript_matches_eager(self):
+        from grading.ml import export, model_server
+
+        out = export.export_torchscript(self.eager, self.weights.with_suffix(".ts"), self.SIZE)
+        diff = export.max_abs_diff(self.eager, model_server.TorchRegressor.torchscript(out), self.SIZE, batch=3)
+        self.assertLess(diff, self.ATOL)
+
+    @unittest.skipUnless(_HAS_ORT, "needs onnx and onnxruntime")
+    def test_onnx_matches_eager(self):
+        from grading.ml import export, model_server
+
+        out = export.export_onnx(self.eager, self.weights.with_suffix(".onnx"), self.SIZE)
+        diff = export.max_abs_diff(self.eager, model_server.OrtRegressor(out), self.SIZE, batch=3)
+        self.assertLess(diff, self.ATOL)
+
+    def test_numpy_transform_matches_pair_transform(self):
+        import numpy as np
+        from PIL import Image
+        from grading.ml.eval_transform import pair_array
+        from grading.ml.transforms import PairTransform
+
+        rng = np.random.default_rng(0)
+        tf = PairTransform(train=False, size=self.SIZE)
+        for w, h in [(300, 420), (420, 300), (self.SIZE, self.SIZE), (201, 333)]:
+            front = Image.fromarray(rng.integers(0, 256, (h, w, 3), dtype=np.uint8))
+            back = Image.fromarray(rng.integers(0, 256, (w, h, 3), dtype=np.uint8))
+            ref = tf({"front": front, "back": back})["pair"].numpy()
+            got = pair_array(front, back, self.SIZE)
+            self.assertEqual(got.shape, ref.shape)
+            self.assertLess(float(np.abs(got - ref).max()), 1e-5)
+
+
+class JobQueueTests(TestCase):
+    """DB-backed job queue: claiming, stale-job recovery, inline grades."""
+
+    def _row(self, status=GradeRequest.STATUS_QUEUED, **fields):
+        return GradeRequest.objects.create(front_image="grading/test.jpg", engine="cv", status=status, **fields)
+
+    def test_claim_next_takes_oldest_queued_once(self):
+        first, second = self._row(), self._row()
+        self._row(status=GradeRequest.STATUS_DONE)
+
+        got = jobs.claim_next("w1")
+        self.assertEqual(got.pk, first.pk)
+        self.assertEqual((got.status, got.worker, got.attempts),
+                         (GradeRequest.STATUS_RUNNING, "w1", 1))
+        self.assertIsNotNone(got.started_at)
+        self.assertEqual(jobs.claim_next("w2").pk, second.pk)
+        self.assertIsNone(jobs.claim_next("w3"))
+
+    def test_claim_next_skips_rows_claimed_since_the_scan(self):
+        taken, free = self._row(), self._row()
+        real_filter = GradeRequest.objects.filter
+
+        def racing_filter(*args, **kwargs):
+            qs = real_filter(*args, **kwargs)
+            if kwargs.get("pk") == taken.pk:  # another worker wins between scan and UPDATE
+                real_filter(pk=taken.pk).update(status=GradeRequest.STATUS_RUNNING, worker="other")
+            return qs
+
+        with unittest.mock.patch.object(GradeRequest.objects, "filter", side_effect=racing_filter):
+            got = jobs.claim_next("w1")
+        self.assertEqual(got.pk, free.pk)
+        self.assertEqual(GradeRequest.objects.get(pk=taken.pk).worker, "other")
+
+    def test_inline_rows_are_never_claimed(self):
+        gr = jobs.start_inline(GradeRequest(front_image="grading/test.jpg"), "ai", ptcgo_code="SVI", collector_number="")
+        gr.refresh_from_db()
+        self.assertEqual(gr.status, GradeRequest.STATUS_RUNNING)
+        self.assertTrue(gr.worker.startswith(jobs.INLINE_PREFIX))
+        self.assertEqual((gr.attempts, gr.job_params), (1, {"ptcgo_code": "SVI"}))
+        self.assertIsNone(jobs.claim_next("w1"))
+
+    def test_reclaim_stale_requeues_then_fails(self):
+        old = timezone.now() - timedelta(seconds=jobs.JOB_TIMEOUT_S + 60)
+        running = dict(status=GradeRequest.STATUS_RUNNING, worker="dead:1", started_at=old)
+        retry = self._row(attempts=1, **running)
+        spent = self._row(attempts=2, **running)
+        fresh = self._row(status=GradeRequest.STATUS_RUNNING, worker="live:1", attempts=1, started_at=timezone.now())
+        inline = self._row(status=GradeRequest.STATUS_RUNNING, worker=jobs.INLINE_PREFIX + "web:1",
+                           attempts=1, started_at=old)
+
+        self.assertEqual(jobs.reclaim_stale(max_attempts=2), 3)
+        status = dict(GradeRequest.objects.values_list("pk", "status"))
+        self.assertEqual(status[retry.pk], GradeRequest.STATUS_QUEUED)
+        self.assertEqual(status[spent.pk], GradeRequest.STATUS_FAILED)
+        self.assertEqual(status[fresh.pk], GradeRequest.STATUS_RUNNING)
+        self.assertEqual(status[inline.pk], GradeRequest.STATUS_FAILED)
+        self.assertEqual(GradeRequest.objects.get(pk=retry.pk).worker, "")
+        self.assertEqual(jobs.claim_next("w1").pk, retry.pk)  # only the requeued row is claimable
+        self.assertIsNone(jobs.claim_next("w1"))
+
+
+@unittest.skipUnless(_HAS_CV2, "needs opencv and numpy")
+class PhashIndexTests(TestCase):
+    """BK-tree radius queries and the incremental near-duplicate index."""
+
+    def test_bktree_matches_brute_force(self):
+        import random
+        from grading.ml.phash import BKTree, hamming
+
+        rng = random.Random(0)
+        base = [rng.getrandbits(64) for _ in range(20)]
+        # clusters of near-identical hashes plus unrelated ones
+        hashes = [b ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64)) for b in base for _ in range(5)]
+        hashes += [rng.getrandbits(64) for _ in range(200)]
+        tree = BKTree((h, i) for i, h in enumerate(hashes))
+        self.assertEqual(len(tree), len(hashes))
+        for q in base + hashes[:10]:
+            for radius in (0, 2, 4, 10):
+                want = sorted((hamming(q, h), i) for i, h in enumerate(hashes) if hamming(q, h) <= radius)
+                self.assertEqual(sorted(tree.search(q, radius)), want)
+
+    def test_refresh_picks_up_rows_finished_out_of_order(self):
+        from grading import phash_index
+
+        index = phash_index._Index()
+        h = "0f" * 8
+
+        def row(status, **fields):
+            return GradeRequest.objects.create(front_image="grading/test.jpg", phash=h, status=status, **fields)
+
+        first = row(GradeRequest.STATUS_DONE, finished_at=timezone.now())
+        slow = row(GradeRequest.STATUS_RUNNING)
+        late = row(GradeRequest.STATUS_DONE, finished_at=timezone.now())
+        index.refresh()  # indexes first and late; slow (lower pk) is still running
+        # finishes after the refresh, stamped a little earlier (clock skew / slow commit)
+        GradeRequest.objects.filter(pk=slow.pk).update(
+            status=GradeRequest.STATUS_DONE, finished_at=timezone.now() - timedelta(seconds=30))
+
+        found = sorted(pk for _, (pk, _) in index.search(h, 0))
+        self.assertEqual(found, [first.pk, slow.pk, late.pk])
+        index.refresh()
+        self.assertEqual(len(index.search(h, 0)), 3)  # overlapping windows don't add duplicates
+
+
+@unittest.skipUnless(_HAS_PTCG, "needs pokemontcgsdk")
+class ImportPtcgCatalogTests(TestCase):
+    """import_ptcg_catalog must stay resumable: a set counts as imported only with its cards."""
+
+    SETS = [{"id": "sv1", "name": "Scarlet & Violet", "ptcgoCode": "SVI", "updatedAt": "2024/01/01"},
+            {"id": "sv2", "name": "Paldea Evolved", "ptcgoCode": "PAL", "updatedAt": "2024/02/01"}]
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.dump = Path(self._tmp.name)
+        (self.dump / "sets").mkdir()
+        (self.dump / "sets" / "en.json").write_text(json.dumps(self.SETS), encoding="utf-8")
+        (self.dump / "cards" / "en").mkdir(parents=True)
+        for s in self.SETS:
+            cards = [{"id": f"{s['id']}-{n}", "name": f"Card {n}", "number": str(n)} for n in range(1, 4)]
+            (self.dump / "cards" / "en" / f"{s['id']}.json").write_text(json.dumps(cards), encoding="utf-8")
+
+    def _import(self):
+        out = io.StringIO()
+        call_command("import_ptcg_catalog", str(self.dump), "--chunk", "1", stdout=out)
+        return out.getvalue()
+
+    def test_interrupted_import_is_finished_by_an_incremental_rerun(self):
+        from grading.models import PtcgCard, PtcgSet
+        from grading.utils import pokemon_cache
+
+        real_upsert = pokemon_cache.bulk_upsert
+
+        def dies_in_sv2(rows):
+            if rows and isinstance(rows[0], PtcgCard) and rows[0].set_id == "sv2":
+                raise KeyboardInterrupt  # killed mid-import
+            return real_upsert(rows)
+
+        with unittest.mock.patch.object(pokemon_cache, "bulk_upsert", side_effect=dies_in_sv2):
+            with self.assertRaises(KeyboardInterrupt):
+                self._import()
+        self.assertEqual(PtcgCard.objects.filter(set_id="sv2").count(), 0)
+        self.assertEqual(set(PtcgSet.objects.values_list("updated_at", flat=True)), {""})
+
+        self._import()  # incremental: no --force
+        self.assertEqual(PtcgCard.objects.filter(set_id="sv2").count(), 3)
+        self.assertEqual(dict(PtcgSet.objects.values_list("id", "updated_at")),
+                         {s["id"]: s["updatedAt"] for s in self.SETS})
+
+        self.assertIn("2 sets / 6 cards unchanged", self._import())
@@ -0,0 +1,224 @@
+# grading/tracing.py
+"""
+Per-request stage tracing for the grading pipeline.
+
+The job runner (jobs.run_job / the async view) opens a Trace; pipeline code wraps its
+stages in span(name) and the LLM transport reports token usage and request bytes with
+record_llm(). Both are no-ops when no trace is active, so the pipeline can be called
+directly (tests, scripts) without any setup.
+
+The active trace lives in a ContextVar: asyncio tasks and asyncio.to_thread inherit
+it, and openai_client._stage copies the context into its pool threads.
+
+Trace.to_dict() is stored as GradeRequest.raw_json["trace"]; summarize() turns a
+batch of those into the per-stage p50/p95 table on the staff stats page.
+"""
+from __future__ import annotations
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+# USD per 1M tokens (input, output). Models not listed are traced without a cost.
+PRICES_PER_MTOK: Dict[str, tuple] = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+_COUNTERS = ("llm_calls", "prompt_tokens", "completion_tokens", "bytes_sent", "cost_usd")
+
+
+class Trace:
+    def __init__(self) -> None:
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans: List[Dict[str, Any]] = []
+        self.meta: Dict[str, Any] = {}
+        self.totals: Dict[str, float] = {k: 0 for k in _COUNTERS}
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._t0) * 1000.0
+
+    def add_span(self, rec: Dict[str, Any]) -> None:
+        with self._lock:
+            self.spans.append(rec)
+
+    def count(self, rec: Optional[Dict[str, Any]], **inc: float) -> None:
+        with self._lock:
+            for k, v in inc.items():
+                self.totals[k] = self.totals.get(k, 0) + v
+                if rec is not None:
+                    rec[k] = rec.get(k, 0) + v
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+            totals = dict(self.totals)
+        totals["cost_usd"] = round(totals["cost_usd"], 6)
+        return {"total_ms": round(self.elapsed_ms(), 1), **self.meta, **totals, "spans": spans}
+
+
+_TRACE: ContextVar[Optional[Trace]] = ContextVar("grading_trace", default=None)
+_SPAN: ContextVar[Optional[Dict[str, Any]]] = ContextVar("grading_span", default=None)
+
+
+@contextmanager
+def start() -> Iterator[Trace]:
+    """Open a trace for the current request (and everything it fans out to)."""
+    tr = Trace()
+    token = _TRACE.set(tr)
+    try:
+        yield tr
+    finally:
+        _TRACE.reset(token)
+
+
+def current() -> Optional[Trace]:
+    return _TRACE.get()
+
+
+def annotate(**kv: Any) -> None:
+    """Attach request-level facts (engine, cache hit, ...) to the active trace."""
+    tr = _TRACE.get()
+    if tr is not None:
+        tr.meta.update(kv)
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+    """Time one stage. The yielded dict can take extra attributes (e.g. source="local")."""
+    tr = _TRACE.get()
+    if tr is None:
+        yield {}
+        return
+    rec: Dict[str, Any] = {"stage": name, "start_ms": round(tr.elapsed_ms(), 1), **attrs}
+    token = _SPAN.set(rec)
+    t0 = time.perf_counter()
+    try:
+        yield rec
+        rec["ok"] = True
+    except BaseException as e:
+        rec["ok"] = False
+        rec["error"] = e.__class__.__name__
+        raise
+    finally:
+        rec["ms"] = round((time.perf_counter() - t0) * 1000.0, 1)
+        _SPAN.reset(token)
+        tr.add_span(rec)
+
+
+def tag(**kv: Any) -> None:
+    """Attach attributes to the innermost open span."""
+    rec = _SPAN.get()
+    if rec is not None:
+        rec.update(kv)
+
+
+def wrap(name: str, fn: Callable) -> Callable:
+    """fn, run inside span(name); for handing stages to _stage / to_thread."""
+    def run(*args, **kwargs):
+        with span(name):
+            return fn(*args, **kwargs)
+    run.__name__ = getattr(fn, "__name__", name)
+    return run
+
+
+def awrap(name: str, fn: Callable) -> Callable:
+    """Coroutine-function version of wrap()."""
+    async def run(*args, **kwargs):
+        with span(name):
+            return await fn(*args, **kwargs)
+    run.__name__ = getattr(fn, "__name__", name)
+    return run
+
+
+def _payload_bytes(messages: list) -> int:
+    n = 0
+    for m in messages:
+        content = m.get("content")
+        if isinstance(content, str):
+            n += len(content)
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                n += len(part.get("text") or "")
+            elif part.get("type") == "image_url":
+                n += len((part.get("image_url") or {}).get("url") or "")
+    return n
+
+
+def record_llm(model: str, messages: list, usage: Any) -> None:
+    """Count one LLM round-trip against the current span (and the trace totals)."""
+    tr = _TRACE.get()
+    if tr is None:
+        return
+    p = int(getattr(usage, "prompt_tokens", 0) or 0)
+    c = int(getattr(usage, "completion_tokens", 0) or 0)
+    price = PRICES_PER_MTOK.get(model)
+    cost = (p * price[0] + c * price[1]) / 1e6 if price else 0.0
+    tr.count(_SPAN.get(), llm_calls=1, prompt_tokens=p, completion_tokens=c,
+             bytes_sent=_payload_bytes(messages), cost_usd=cost)
+
+
+# =========================
+# Aggregation (staff page)
+# =========================
+def _pct(sorted_vals: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_vals:
+        return 0.0
+    k = max(0, min(len(sorted_vals) - 1, math.ceil(q * len(sorted_vals)) - 1))
+    return sorted_vals[k]
+
+
+def summarize(traces: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Per-stage latency percentiles and mean cost over many stored traces. A stage that
+    runs more than once in a request (e.g. retries) is summed for that request.
+    """
+    per_stage: Dict[str, Dict[str, List[float]]] = {}
+    totals: Dict[str, List[float]] = {"total_ms": [], "cost_usd": [], "prompt_tokens": [],
+                                      "completion_tokens": [], "bytes_sent": []}
+    n = hits = 0
+    for t in traces:
+        n += 1
+        hits += bool(t.get("cache_hit"))
+        for k in totals:
+            totals[k].append(float(t.get(k) or 0))
+        merged: Dict[str, Dict[str, float]] = {}
+        for s in t.get("spans") or []:
+            m = merged.setdefault(s.get("stage", "?"), {k: 0.0 for k in ("ms", *_COUNTERS)})
+            for k in m:
+                m[k] += float(s.get(k) or 0)
+        for stage, m in merged.items():
+            agg = per_stage.setdefault(stage, {k: [] for k in m})
+            for k, v in m.items():
+                agg[k].append(v)
+
+    def _row(ms: List[float]) -> Dict[str, float]:
+        ms = sorted(ms)
+        return {"count": len(ms), "p50_ms": _pct(ms, 0.50), "p95_ms": _pct(ms, 0.95),
+                "mean_ms": sum(ms) / len(ms) if ms else 0.0}
+
+    stages = []
+    for stage, agg in per_stage.items():
+        row = {"stage": stage, **_row(agg["ms"])}
+        for k in ("llm_calls", "prompt_tokens", "completion_tokens", "bytes_sent", "cost_usd"):
+            row[f"mean_{k}"] = sum(agg[k]) / len(agg[k])
+        stages.append(row)
+    stages.sort(key=lambda r: r["p95_ms"], reverse=True)
+
+    return {
+        "requests": n,
+        "cache_hit_rate": hits / n if n else 0.0,
+        "total": _row(totals["total_ms"]),
+        "mean_cost_usd": sum(totals["cost_usd"]) / n if n else 0.0,
+        "sum_cost_usd": sum(totals["cost_usd"]),
+        "mean_prompt_tokens": sum(totals["prompt_tokens"]) / n if n else 0.0,
+        "mean_completion_tokens": sum(totals["completion_tokens"]) / n if n else 0.0,
+        "mean_bytes_sent": sum(totals["bytes_sent"]) / n if n else 0.0,
+        "stages": stages,
+    }
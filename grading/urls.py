@@ -5,6 +5,9 @@ app_name = "grading"
 
 urlpatterns = [
     path("grade/", views.grade_card, name="grade"),
+    path("grade/async/", views.grade_card_async, name="grade_async"),
     path("result/<int:pk>/", views.grade_result, name="result"),
+    path("result/<int:pk>/status/", views.grade_status, name="status"),
+    path("stats/", views.pipeline_stats, name="stats"),
     path("coming-soon/", views.coming_soon, name="coming_soon"),
 ]
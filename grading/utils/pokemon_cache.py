@@ -1,87 +1,340 @@
 # grading/utils/pokemon_cache.py
-import os, json
-from pathlib import Path
-from typing import Any, Dict, Optional
+"""
+pokemontcg.io lookups with a persistent local cache.
+
+Sets and cards are stored one row each (PtcgSet / PtcgCard), upserted on fetch, so
+gunicorn workers share the cache without rewriting each other's files and a lookup is
+an indexed query no matter how large the catalog gets. Rows older than
+PTCG_CACHE_TTL_DAYS are refreshed on access (the stale row is still served if the API
+is down). Queries that found nothing are remembered for PTCG_CACHE_MISS_TTL_HOURS
+(PtcgLookupMiss) instead of being retried on every grade.
+
+In front of the database each process keeps a bounded LRU (PTCG_LRU_SIZE entries,
+found answers for PTCG_LRU_TTL_S, "not found" for PTCG_LRU_MISS_TTL_S). Concurrent
+lookups of the same key share one load (coalescing), and stats() exposes the hit/miss
+counters (shown on the staff stats page).
+
+The whole catalog can be preloaded offline from a JSON dump (`manage.py
+import_ptcg_catalog`); with PTCG_OFFLINE=1 lookups then never touch the API. If the
+database isn't usable (scripts without Django, missing migration) lookups go straight
+to the API, uncached.
+"""
+import copy
+import dataclasses
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from datetime import timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
 from pokemontcgsdk import Card as _PTCG_Card, Set as _PTCG_Set, RestClient as _PTCG_RestClient
 
+from grading import set_registry
+
 POKEMONTCG_API_KEY = os.getenv("POKEMONTCG_IO_API_KEY", "").strip()
 if POKEMONTCG_API_KEY:
     _PTCG_RestClient.configure(POKEMONTCG_API_KEY)
 
-CACHE_DIR = Path("cache")
-CACHE_DIR.mkdir(exist_ok=True)
-SET_CACHE_FILE = CACHE_DIR / "sets.json"
-CARD_CACHE_FILE = CACHE_DIR / "cards.json"
+CACHE_TTL_DAYS = float(os.getenv("PTCG_CACHE_TTL_DAYS", "30"))
+MISS_TTL_HOURS = float(os.getenv("PTCG_CACHE_MISS_TTL_HOURS", "24"))
+# Serve only what's in the database (after `manage.py import_ptcg_catalog`): no API calls.
+PTCG_OFFLINE = os.getenv("PTCG_OFFLINE", "0").strip() not in {"", "0", "false", "False"}
+# Per-process front of the store (entries, and seconds a found / not-found answer is reused)
+LRU_SIZE = int(os.getenv("PTCG_LRU_SIZE", "4096"))
+LRU_TTL_S = float(os.getenv("PTCG_LRU_TTL_S", "3600"))
+LRU_MISS_TTL_S = float(os.getenv("PTCG_LRU_MISS_TTL_S", "300"))
 
-_sets: Dict[str, Dict[str, Any]] = {}
-_cards: Dict[str, Dict[str, Any]] = {}
+logger = logging.getLogger(__name__)
 
-def _load_cache():
-    global _sets, _cards
-    if SET_CACHE_FILE.exists():
-        _sets.update(json.loads(SET_CACHE_FILE.read_text()))
-    if CARD_CACHE_FILE.exists():
-        _cards.update(json.loads(CARD_CACHE_FILE.read_text()))
 
-def _save_cache():
-    SET_CACHE_FILE.write_text(json.dumps(_sets, indent=2))
-    CARD_CACHE_FILE.write_text(json.dumps(_cards, indent=2))
+def _now():
+    from django.utils import timezone  # lazy import: usable without Django configured
+    return timezone.now()
 
-_load_cache()
 
-def get_set_by_code(code: str) -> Optional[Dict[str, Any]]:
-    """Look up set by ptcgoCode (e.g., TEF, SVI). Cache results."""
-    code = (code or "").upper()
-    if not code:
+def _fresh(ts) -> bool:
+    return not CACHE_TTL_DAYS or ts >= _now() - timedelta(days=CACHE_TTL_DAYS)
+
+
+def _plain(v):
+    """JSON-able copy of an SDK value (pokemontcgsdk builds nested dataclasses, e.g. SetImage)."""
+    if dataclasses.is_dataclass(v) and not isinstance(v, type):
+        return dataclasses.asdict(v)
+    if isinstance(v, list):
+        return [_plain(x) for x in v]
+    return v
+
+
+def _attr(o, key: str, default=None):
+    """Field of an SDK object or of a raw JSON dict (bulk dumps), as plain JSON types."""
+    return _plain(o.get(key, default) if isinstance(o, dict) else getattr(o, key, default))
+
+
+def _set_data(s) -> Dict[str, Any]:
+    return {
+        "id": _attr(s, "id"),
+        "name": _attr(s, "name"),
+        "series": _attr(s, "series", ""),
+        "releaseDate": _attr(s, "releaseDate", ""),
+        "ptcgoCode": _attr(s, "ptcgoCode", ""),
+        "images": _attr(s, "images", {}) or {},
+    }
+
+
+def _card_data(c) -> Dict[str, Any]:
+    return {
+        "id": _attr(c, "id"),
+        "name": _attr(c, "name"),
+        "number": _attr(c, "number", ""),
+        "rarity": _attr(c, "rarity", ""),
+        "subtypes": _attr(c, "subtypes", []) or [],
+        "supertype": _attr(c, "supertype", ""),
+        "types": _attr(c, "types", []) or [],
+        "regulationMark": _attr(c, "regulationMark", ""),
+        "images": _attr(c, "images", {}) or {},
+    }
+
+
+# =========================
+# Store (one row per set/card; every helper degrades to "no cache")
+# =========================
+def _db_get_set(code: str):
+    try:
+        from grading.models import PtcgSet  # lazy import
+        return PtcgSet.objects.filter(ptcgo_code=code).only("data", "fetched_at").first()
+    except Exception:
+        return None
+
+
+def _db_get_card(set_id: str, number_or_name: str):
+    try:
+        from grading.models import PtcgCard  # lazy import
+        qs = PtcgCard.objects.filter(set_id=set_id).only("data", "fetched_at")
+        return (qs.filter(number=number_or_name).first()
+                or qs.filter(name_lower=number_or_name.lower()).first())
+    except Exception:
         return None
-    if code in _sets:
-        return _sets[code]
+
+
+def set_row(src, updated_at: str = ""):
+    """Unsaved PtcgSet for an SDK Set or a raw dump/API dict."""
+    from grading.models import PtcgSet  # lazy import
+    data = _set_data(src)
+    return PtcgSet(id=data["id"], ptcgo_code=(data.get("ptcgoCode") or "").upper(),
+                   name=data.get("name") or "", data=data, updated_at=updated_at, fetched_at=_now())
+
+
+def card_row(set_id: str, src, updated_at: str = ""):
+    """Unsaved PtcgCard for an SDK Card or a raw dump/API dict."""
+    from grading.models import PtcgCard  # lazy import
+    data = _card_data(src)
+    return PtcgCard(id=data["id"], set_id=set_id, number=str(data.get("number") or ""),
+                    name_lower=(data.get("name") or "").lower(), data=data,
+                    updated_at=updated_at, fetched_at=_now())
+
+
+def bulk_upsert(rows: list) -> int:
+    """Insert-or-update a batch of set_row()/card_row() objects of one model in one query."""
+    if not rows:
+        return 0
+    model = type(rows[0])
+    fields = [f.name for f in model._meta.concrete_fields if not f.primary_key]
+    model.objects.bulk_create(rows, update_conflicts=True, unique_fields=["id"], update_fields=fields)
+    return len(rows)
+
+
+def _db_put_set(data: Dict[str, Any], updated_at: str = "") -> None:
+    try:
+        bulk_upsert([set_row(data, updated_at)])
+    except Exception:  # no DB (or no table yet): the data is still returned
+        _count("db_write_error")
+        logger.warning("PTCG cache: couldn't store set %s", data.get("id"), exc_info=True)
+
+
+def _db_put_card(set_id: str, data: Dict[str, Any], updated_at: str = "") -> None:
+    try:
+        bulk_upsert([card_row(set_id, data, updated_at)])
+    except Exception:
+        _count("db_write_error")
+        logger.warning("PTCG cache: couldn't store card %s", data.get("id"), exc_info=True)
+
+
+def _recent_miss(kind: str, key: str) -> bool:
+    if not MISS_TTL_HOURS:
+        return False
+    try:
+        from grading.models import PtcgLookupMiss  # lazy import
+        cutoff = _now() - timedelta(hours=MISS_TTL_HOURS)
+        return PtcgLookupMiss.objects.filter(kind=kind, key=key, checked_at__gte=cutoff).exists()
+    except Exception:
+        return False
+
+
+def _note_miss(kind: str, key: str) -> None:
+    try:
+        from grading.models import PtcgLookupMiss  # lazy import
+        PtcgLookupMiss.objects.update_or_create(kind=kind, key=key, defaults={"checked_at": _now()})
+    except Exception:
+        pass
+
+
+def _clear_miss(kind: str, key: str) -> None:
+    try:
+        from grading.models import PtcgLookupMiss  # lazy import
+        PtcgLookupMiss.objects.filter(kind=kind, key=key).delete()
+    except Exception:
+        pass
+
+
+# =========================
+# In-process front: bounded LRU + request coalescing + counters
+# =========================
+class _Lru:
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._d: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            item = self._d.get(key)
+            if item is None:
+                return False, None
+            if item[0] < time.monotonic():
+                del self._d[key]
+                return False, None
+            self._d.move_to_end(key)
+            return True, item[1]
+
+    def put(self, key: str, value: Any, ttl_s: float) -> None:
+        if self.maxsize <= 0 or ttl_s <= 0:
+            return
+        with self._lock:
+            self._d[key] = (time.monotonic() + ttl_s, value)
+            self._d.move_to_end(key)
+            while len(self._d) > self.maxsize:
+                self._d.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._d)
+
+
+_lru = _Lru(LRU_SIZE)
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+_stats: Counter = Counter()
+_stats_lock = threading.Lock()
+
+
+def _count(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def stats() -> Dict[str, Any]:
+    """This process's counters: LRU / coalesced / DB / API outcomes, plus LRU size."""
+    with _stats_lock:
+        out = dict(_stats)
+    out["lru_size"] = len(_lru)
+    lookups = out.get("lru_hit", 0) + out.get("lru_miss", 0)
+    out["lru_hit_rate"] = round(out.get("lru_hit", 0) / lookups, 3) if lookups else 0.0
+    return out
+
+
+def _cached(key: str, load: Callable[[], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """LRU hit, or one load() per key however many threads ask at once."""
+    found, value = _lru.get(key)
+    if found:
+        _count("lru_hit")
+        return copy.deepcopy(value)
+    _count("lru_miss")
+    with _inflight_lock:
+        fut = _inflight.get(key)
+        leader = fut is None
+        if leader:
+            fut = _inflight[key] = Future()
+    if not leader:
+        _count("coalesced")
+        return copy.deepcopy(fut.result())
+    try:
+        value = load()
+        _lru.put(key, value, LRU_TTL_S if value is not None else LRU_MISS_TTL_S)
+        fut.set_result(value)
+        return copy.deepcopy(value)
+    except BaseException as e:
+        fut.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+# =========================
+# Lookups
+# =========================
+def _load_set(code: str) -> Optional[Dict[str, Any]]:
+    row = _db_get_set(code)
+    if row is not None and _fresh(row.fetched_at):
+        _count("db_hit")
+        return row.data
+    if PTCG_OFFLINE or (row is None and _recent_miss("set", code)):
+        _count("db_stale" if row is not None else "db_negative")
+        return row.data if row is not None else None
+    _count("api_call")
     try:
         sets = _PTCG_Set.where(q=f'ptcgoCode:{code}')
-        if sets:
-            s = sets[0]
-            data = {
-                "id": s.id,
-                "name": s.name,
-                "series": getattr(s, "series", ""),
-                "releaseDate": getattr(s, "releaseDate", ""),
-                "ptcgoCode": getattr(s, "ptcgoCode", ""),
-                "images": getattr(s, "images", {}) or {},
-            }
-            _sets[code] = data
-            _save_cache()
-            return data
     except Exception:
+        _count("api_error")
+        return row.data if row is not None else None  # API down: a stale row beats nothing
+    if not sets:
+        _note_miss("set", code)
         return None
-    return None
+    data = _set_data(sets[0])
+    _db_put_set(data, getattr(sets[0], "updatedAt", "") or "")
+    _clear_miss("set", code)
+    return data
 
-def get_card_in_set(set_id: str, number_or_name: str) -> Optional[Dict[str, Any]]:
-    """Look up a card by set.id and number (preferred) or name. Cache results."""
-    key = f"{set_id}::{(number_or_name or '').lower()}"
-    if key in _cards:
-        return _cards[key]
+
+def _load_card(set_id: str, query: str) -> Optional[Dict[str, Any]]:
+    miss_key = f"{set_id}::{query.lower()}"
+    row = _db_get_card(set_id, query)
+    if row is not None and _fresh(row.fetched_at):
+        _count("db_hit")
+        return row.data
+    if PTCG_OFFLINE or (row is None and _recent_miss("card", miss_key)):
+        _count("db_stale" if row is not None else "db_negative")
+        return row.data if row is not None else None
+    _count("api_call")
     try:
-        cards = []
-        if number_or_name:
-            cards = _PTCG_Card.where(q=f'set.id:{set_id} number:{number_or_name}')
-            if not cards:
-                cards = _PTCG_Card.where(q=f'set.id:{set_id} name:\"{number_or_name}\"')
-        if cards:
-            c = cards[0]
-            data = {
-                "id": c.id,
-                "name": c.name,
-                "number": getattr(c, "number", ""),
-                "rarity": getattr(c, "rarity", ""),
-                "subtypes": getattr(c, "subtypes", []) or [],
-                "supertype": getattr(c, "supertype", ""),
-                "types": getattr(c, "types", []) or [],
-                "regulationMark": getattr(c, "regulationMark", ""),
-                "images": getattr(c, "images", {}) or {},
-            }
-            _cards[key] = data
-            _save_cache()
-            return data
+        cards = _PTCG_Card.where(q=f'set.id:{set_id} number:{query}')
+        if not cards:
+            cards = _PTCG_Card.where(q=f'set.id:{set_id} name:\"{query}\"')
     except Exception:
+        _count("api_error")
+        return row.data if row is not None else None
+    if not cards:
+        _note_miss("card", miss_key)
+        return None
+    data = _card_data(cards[0])
+    _db_put_card(set_id, data, getattr(cards[0], "updatedAt", "") or "")
+    _clear_miss("card", miss_key)
+    return data
+
+
+def get_set_by_code(code: str) -> Optional[Dict[str, Any]]:
+    """Look up set by ptcgoCode (e.g., TEF, SVI). Cache results."""
+    # printed codes / OCR misreads resolve to the PTCGO code first, so '5VI' hits the SVI entry
+    code = set_registry.ptcgo(code) or (code or "").upper()
+    if not code:
+        return None
+    return _cached(f"set:{code}", lambda: _load_set(code))
+
+
+def get_card_in_set(set_id: str, number_or_name: str) -> Optional[Dict[str, Any]]:
+    """Look up a card by set.id and number (preferred) or name. Cache results."""
+    query = (number_or_name or "").strip()
+    if not query:
         return None
-    return None
+    return _cached(f"card:{set_id}:{query.lower()}", lambda: _load_card(set_id, query))
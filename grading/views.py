@@ -1,15 +1,16 @@
 # grading/views.py
 from __future__ import annotations
-from pathlib import Path
-from decimal import Decimal
-from functools import lru_cache
 import os
 
+from asgiref.sync import sync_to_async
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.conf import settings
-from django.http import HttpRequest, HttpResponseNotFound
+from django.http import HttpRequest, HttpResponseNotFound, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.utils import timezone
 
+from . import jobs, result_cache, tracing
 from .forms import GradingForm
 from .models import GradeRequest
 
@@ -24,26 +25,13 @@ AI_ENABLED = os.getenv("ENABLE_GRADING_AI", "0") == "1"
 CV_ENABLED = os.getenv("ENABLE_CV_GRADER", "0") == "1"
 
 
-def _label_from_score(x: float) -> str:
-    if x >= 9.5: return "Gem Mint 10"
-    if x >= 9.0: return "Mint 9"
-    if x >= 8.0: return "NM-MT 8"
-    if x >= 7.0: return "NM 7"
-    if x >= 6.0: return "EX-MT 6"
-    if x >= 5.0: return "EX 5"
-    return f"{x:.1f}"
+# Grade in a background worker (manage.py grade_worker) instead of inside the POST.
+QUEUE_ENABLED = os.getenv("ENABLE_GRADING_QUEUE", "0") == "1"
 
 
-# ---- Lazy loaders (avoid importing heavy deps unless enabled & needed) ----
-@lru_cache(maxsize=1)
-def _get_cv_model():
-    from grading.ml.cv_inference import CVGrader  # lazy import
-    return CVGrader(weights_path="grading/ml/models/cardgrader_v1.pt", size=384)
-
-
-def _grade_with_openai(*args, **kwargs):
-    from .openai_client import grade_with_openai  # lazy import
-    return grade_with_openai(*args, **kwargs)
+async def _grade_with_openai_async(*args, **kwargs):
+    from .openai_client import grade_with_openai_async  # lazy import
+    return await grade_with_openai_async(*args, **kwargs)
 
 
 # ----------------------------- Views ----------------------------------------
@@ -51,8 +39,10 @@ def grade_card(request: HttpRequest):
     """
     Upload & grade a card.
     Toggle engine with ?engine=cv or ?engine=ai (default=cv).
+    With ENABLE_GRADING_QUEUE=1 the request is queued and the result page polls;
+    otherwise it's graded inline through the same job runner.
     """
-    engine = (request.GET.get("engine") or "cv").lower()
+    engine = "ai" if (request.GET.get("engine") or "cv").lower() == "ai" else "cv"
 
     # Allow the UI to load even if grading is disabled.
     # When disabled, show the form but block POST.
@@ -66,6 +56,13 @@ def grade_card(request: HttpRequest):
         if not form.is_valid():
             return render(request, "grading/grade_form.html", {"form": form, "ui_allowed": ui_allowed})
 
+        if engine == "ai" and not AI_ENABLED:
+            messages.warning(request, "AI grading is disabled on this deployment.")
+            return redirect("grading:grade")
+        if engine == "cv" and not CV_ENABLED:
+            messages.warning(request, "Computer-vision grading is disabled on this deployment.")
+            return redirect("grading:grade")
+
         gr: GradeRequest = form.save(commit=False)
 
         game = (request.POST.get("game") or "").strip().lower()
@@ -73,90 +70,31 @@ def grade_card(request: HttpRequest):
             gr.game = game
         if request.user.is_authenticated:
             gr.user = request.user
-        gr.save()  # save early so images exist on disk
-
-        try:
-            if engine == "ai":
-                if not AI_ENABLED:
-                    messages.warning(request, "AI grading is disabled on this deployment.")
-                    return redirect("grading:grade")
-
-                ptcgo_code = form.cleaned_data.get("ptcgo_code")
-                collector_number = form.cleaned_data.get("collector_number")
-
-                data = _grade_with_openai(
-                    Path(gr.front_image.path),
-                    Path(gr.back_image.path) if gr.back_image else None,
-                    game_hint=game,
-                    ptcgo_code=ptcgo_code,
-                    collector_number=collector_number,
-                )
-
-                s = data.get("scores", {})
-                gr.score_centering = Decimal(str(s.get("centering", 0)))
-                gr.score_surface   = Decimal(str(s.get("surface",   0)))
-                gr.score_edges     = Decimal(str(s.get("edges",     0)))
-                gr.score_corners   = Decimal(str(s.get("corners",   0)))
-                gr.score_color     = Decimal(str(s.get("color",     0)))
-                overall            = Decimal(str(data.get("predicted_grade", 0)))
-                gr.predicted_grade = overall
-                gr.predicted_label = data.get("predicted_label", _label_from_score(float(overall)))
-                gr.explanation_md  = data.get("summary", "")
-                gr.needs_better_photos = bool(data.get("needs_better_photos", False))
-                gr.photo_feedback  = data.get("photo_feedback", "")
-                gr.raw_json        = data
-
-            else:  # engine == "cv"
-                if not CV_ENABLED:
-                    messages.warning(request, "Computer-vision grading is disabled on this deployment.")
-                    return redirect("grading:grade")
-
-                front_p = Path(gr.front_image.path)
-                back_p  = Path(gr.back_image.path) if gr.back_image else None
-
-                cv_model = _get_cv_model()
-                cv_out = cv_model.predict(front_p, back_p)
-
-                if not cv_out.get("success", True):
-                    reason = cv_out.get("message", "Photo quality too low for grading.")
-                    stage  = cv_out.get("stage", "quality")
-                    messages.warning(
-                        request,
-                        f"Couldn’t grade this photo ({stage}): {reason}. "
-                        "Try with more light, less glare, and keep the card square to the camera."
-                    )
-                    gr.needs_better_photos = True
-                    gr.photo_feedback = reason
-                    gr.explanation_md = (
-                        "Grading skipped due to photo quality gate."
-                    )
-                    gr.raw_json = {"engine": "cv", **cv_out}
-                    gr.save(update_fields=["needs_better_photos", "photo_feedback", "explanation_md", "raw_json"])
-                    return redirect("grading:grade")
-
-                gr.score_centering = Decimal(str(cv_out.get("centering", 0)))
-                gr.score_surface   = Decimal(str(cv_out.get("surface",   0)))
-                gr.score_edges     = Decimal(str(cv_out.get("edges",     0)))
-                gr.score_corners   = Decimal(str(cv_out.get("corners",   0)))
-                gr.score_color     = Decimal(str(cv_out.get("color",     0)))
-                overall = Decimal(str(cv_out.get("overall", 0)))
-                gr.predicted_grade = overall
-                gr.predicted_label = _label_from_score(float(overall))
-                gr.explanation_md  = "Graded by CV model (pair-regressor v1)."
-                gr.needs_better_photos = False
-                gr.photo_feedback = ""
-                gr.raw_json = {"engine": "cv", **cv_out}
 
-        except Exception as exc:
-            messages.error(request, f"Grading failed: {exc}")
+        params = {}
+        if engine == "ai":
+            params = {
+                "ptcgo_code": form.cleaned_data.get("ptcgo_code"),
+                "collector_number": form.cleaned_data.get("collector_number"),
+            }
+        if QUEUE_ENABLED:
+            jobs.enqueue(gr, engine, **params)  # save early so images exist on disk
+            return redirect("grading:result", pk=gr.pk)
+
+        jobs.start_inline(gr, engine, **params)  # RUNNING: a grade_worker won't claim it too
+
+        jobs.run_job(gr)
+        if gr.status == GradeRequest.STATUS_FAILED:
+            messages.error(request, f"Grading failed: {gr.error}")
+            return redirect("grading:grade")
+        if jobs.cv_gate_failed(gr):
+            stage = gr.raw_json.get("stage", "quality")
+            messages.warning(
+                request,
+                f"Couldn’t grade this photo ({stage}): {gr.photo_feedback}. "
+                "Try with more light, less glare, and keep the card square to the camera."
+            )
             return redirect("grading:grade")
-
-        gr.save(update_fields=[
-            "score_centering", "score_surface", "score_edges", "score_corners", "score_color",
-            "predicted_grade", "predicted_label", "explanation_md",
-            "needs_better_photos", "photo_feedback", "raw_json",
-            *(["game"] if hasattr(gr, "game") else []),
-        ])
         return redirect("grading:result", pk=gr.pk)
 
     # GET → show form (even if disabled; the template can show a banner)
@@ -164,6 +102,80 @@ def grade_card(request: HttpRequest):
     return render(request, "grading/grade_form.html", {"form": form, "ui_allowed": ui_allowed})
 
 
+async def grade_card_async(request: HttpRequest):
+    """
+    AI grading for ASGI deployments. The LLM calls share one async connection
+    pool, so a worker isn't pinned for the whole grade the way grade_card is.
+    """
+    ui_allowed = grading_enabled()
+
+    if request.method != "POST":
+        form = GradingForm()
+        return await sync_to_async(render)(request, "grading/grade_form.html", {"form": form, "ui_allowed": ui_allowed})
+
+    if not ui_allowed:
+        return redirect("grading:coming_soon")
+    if not AI_ENABLED:
+        await sync_to_async(messages.warning)(request, "AI grading is disabled on this deployment.")
+        return redirect("grading:grade")
+
+    form = GradingForm(request.POST, request.FILES)
+    if not await sync_to_async(form.is_valid)():
+        return await sync_to_async(render)(request, "grading/grade_form.html", {"form": form, "ui_allowed": ui_allowed})
+
+    gr: GradeRequest = form.save(commit=False)
+    game = (request.POST.get("game") or "").strip().lower()
+    if hasattr(gr, "game"):
+        gr.game = game
+    user = await request.auser()
+    if user.is_authenticated:
+        gr.user = user
+    # RUNNING and owned by this process: a grade_worker never claims it (save early so images exist on disk)
+    await sync_to_async(jobs.start_inline)(gr, "ai",
+                                           ptcgo_code=form.cleaned_data.get("ptcgo_code"),
+                                           collector_number=form.cleaned_data.get("collector_number"))
+    finished = False
+    try:
+        response = await _grade_async(request, gr)  # saves DONE/FAILED itself
+        finished = True
+        return response
+    finally:
+        # client went away (CancelledError) or the server is shutting down: don't leave it RUNNING
+        if not finished:
+            await GradeRequest.objects.filter(pk=gr.pk, status=GradeRequest.STATUS_RUNNING).aupdate(
+                status=GradeRequest.STATUS_FAILED, error="Grading was cancelled.", finished_at=timezone.now())
+
+
+async def _grade_async(request: HttpRequest, gr: GradeRequest):
+    """run_job for the async view: same pipeline steps (jobs.prepare_pipeline), async LLM call."""
+    with tracing.start() as trace:
+        tracing.annotate(engine="ai", transport="async")
+        try:
+            front_p, back_p, key = await sync_to_async(jobs.prepare_pipeline)(gr)
+            if key is not None:  # None: a near-duplicate's grade was reused
+                data = await sync_to_async(result_cache.get)(key)
+                tracing.annotate(cache_hit=data is not None)
+                if data is None:
+                    data = await _grade_with_openai_async(front_p, back_p, **jobs.ai_hints(gr))
+                    if jobs.ai_cacheable(data):
+                        await sync_to_async(result_cache.put)(key, "ai", data)
+                jobs.apply_ai_result(gr, data)
+            gr.status = GradeRequest.STATUS_DONE
+        except Exception as exc:
+            gr.status = GradeRequest.STATUS_FAILED
+            gr.error = str(exc)
+            gr.finished_at = timezone.now()
+            jobs.attach_trace(gr, trace)
+            await gr.asave(update_fields=[*jobs.JOB_FIELDS, "raw_json"])
+            await sync_to_async(messages.error)(request, f"Grading failed: {exc}")
+            return redirect("grading:grade")
+
+    jobs.attach_trace(gr, trace)
+    gr.finished_at = timezone.now()
+    await gr.asave(update_fields=[*jobs.RESULT_FIELDS, *jobs.JOB_FIELDS, *jobs.PHASH_FIELDS])
+    return redirect("grading:result", pk=gr.pk)
+
+
 def grade_result(request, pk: int):
     gr = get_object_or_404(GradeRequest, pk=pk)
     if not grading_enabled():
@@ -171,5 +183,43 @@ def grade_result(request, pk: int):
     return render(request, "grading/grade_result.html", {"gr": gr})
 
 
+def grade_status(request, pk: int):
+    """Polled by the result page while a queued job runs."""
+    gr = get_object_or_404(GradeRequest, pk=pk)
+    if not grading_enabled():
+        return HttpResponseNotFound("Grading is currently unavailable.")
+    return JsonResponse({
+        "status": gr.status,
+        "pending": gr.is_pending,
+        "error": gr.error if gr.status == GradeRequest.STATUS_FAILED else "",
+    })
+
+
+@staff_member_required
+def pipeline_stats(request):
+    """Staff: per-stage p50/p95 latency, tokens, bytes and cost over recent graded requests."""
+    try:
+        n = max(1, min(5000, int(request.GET.get("n", 500))))
+    except ValueError:
+        n = 500
+    engine = request.GET.get("engine", "")
+    qs = GradeRequest.objects.filter(
+        status__in=[GradeRequest.STATUS_DONE, GradeRequest.STATUS_FAILED],
+    ).order_by("-id")
+    if engine in {"ai", "cv"}:
+        qs = qs.filter(engine=engine)
+    traces = [
+        rj["trace"] for rj in qs.values_list("raw_json", flat=True)[:n]
+        if isinstance(rj, dict) and isinstance(rj.get("trace"), dict)
+    ]
+    try:
+        from .utils import pokemon_cache  # lazy import: needs the pokemontcgsdk
+        ptcg = pokemon_cache.stats()
+    except ImportError:
+        ptcg = None
+    ctx = {"summary": tracing.summarize(traces), "n": n, "engine": engine, "ptcg": ptcg}
+    return render(request, "grading/pipeline_stats.html", ctx)
+
+
 def coming_soon(request):
     return render(request, "grading/coming_soon.html")
\ No newline at end of file
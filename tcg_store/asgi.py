@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+The async grading view (grading:grade_async) only pays off when served from here,
+e.g. ``gunicorn tcg_store.asgi:application -k uvicorn.workers.UvicornWorker``.
+Under WSGI Django runs it in a per-request event loop, which still works.
 """
 
 import os